@@ -4,14 +4,21 @@ QuestDB Telemetry Data Ingestion Script (Two-Table Architecture)
 Ingests telemetry data at 60 samples per second into wanda1 and wanda2 tables.
 """
 
+import os
+import sys
 import time
 import random
 import math
-from datetime import datetime
-from questdb.ingress import Sender
+from questdb.ingress import Sender, TimestampNanos
 import argparse
+import numpy as np
+import pandas as pd
 import psycopg2
 
+# Column batching shared with the Wanda ingest (Wanda/DataIngestion/columnbatch.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Wanda', 'DataIngestion'))
+from columnbatch import ColumnBatch
+
 
 # QuestDB connection configuration
 QUESTDB_HTTP_CONF = (
@@ -32,6 +39,7 @@ QUESTDB_PG_CONF = {
 # Target sampling rate
 SAMPLES_PER_SECOND = 60
 SAMPLE_INTERVAL = 1.0 / SAMPLES_PER_SECOND  # ~16.67ms per sample
+SAMPLE_INTERVAL_NS = round(1e9 / SAMPLES_PER_SECOND)
 
 # Rocket burn profile parameters
 IGNITION_TIME = 2.0      # Ramp up time (seconds)
@@ -259,14 +267,17 @@ def generate_sample_data(elapsed_time, duration_seconds):
     return wanda1_data, wanda2_data
 
 
-def ingest_telemetry(duration_seconds, batch_size=1):
+def ingest_telemetry(duration_seconds, batch_size=1, use_dataframe=False):
     """
     Ingest telemetry data at 60 samples per second into wanda1 and wanda2 tables.
 
     Args:
         duration_seconds: How long to run the ingestion (seconds)
         batch_size: Number of rows to batch before flushing (default: 1 for real-time)
+        use_dataframe: Send each batch as column buffers with sender.dataframe()
+            instead of one sender.row() call per row
     """
+    column_buffers = None
     total_samples = duration_seconds * SAMPLES_PER_SECOND
     samples_sent = 0
 
@@ -275,73 +286,100 @@ def ingest_telemetry(duration_seconds, batch_size=1):
     print(f"  - Target rate: {SAMPLES_PER_SECOND} samples/second")
     print(f"  - Total samples: {total_samples}")
     print(f"  - Batch size: {batch_size} rows")
+    print(f"  - Ingestion path: {'dataframe' if use_dataframe else 'row'}")
     print(f"  - Sample interval: {SAMPLE_INTERVAL*1000:.2f}ms\n")
 
     try:
         with Sender.from_conf(QUESTDB_HTTP_CONF) as sender:
             print("Connected to QuestDB\n")
 
-            start_time = time.time()
-            next_sample_time = start_time
-            last_report_time = start_time
-
-            while samples_sent < total_samples:
+            # Pace on the monotonic clock (not affected by NTP steps) and read
+            # the wall clock only once to convert sample times to timestamps
+            start_ns = time.monotonic_ns()
+            wall_anchor_ns = time.time_ns()
+            next_sample_ns = start_ns
+            last_report_ns = start_ns
+            jitter_us = np.zeros(total_samples)
+            missed_deadlines = 0
+
+            # Skipped deadlines use up their sample slots, so the profile time and
+            # the end of the run stay on the same schedule as the timestamps
+            while samples_sent + missed_deadlines < total_samples:
                 # Calculate elapsed time for this sample
-                elapsed_time = samples_sent / SAMPLES_PER_SECOND
+                elapsed_time = (samples_sent + missed_deadlines) / SAMPLES_PER_SECOND
 
                 # Generate sample data for both tables
                 wanda1_data, wanda2_data = generate_sample_data(elapsed_time, duration_seconds)
 
-                # Use same timestamp for both tables
-                timestamp = datetime.now()
-
-                # Send to wanda1
-                sender.row(
-                    'wanda1',
-                    columns=wanda1_data,
-                    at=timestamp
-                )
-
-                # Send to wanda2
-                sender.row(
-                    'wanda2',
-                    columns=wanda2_data,
-                    at=timestamp
-                )
+                # Use same timestamp for both tables: the scheduled sample time
+                timestamp_ns = wall_anchor_ns + (next_sample_ns - start_ns)
+                timestamp = TimestampNanos(timestamp_ns)
+
+                if use_dataframe:
+                    if column_buffers is None:
+                        column_buffers = [ColumnBatch('wanda1', wanda1_data, batch_size),
+                                          ColumnBatch('wanda2', wanda2_data, batch_size)]
+                    column_buffers[0].append(timestamp_ns, wanda1_data)
+                    column_buffers[1].append(timestamp_ns, wanda2_data)
+                else:
+                    # Send to wanda1
+                    sender.row(
+                        'wanda1',
+                        columns=wanda1_data,
+                        at=timestamp
+                    )
+
+                    # Send to wanda2
+                    sender.row(
+                        'wanda2',
+                        columns=wanda2_data,
+                        at=timestamp
+                    )
 
                 samples_sent += 1
 
                 # Flush batch periodically
                 if samples_sent % batch_size == 0:
+                    if column_buffers is not None:
+                        for column_buffer in column_buffers:
+                            column_buffer.write_to(sender)
                     sender.flush()
 
                 # Progress reporting every second
-                current_time = time.time()
-                if current_time - last_report_time >= 1.0:
-                    elapsed = current_time - start_time
+                current_ns = time.monotonic_ns()
+                if current_ns - last_report_ns >= 1_000_000_000:
+                    elapsed = (current_ns - start_ns) / 1e9
                     actual_rate = samples_sent / elapsed
                     progress = (samples_sent / total_samples) * 100
                     print(f"Progress: {progress:.1f}% | "
                           f"Samples: {samples_sent}/{total_samples} | "
                           f"Rate: {actual_rate:.1f} samples/sec")
-                    last_report_time = current_time
-
-                # Precise timing control
-                next_sample_time += SAMPLE_INTERVAL
-                sleep_time = next_sample_time - time.time()
-
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                elif sleep_time < -SAMPLE_INTERVAL:
-                    # If we're falling behind by more than one interval, resync
-                    print(f"Warning: Falling behind schedule by {-sleep_time*1000:.1f}ms")
-                    next_sample_time = time.time()
+                    last_report_ns = current_ns
+
+                # Precise timing control: absolute deadlines, so a late sample
+                # does not shift the following ones
+                next_sample_ns += SAMPLE_INTERVAL_NS
+                behind_ns = time.monotonic_ns() - next_sample_ns
+                if behind_ns >= SAMPLE_INTERVAL_NS:
+                    # If we're falling behind by more than one interval, skip the missed deadlines
+                    missed = behind_ns // SAMPLE_INTERVAL_NS
+                    print(f"Warning: Falling behind schedule by {behind_ns / 1e6:.1f}ms, skipping {missed} samples")
+                    missed_deadlines += missed
+                    next_sample_ns += missed * SAMPLE_INTERVAL_NS
+
+                sleep_ns = next_sample_ns - time.monotonic_ns()
+                if sleep_ns > 0:
+                    time.sleep(sleep_ns / 1e9)
+                jitter_us[samples_sent - 1] = (time.monotonic_ns() - next_sample_ns) / 1000
 
             # Final flush
+            if column_buffers is not None:
+                for column_buffer in column_buffers:
+                    column_buffer.write_to(sender)
             sender.flush()
 
             # Final statistics
-            total_time = time.time() - start_time
+            total_time = (time.monotonic_ns() - start_ns) / 1e9
             actual_rate = samples_sent / total_time
 
             print(f"\n{'='*60}")
@@ -351,6 +389,11 @@ def ingest_telemetry(duration_seconds, batch_size=1):
             print(f"  - Actual rate: {actual_rate:.2f} samples/second")
             print(f"  - Target rate: {SAMPLES_PER_SECOND} samples/second")
             print(f"  - Accuracy: {(actual_rate/SAMPLES_PER_SECOND)*100:.2f}%")
+            if samples_sent:
+                jitter = jitter_us[:samples_sent]
+                print(f"  - Wake-up jitter: p50 {np.percentile(jitter, 50):.0f}us | "
+                      f"p99 {np.percentile(jitter, 99):.0f}us | max {np.max(jitter):.0f}us")
+            print(f"  - Missed deadlines: {missed_deadlines}")
             print(f"{'='*60}\n")
 
     except KeyboardInterrupt:
@@ -375,6 +418,11 @@ def main():
         default=1,
         help='Number of rows to batch before flushing (default: 1 for real-time)'
     )
+    parser.add_argument(
+        '--dataframe',
+        action='store_true',
+        help='Send each batch as NumPy column buffers with sender.dataframe() instead of per-row sender.row()'
+    )
 
     args = parser.parse_args()
 
@@ -386,7 +434,7 @@ def main():
     setup_tables()
 
     # Start ingestion
-    ingest_telemetry(args.duration, args.batch_size)
+    ingest_telemetry(args.duration, args.batch_size, args.dataframe)
 
 
 if __name__ == '__main__':
@@ -1,8 +1,9 @@
-import RPi.GPIO as GPIO
 import yaml
+import asyncio
 import time
 import socket
 import os
+import sys
 import signal
 from typing import Tuple
 from questdb.ingress import Sender, Protocol
@@ -12,12 +13,31 @@ est = timezone('US/Eastern')
 
 from overrideCMD import OverrideManager
 
+# the hardware backends (Pi or simulator) live in Wanda/hardware
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from hardware import GPIO
+
 # class used to make instances of each worker pi (wanda2 and wanda3)
 class WorkerPi:
-    def __init__(self, id, client_ip_address, client_socket: socket):
+    def __init__(self, id, client_ip_address, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         self.id = id
         self.ip_address = client_ip_address
-        self.socket = client_socket
+        self.reader = reader
+        self.writer = writer
+        # one command in flight per pi, waiting commands are sent in arrival order (asyncio locks are FIFO)
+        self.lock = asyncio.Lock()
+        # responses read from the socket, None once the pi disconnected
+        self.responses = asyncio.Queue()
+        # relay states read back by the last SET command, bit 0 is relay 1
+        self.relay_mask = None
+
+    def clear_responses(self) -> None:
+        """Drops responses to earlier (timed out) commands"""
+        while not self.responses.empty():
+            if self.responses.get_nowait() is None:
+                # keep the disconnect for the next reader
+                self.responses.put_nowait(None)
+                break
 
 # questdb configuration
 QUESTDB_CONF = (
@@ -33,10 +53,14 @@ RELAY_PINS = [5, 6, 13, 16, 19, 20, 21, 26]
 HOST = '0.0.0.0'   # Accept connections from any IP address
 PORT = 9600        # Same port as in the client
 
-# /Wanda/Controls/config.yaml
-CONFIG_FILE_NAME = "config.yaml"
+ACK_TIMEOUT = 0.2               # seconds to wait for a worker ACK before resending the command
+COSMO_RECONNECT_TIMEOUT = 300   # seconds COSMO has to reconnect before the controller shuts down
+
+# /Wanda/Controls/config.yaml (WANDA_CONTROLS_CONFIG selects another file, e.g. for a simulated test stand)
+CONFIG_FILE_NAME = os.environ.get("WANDA_CONTROLS_CONFIG", "config.yaml")
 
-HOSTNAME = socket.gethostname()
+# id of the Pi the controller runs on (WANDA_HOSTNAME overrides it off-Pi)
+HOSTNAME = os.environ.get("WANDA_HOSTNAME", socket.gethostname())
 
 # prints message with current time before each line for logging
 def print_log(message:str):
@@ -45,11 +69,6 @@ def print_log(message:str):
         print(f"[{datetime.now(tz=est).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {line}")
 
 
-# Signal handler handle SIGTERM returned by systemd during stop
-def sigterm_handler(signum, frame):
-    print_log("SIGTERM received. Exiting")
-    raise KeyboardInterrupt
-
 # contains most of the logic of the control server
 class ControllerServer:
 
@@ -62,8 +81,11 @@ class ControllerServer:
         self.switch_map = self.build_switch_map()
 
         self.worker_pis = {}
-        self.cosmo_socket = None
+        self.cosmo_writer = None
         self.cosmo_address = None # unused
+        self.cosmo_connected = None   # asyncio.Event, created in serve()
+        self.stopping = None          # asyncio.Event, created in serve()
+        self.tasks = set()            # running command and reconnect tasks
         
         self.switch_states = {self._format_col_name(switch_id): False for switch_id in self.switch_map.keys()}
         self.switch_states['FIRE_KEY'] = False
@@ -178,72 +200,172 @@ class ControllerServer:
         return switch_map
 
 
-    def wait_for_connections(self) -> None:
-        """Accepts all incomming connections.
+    def identify_connection(self, ip: str):
+        """Finds who connected from an ip address
 
-        Tracks if COSMO and the expected number of worker pis have connected.
         Uses the config file to check if the ip address of an incoming
-        connection matches the ip of an enabled worker pi or cosmo
+        connection matches the ip of cosmo or an enabled worker pi
 
         TODO:
             * Check hostnames instead of ip addresses
-            * Use handshake of some sort 
+            * Use handshake of some sort
 
-        Warning:
-            This method will block indefinitely if a worker Pi or COSMO fails 
-            to connect or has an incorrect IP in the config.
+        Returns:
+            str: "COSMO", the id of the worker pi or None for unknown connections
         """
 
-        print_log(f"Waiting for {self.num_enabled_pis} connections...")
-        COSMO_connected = False
-        num_connected_workers = 0
-
-        # waits until cosmo is connected and the number of connected worker pis is correct
-        while num_connected_workers < self.num_enabled_pis-1 or not COSMO_connected:
-            # accept incoming connection
-            client_socket, client_address = self.server_socket.accept()
-            self.enable_keepalive(client_socket)
-            ip = client_address[0]
-
-            # TODO: Do handshake with incoming connection (maybe to get hostname)
-
-            # check for COSMO connection against ip address
-            # TODO: Check against hostname instead of ip address
-            if ip == self.config["COSMO"]["ip"]:
-                self.cosmo_socket = client_socket
-                COSMO_connected = True
-                print_log("COSMO Connection Established")
-                continue
-
-            # check for worker Pi connection against ip address
-            known_worker = False
-            # iterates through each worker in config
-            for pi_id, data in self.config["PIs"].items():
-                # ! ISSUE: does not check if pi is enabled
-                # checks if incoming ip is the current worker pis ip
-                # TODO: Check against hostname instead of ip address
-                if ip == data["ip"]:
-                    client_socket.settimeout(0.2) # used to check for ACKs when sending commands to worker pis
-                    self.worker_pis[str(pi_id)] = WorkerPi(pi_id, client_address, client_socket)
-                    print_log(f"Pi {pi_id} Connection Established")
-                    known_worker = True
-                    num_connected_workers += 1
-                    break
+        # TODO: Check against hostname instead of ip address
+        if ip == self.config["COSMO"]["ip"]:
+            return "COSMO"
+        for pi_id, data in self.config["PIs"].items():
+            if data["enabled"] and ip == data["ip"]:
+                return str(pi_id)
+        return None
+
+
+    def log_connections(self) -> None:
+        """Logs once COSMO and the expected number of worker pis are connected"""
+        if self.cosmo_writer is not None and len(self.worker_pis) >= self.num_enabled_pis-1:
+            print_log("ALL CONNECTIONs ESTABLISHED")
+
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves an incoming connection until it closes
+
+        Connections are accepted at any time, so worker pis that start late or
+        reconnect and a reconnecting COSMO are picked up without a restart. A new
+        connection from the same ip replaces the old one (e.g. after a half open
+        connection was dropped by the other side).
+        """
+
+        self.enable_keepalive(writer.get_extra_info('socket'))
+        client_address = writer.get_extra_info('peername')
+        ip = client_address[0]
+        client_id = self.identify_connection(ip)
+
+        if client_id is None:
+            print_log(f"Unknown connection from {ip}")
+            writer.close()
+            return
+
+        try:
+            if client_id == "COSMO":
+                await self.serve_cosmo(reader, writer, client_address)
+            else:
+                await self.serve_worker(WorkerPi(client_id, client_address, reader, writer))
+        except asyncio.CancelledError:
+            # the event loop is shutting down, connections were closed in cleanup()
+            pass
+
+
+    async def serve_cosmo(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, client_address) -> None:
+        """Reads commands from COSMO and handles each one in its own task
 
-            # ! ISSUE: seems like this would not flag unkown connections after cosmo connects
-            if not known_worker and not COSMO_connected:
-                print_log(f"Unknown connection from {ip}")
+        Commands to different pis run concurrently, commands to the same pi are
+        sent in the order they were received. Once COSMO disconnects the relays
+        are set to their hold positions and COSMO has `COSMO_RECONNECT_TIMEOUT`
+        seconds to reconnect before the controller shuts down.
+        """
 
-        print_log("ALL CONNECTIONs ESTABLISHED")
+        if self.cosmo_writer is not None:
+            print_log("New COSMO connection, closing the old one")
+            self.cosmo_writer.close()
+        self.cosmo_writer = writer
+        self.cosmo_address = client_address
+        self.cosmo_connected.set()
+        print_log("COSMO Connection Established")
+        self.log_connections()
 
+        try:
+            while True:
+                # recieves command from COSMO
+                msg = await reader.read(1024)
 
-    def send_command_to_worker(self, worker_id: str, command: str, max_retries:int=5) -> bool:
+                # If there's no data, COSMO disconnected
+                if not msg:
+                    break
+
+                # Decode the received data
+                msg_str = msg.decode().strip()
+                commands = msg_str.rstrip(';').split(';') # if commands buffered, multiple could be concatenated together
+
+                # handles each command
+                for cmd in commands:
+                    self.start_task(self.handle_command(cmd))
+
+        # handles cosmo disconnections
+        except (socket.error, ConnectionResetError, BrokenPipeError) as e:
+            print_log(f"Socket error with COSMO: {e}")
+
+        writer.close()
+        # a newer COSMO connection has already taken over, or the controller is shutting down
+        if self.cosmo_writer is not writer or self.stopping.is_set():
+            return
+        print_log("No data received from COSMO. Reconnecting...")
+        self.cosmo_writer = None
+        self.cosmo_connected.clear()
+        await self.hold()
+        self.start_task(self.reconnect_cosmo())
+
+
+    async def serve_worker(self, worker_pi: WorkerPi) -> None:
+        """Reads the responses of a worker pi until it disconnects"""
+
+        old_worker_pi = self.worker_pis.get(worker_pi.id)
+        if old_worker_pi is not None:
+            print_log(f"New connection from Pi {worker_pi.id}, closing the old one")
+            old_worker_pi.writer.close()
+        self.worker_pis[worker_pi.id] = worker_pi
+        print_log(f"Pi {worker_pi.id} Connection Established")
+        self.log_connections()
+
+        buffer = ""
+        try:
+            while True:
+                msg = await worker_pi.reader.read(1024)
+                if not msg:
+                    print_log(f"Pi {worker_pi.id} disconnected")
+                    break
+                # one response per command, each ends with ';' (FORM: "ACK: <cmd>;" or "ERR: <cmd>,<error>;")
+                *responses, buffer = (buffer + msg.decode()).split(';')
+                for response in responses:
+                    if response.strip():
+                        worker_pi.responses.put_nowait(response.strip())
+        except (socket.error, ConnectionResetError, BrokenPipeError) as e:
+            print_log(f"Socket Error for Pi {worker_pi.id}: {e}")
+
+        # wakes up a command waiting for an ACK
+        worker_pi.responses.put_nowait(None)
+        worker_pi.writer.close()
+        if self.worker_pis.get(worker_pi.id) is worker_pi:
+            del self.worker_pis[worker_pi.id]
+
+
+    def start_task(self, coroutine) -> asyncio.Task:
+        """Runs a coroutine in the background, errors are logged"""
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print_log(f"Unexpected error: {task.exception()!r}")
+
+
+    def send_to_cosmo(self, msg: str) -> None:
+        """Sends a response to COSMO, dropped if COSMO is not connected"""
+        if self.cosmo_writer is None or self.cosmo_writer.is_closing():
+            print_log(f"COSMO not connected, dropped <{msg}>")
+            return
+        self.cosmo_writer.write(msg.encode())
+
+
+    async def send_command_to_worker(self, worker_id: str, command: str, max_retries:int=5) -> bool:
         """Sends command to worker pis
-        
-        Uses the worker pi's socket to send a command to the worker pi. Waits for 
-        acknowledgement. If no acknowledgement is recieved, the command will be
-        resent until either an acknowledgement is recieved or the max number of
-        retries is hit.  
+
+        Same as `send_commands_to_worker()` with a single command.
 
         Args:
             worker_id (str): the id of the worker pi
@@ -253,55 +375,88 @@ class ControllerServer:
 
         Returns:
             bool: True if worker pi recieved and acknowledged the command
+        """
+        return await self.send_commands_to_worker(worker_id, [command], max_retries)
+
+
+    async def send_commands_to_worker(self, worker_id: str, commands: list, max_retries:int=5) -> bool:
+        """Sends commands to worker pis
+        
+        Uses the worker pi's socket to send the commands to the worker pi in one
+        message. Waits for an acknowledgement of every command. If not every
+        command is acknowledged in time, the unanswered commands will be resent
+        until either they are acknowledged or the max number of retries is hit.
+
+        Args:
+            worker_id (str): the id of the worker pi
+            commands (list): the commands to be sent to the worker pi
+            max_retries (int, optional): The number of retries that will occur in the case 
+                the worker pi does not respond. Defaults to 5.
+
+        Returns:
+            bool: True if worker pi recieved and acknowledged every command
 
         Note:
-            This method clears the socket buffer before sending to ensure the 
-            received ACK belongs to *this* specific command, preventing race conditions.
+            Only one message is in flight per worker pi, others wait for it in
+            the order they were sent. Responses left over from earlier commands
+            are dropped before sending to ensure the received ACKs belong to
+            *these* specific commands. Commands to other pis are not blocked.
         """
 
         print_log("-"*30)
         # checks if worker_id is a valid worker pi
-        if str(worker_id) not in list(self.worker_pis):
+        worker_pi = self.worker_pis.get(str(worker_id))
+        if worker_pi is None:
             print_log(f"ERR: Worker {worker_id} not found")
             return False
-        
-        worker_pi = self.worker_pis[str(worker_id)]
 
-        attempts = 0
-        while attempts < max_retries:
+        loop = asyncio.get_running_loop()
+        pending = list(commands)
+        success = True
+        async with worker_pi.lock:
+            for _ in range(max_retries):
+                # clear responses to earlier commands
+                worker_pi.clear_responses()
 
-            # clear socket buffer
-            worker_pi.socket.setblocking(False)
-            try:
-                while worker_pi.socket.recv(1024): pass
-            except BlockingIOError:
-                pass
-            worker_pi.socket.setblocking(True)
-
-            # send command
-            try:
-                worker_pi.socket.send(f"{command};".encode())
-                print_log(f"Sent to Pi <{worker_pi.id}>: <{command}>")
-                attempts += 1
-
-                # waits for response from worker pi
-                response_msg = worker_pi.socket.recv(1024).decode().strip()
-
-                print_log(f"Recieved Response: <{response_msg}>")
-                if f"ACK: {command}" in response_msg:
-                    return True
-                elif f"ERR: {command}" in response_msg:
+                # send commands
+                try:
+                    if worker_pi.writer.is_closing():
+                        raise ConnectionResetError("Connection closed")
+                    worker_pi.writer.write("".join(f"{command};" for command in pending).encode())
+                    await worker_pi.writer.drain()
+                    print_log(f"Sent to Pi <{worker_pi.id}>: <{';'.join(pending)}>")
+
+                    # waits for a response to every command from worker pi
+                    deadline = loop.time() + ACK_TIMEOUT
+                    while pending:
+                        response_msg = await asyncio.wait_for(worker_pi.responses.get(), max(0, deadline - loop.time()))
+                        if response_msg is None:
+                            raise ConnectionResetError("Connection closed")
+
+                        print_log(f"Recieved Response: <{response_msg}>")
+                        # SET commands are answered with the relay states read back
+                        response_msg, _, relay_mask = response_msg.partition(" RELAYS=")
+                        if relay_mask:
+                            worker_pi.relay_mask = int(relay_mask, 16)
+                        for command in pending:
+                            if response_msg == f"ACK: {command}":
+                                pending.remove(command)
+                                break
+                            elif response_msg.startswith(f"ERR: {command}"):
+                                pending.remove(command)
+                                success = False
+                                break
+                    return success
+
+                # times out if not every response is received in some time
+                except asyncio.TimeoutError:
+                    print_log(f"Socket Timeout for Pi {worker_pi.id}")
+
+                # raised if the socket has disconnected, retrying cannot help
+                except socket.error as e:
+                    print_log(f"Socket Error for Pi {worker_pi.id}: {e}")
                     return False
-            
-            # times out if not response is received in some time
-            except socket.timeout:
-                print_log(f"Socket Timeout for Pi {worker_pi.id}")
-                attempts += 1
-            
-            # raised if the socket has disconnected
-            except socket.error as e:
-                print_log(f"Socket Error for Pi {worker_pi.id}: {e}")
-        
+
         print_log(f"Max retries reached for Pi {worker_pi.id}")
         return False
             
@@ -373,7 +528,7 @@ class ControllerServer:
         return switch_id, state
 
 
-    def set_relay(self, pi_id: str, relay_id: int, state: bool) -> bool:
+    async def set_relay(self, pi_id: str, relay_id: int, state: bool) -> bool:
         """Actuates relay
 
         Accepts the location and target state of the relay to be switched. Handles
@@ -387,31 +542,64 @@ class ControllerServer:
         Returns:
             bool: whether or not the relay was set successfully
         """
-        success = False
-        target_state = state
+        return await self.set_relays({(pi_id, relay_id): state})
+    
+    
+    async def set_relays(self, relay_states: dict) -> bool:
+        """Actuates several relays at once
 
-        # rejects turning on relays during an abort
-        if self.abort and state:
-            print_log(f"Unable to actuate due to abort")
-            return False
+        Relays on this pi are switched directly. The relays of each worker pi
+        are sent to it in one SET command (FORM: "SET relay#=0/1,relay#=0/1,...")
+        that the worker applies in one pass and ACKs once with the relay states
+        read back. All worker pis are sent to at the same time and their ACKs
+        are collected concurrently, so the time to switch them all is one round
+        trip to the slowest pi instead of one per relay.
 
-        # handles switches controlled on the controller
-        if str(pi_id).lower() == HOSTNAME.lower():
-            if target_state:
-                GPIO.output(RELAY_PINS[relay_id-1], GPIO.HIGH)
+        Args:
+            relay_states (dict): the target state of each relay as
+                {(pi_id, relay_id): state}
+
+        Returns:
+            bool: whether or not every relay was set successfully
+        """
+
+        # rejects turning on relays during an abort, the relays turned off are still set
+        refused = []
+        if self.abort:
+            refused = [relay for relay, state in relay_states.items() if state]
+            if refused:
+                print_log(f"Unable to actuate {refused} due to abort")
+                relay_states = {relay: state for relay, state in relay_states.items() if not state}
+
+        worker_relays = {}
+        for (pi_id, relay_id), state in relay_states.items():
+            # handles relays controlled on the controller
+            if str(pi_id).lower() == HOSTNAME.lower():
+                GPIO.output(RELAY_PINS[relay_id-1], GPIO.HIGH if state else GPIO.LOW)
+                print_log(f"{str(pi_id)}: Relay:{relay_id} State:{state}")
             else:
-                GPIO.output(RELAY_PINS[relay_id-1], GPIO.LOW)
-            success = True
-            print_log(f"{str(pi_id)}: Relay:{relay_id} State:{target_state}")
-            
-        else:
-            # sends command to worker pi
-            worker_msg = f"{relay_id} {target_state}"
-            success = self.send_command_to_worker(pi_id, worker_msg)
+                worker_relays.setdefault(str(pi_id), []).append(f"{relay_id}={int(state)}")
+
+        # sends one SET command to every worker pi at once
+        results = await asyncio.gather(*(self.send_command_to_worker(pi_id, f"SET {','.join(relays)}")
+                                         for pi_id, relays in worker_relays.items()))
+        return all(results) and not refused
+
+
+    def read_relay(self, pi_id: str, relay_id: int):
+        """Returns the state of a relay as last read back, None if unknown
+
+        Relays on this pi are read from GPIO, relays of worker pis from the
+        relay states their last SET command read back.
+        """
+        if str(pi_id).lower() == HOSTNAME.lower():
+            return GPIO.input(RELAY_PINS[relay_id-1]) == GPIO.HIGH
+        worker_pi = self.worker_pis.get(str(pi_id))
+        if worker_pi is None or worker_pi.relay_mask is None:
+            return None
+        return bool(worker_pi.relay_mask >> (relay_id-1) & 1)
+
 
-        return success
-    
-    
     def post_status_to_questdb(self, switch_id, target_state) -> None:
         """update controls data in questdb
         
@@ -441,7 +629,7 @@ class ControllerServer:
         pass
 
 
-    def handle_command(self, cmd: str) -> None:
+    async def handle_command(self, cmd: str) -> None:
         """Handles the process for a command
         
         If abort is active, this will ignore current command and shut off every relay. 
@@ -449,12 +637,14 @@ class ControllerServer:
         the OverrideManager handle the command. If there are no exceptions, the `decode_cmd()` 
         fucntion is uesed to parse information from a command and gets the target relays to be 
         switched based off the command. Afterwards it sets those relays to their target states.
-        In addition, responds to COSMO with ACK or ERR.
+        In addition, responds to COSMO with ACK or ERR. Runs as its own task, so
+        a slow worker pi only delays the commands that are sent to it.
 
         Args:
             cmd (str): the command recieved from COSMO
         """
 
+        received = time.perf_counter()
         print_log("="*50)
         print_log(f'CMD: <{cmd}>')
         time_now = datetime.now(tz=est)
@@ -468,36 +658,42 @@ class ControllerServer:
             # if abort shut off all relays
             if self.abort:
                 target_state = False # target state of all relays during an abort
-                for pi_id in self.config["PIs"]:
-                    if self.config["PIs"][pi_id]["enabled"]:
-                        for relay_id in self.config["PIs"][pi_id]["relays"]:
-                            self.set_relay(pi_id, relay_id, target_state) # shut off each relay
+                all_relays = {(pi_id, relay_id): target_state
+                              for pi_id, pi_data in self.config["PIs"].items() if pi_data["enabled"]
+                              for relay_id in pi_data["relays"]}
+                all_off = await self.set_relays(all_relays) # shut off every relay on every pi at once
+                abort_ms = (time.perf_counter() - received) * 1000
+                if all_off:
+                    print_log(f"ABORT: all {len(all_relays)} relays off in {abort_ms:.1f} ms")
+                else:
+                    print_log(f"ABORT: not every relay confirmed off after {abort_ms:.1f} ms")
 
             # if switch_id is overridden in the OverrideManager, move processing of command to it
             elif str(switch_id).lower() in OverrideManager.OVERRIDDEN_CMDS:
                 success = success and self.override_manager.process_command(switch_id, target_state)
 
-            # handle command based off the config file
+            # handle command based off the config file, all relays of the switch at once
             else:
                 target_relays = self.switch_map.get(switch_id, [])
-                for relay_data in target_relays:
-                    pi_id = relay_data["pi"]
-                    relay_id = relay_data["relay"]
-                    success = success and self.set_relay(pi_id, relay_id, target_state)
-                    # print_log(f"[DEBUG: After Set Relay]: pid:{pi_id} rid:{relay_id} ts:{target_state} s:{success}")
+                success = await self.set_relays({(relay_data["pi"], relay_data["relay"]): target_state
+                                                 for relay_data in target_relays})
 
             # respond to COSMO
             if success:
                 self.post_status_to_questdb(switch_id, target_state)
-                self.cosmo_socket.send(f"ACK: {cmd};".encode())
+                self.send_to_cosmo(f"ACK: {cmd};")
                 print_log("Sent ACK")
             else:
-                self.cosmo_socket.send(f"ERR: {cmd};".encode())
+                self.send_to_cosmo(f"ERR: {cmd};")
                 print_log(f"Sent ERR")
 
         except ValueError as e:
             print_log(f"ERR: {e} \n\n CMD: <{cmd}>")
-            self.cosmo_socket.send(f"ERR: {cmd};".encode())
+            self.send_to_cosmo(f"ERR: {cmd};")
+
+        # SHUTDOWN command
+        except KeyboardInterrupt:
+            self.stop()
 
 
     def cleanup(self) -> None:
@@ -512,10 +708,10 @@ class ControllerServer:
                 GPIO.output(pin, GPIO.LOW)
             
             print_log("Closing connections...")
-            if self.cosmo_socket:
-                self.cosmo_socket.close()
+            if self.cosmo_writer:
+                self.cosmo_writer.close()
             for worker_pi in self.worker_pis.values():
-                worker_pi.socket.close()
+                worker_pi.writer.close()
             if self.server_socket:
                 self.server_socket.close()
             if self.sender is not None:
@@ -528,7 +724,7 @@ class ControllerServer:
             print_log("Cleanup complete.")
 
 
-    def hold(self) -> None:
+    async def hold(self) -> None:
         """Sets relays to hold position
         
         Checks if the relay has a specific hold position. If so,
@@ -536,6 +732,7 @@ class ControllerServer:
         """
 
         print_log("Applying hold positions to all relays due to disconnect...")
+        hold_states = {} # {pi_id: {(pi_id, relay_id): hold_state}}
         for pi_id, pi_data in self.config["PIs"].items():
             if pi_data["enabled"]:
                 for relay_id, relay_data in pi_data["relays"].items():
@@ -543,73 +740,95 @@ class ControllerServer:
                     hold_state = relay_data.get("hold_position", False)
                     if hold_state is None:
                         continue
-                    
-                    switch_id = relay_data.get("switch")
-                    success = self.set_relay(pi_id, relay_id, hold_state)
-                    if success and switch_id is not None:
-                        self.post_status_to_questdb(switch_id, hold_state)
+                    # relays are not turned on during an abort, the others still go to their hold position
+                    if self.abort and hold_state:
+                        print_log(f"Abort active, {pi_id} Relay:{relay_id} not moved to hold position")
+                        continue
+                    hold_states.setdefault(pi_id, {})[(pi_id, relay_id)] = hold_state
+
+        # one batch per pi, all pis at once, so a pi that is down only fails its own relays
+        results = await asyncio.gather(*(self.set_relays(relay_states) for relay_states in hold_states.values()))
+
+        for (pi_id, relay_states), success in zip(hold_states.items(), results):
+            for (_, relay_id), hold_state in relay_states.items():
+                switch_id = self.config["PIs"][pi_id]["relays"][relay_id].get("switch")
+                if success and switch_id is not None:
+                    self.post_status_to_questdb(switch_id, hold_state)
 
+        # checks that every relay that should be off reads back off
+        still_on = [f"{pi_id} Relay:{relay_id}"
+                    for relay_states in hold_states.values()
+                    for (pi_id, relay_id), hold_state in relay_states.items()
+                    if not hold_state and self.read_relay(pi_id, relay_id)]
+        if still_on:
+            print_log(f"Warning: relays still on after hold: {', '.join(still_on)}")
 
-    def shutdown(self) -> None:
+
+    async def shutdown(self) -> None:
         """Handles a service shutdown"""
         print_log("Shutting down")
         
         # Acknowledge the shutdown command to COSMO if connected
-        if self.cosmo_socket:
+        if self.cosmo_writer:
             try:
-                self.cosmo_socket.send(b"ACK: SHUTDOWN;")
+                self.cosmo_writer.write(b"ACK: SHUTDOWN;")
+                await asyncio.wait_for(self.cosmo_writer.drain(), ACK_TIMEOUT)
             except Exception:
                 pass
 
         # Send SHUTDOWN command to all connected worker PIs
-        for worker_id in list(self.worker_pis.keys()):
-            self.send_command_to_worker(worker_id, "SHUTDOWN", max_retries=2)
+        await asyncio.gather(*(self.send_command_to_worker(worker_id, "SHUTDOWN", max_retries=2)
+                               for worker_id in list(self.worker_pis.keys())))
 
 
-    def reconnect_cosmo(self, timeout_seconds=300) -> None:
-        """Recconnects COSMO during a disconnection
+    async def reconnect_cosmo(self, timeout_seconds=COSMO_RECONNECT_TIMEOUT) -> None:
+        """Waits for COSMO to reconnect during a disconnection, shuts down otherwise
 
         Args:
-            timeout_seconds (int): The seconds to attempt reconnection (defaults to 300)        
+            timeout_seconds (int): The seconds to wait for the reconnection (defaults to 300)
         """
 
         print_log(f"Attempting to reconnect to COSMO")
-        if self.cosmo_socket:
-            try:
-                self.cosmo_socket.close()
-            except Exception:
-                pass
-            self.cosmo_socket = None
+        try:
+            await asyncio.wait_for(self.cosmo_connected.wait(), timeout_seconds)
+            print_log("COSMO Reconnected successfully!")
+        except asyncio.TimeoutError:
+            print_log("Reconnect timeout expired. Proceeding to shutdown.")
+            self.stop()
 
-        start_time = time.time()
-        self.server_socket.settimeout(1.0)  # sets time step to check timer
 
-        while time.time() - start_time < timeout_seconds:
-            try:
-                client_socket, client_address = self.server_socket.accept()
-                self.enable_keepalive(client_socket)
-                ip = client_address[0]
-                
-                if ip == self.config["COSMO"]["ip"]:
-                    self.cosmo_socket = client_socket
-                    self.cosmo_address = client_address
-                    self.server_socket.settimeout(None)
-                    print_log("COSMO Reconnected successfully!")
-                    return True
-                else:
-                    print_log(f"Unexpected connection from {ip} during COSMO reconnect. Closing.")
-                    client_socket.close()
-                    
-            except socket.timeout:
-                pass
-            
-            except Exception as e:
-                print_log(f"Error accepting connection during reconnect: {e}")
-                time.sleep(1)
+    def stop(self, reason: str = None) -> None:
+        """Ends `serve()`, which then shuts down the workers and cleans up"""
+        if reason:
+            print_log(reason)
+        self.stopping.set()
 
-        self.server_socket.settimeout(None)
-        print_log("Reconnect timeout expired. Proceeding to shutdown.")
-        return False
+
+    async def serve(self) -> None:
+        """Runs the controller until a SHUTDOWN command, SIGTERM or Ctrl+C
+
+        The listening socket, COSMO and every worker pi are served by one event
+        loop, so no connection or command blocks the others.
+        """
+
+        self.stopping = asyncio.Event()
+        self.cosmo_connected = asyncio.Event()
+
+        # Register signal handlers for system termination and Ctrl+C
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self.stop, "SIGTERM received. Exiting")
+        loop.add_signal_handler(signal.SIGINT, self.stop, "Server interrupted by user.")
+
+        # accepts connections for the whole controls duration
+        server = await asyncio.start_server(self.handle_connection, sock=self.server_socket)
+        print_log(f"Waiting for {self.num_enabled_pis} connections...")
+
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            await self.shutdown()
+            self.cleanup()
 
 
     def main(self):
@@ -625,49 +844,7 @@ class ControllerServer:
             
 
         print_log(f"{'='*50}")
-        try:
-            # Register signal handler for system termination
-            signal.signal(signal.SIGTERM, sigterm_handler)
-            
-            # gets all connections
-            self.wait_for_connections()
-            
-            # loops for entire controls duration
-            while True:
-                try:
-                    # recieves command from COSMO
-                    self.cosmo_socket.settimeout(None)
-                    msg = self.cosmo_socket.recv(1024)
-
-                    # If there's no data, break the loop
-                    if not msg:
-                        print_log("No data received from COSMO. Reconnecting...")
-                        self.hold()
-                        if not self.reconnect_cosmo(): 
-                            break
-                        continue
-
-                    # Decode the received data
-                    msg_str = msg.decode().strip()
-                    commands = msg_str.rstrip(';').split(';') # if commands buffered, multiple could be concatenated together
-
-                    # handles each command
-                    for cmd in commands:
-                        self.handle_command(cmd)
-
-                # handles cosmo disconnections
-                except (socket.error, ConnectionResetError, BrokenPipeError) as e:
-                    print_log(f"Socket error with COSMO: {e}")
-                    self.hold()
-                    if not self.reconnect_cosmo(): 
-                        break
-
-        except KeyboardInterrupt:
-            print_log("Server interrupted by user.")
-
-        finally:
-            self.shutdown()
-            self.cleanup()
+        asyncio.run(self.serve())
 
 
 if __name__ == '__main__':
@@ -1,41 +1,42 @@
+import asyncio
 import time
-import threading
 
 class OverrideManager:
     
     def __init__(self, controller_instance):
         self.controller = controller_instance
         # self.fire_enabled = False
-        self.active_thread = None
+        self.active_task = None
 
     def process_command(self, switch_id, state):
         cmd = str(switch_id).lower()
         if cmd in self.OVERRIDDEN_CMDS:
-            if self.active_thread and self.active_thread.is_alive():
+            if self.active_task and not self.active_task.done():
                 return True
-            self.active_thread = threading.Thread(target=self.OVERRIDDEN_CMDS[cmd], args=(self, state))
-            self.active_thread.start()
+            # runs on the controller's event loop next to the other commands
+            self.active_task = self.controller.start_task(self.OVERRIDDEN_CMDS[cmd](self, state))
             return True
         return False   
 
+    async def wait_until(self, start, ms):
+        """Sleeps until `ms` milliseconds after `start` (time.perf_counter())"""
+        await asyncio.sleep(max(0, start + ms / 1000 - time.perf_counter()))
+
     # TEST SEQUENCE
-    def run_fire(self, state):
-        self.controller.set_relay("wanda1", 6, True)
-        self.controller.set_relay("wanda1", 7, True)
+    async def run_fire(self, state):
+        await self.controller.set_relay("wanda1", 6, True)
+        await self.controller.set_relay("wanda1", 7, True)
 
         fire_start = time.perf_counter()
 
-        while (time.perf_counter() - fire_start) * 1000 < 100:
-            time.sleep(0.001)
-        self.controller.set_relay("wanda2", 1, True)
+        await self.wait_until(fire_start, 100)
+        await self.controller.set_relay("wanda2", 1, True)
         
-        while (time.perf_counter() - fire_start) * 1000 < 200:
-            time.sleep(0.001)
-        self.controller.set_relay("wanda2", 2, True)
+        await self.wait_until(fire_start, 200)
+        await self.controller.set_relay("wanda2", 2, True)
 
-        while (time.perf_counter() - fire_start) * 1000 < 300:
-            time.sleep(0.001)
-        self.controller.set_relay("wanda1", 8, True)
+        await self.wait_until(fire_start, 300)
+        await self.controller.set_relay("wanda1", 8, True)
         
 
         
@@ -43,16 +44,16 @@ class OverrideManager:
 
 
 
-    def run_fire_key(self, state):
+    async def run_fire_key(self, state):
         if state:
-            self.controller.set_relay("wanda1", 6, True);
-            self.controller.set_relay("wanda1", 7, True);
+            await self.controller.set_relay("wanda1", 6, True);
+            await self.controller.set_relay("wanda1", 7, True);
         else:
-            self.controller.set_relay("wanda1", 6, False);
-            self.controller.set_relay("wanda1", 7, False);
-            self.controller.set_relay("wanda2", 1, False);
-            self.controller.set_relay("wanda2", 2, False);
-            self.controller.set_relay("wanda1", 8, False);
+            await self.controller.set_relay("wanda1", 6, False);
+            await self.controller.set_relay("wanda1", 7, False);
+            await self.controller.set_relay("wanda2", 1, False);
+            await self.controller.set_relay("wanda2", 2, False);
+            await self.controller.set_relay("wanda1", 8, False);
 
     OVERRIDDEN_CMDS = {
         "fire": run_fire,
@@ -1,5 +1,6 @@
-import RPi.GPIO as GPIO
+import os
 import socket
+import sys
 import time
 import signal
 
@@ -7,6 +8,10 @@ from datetime import datetime
 from pytz import timezone
 est = timezone('US/Eastern')
 
+# the hardware backends (Pi or simulator) live in Wanda/hardware
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from hardware import GPIO
+
 def print_log(message:str):
     lines = message.split('\n')
     for line in lines:
@@ -29,11 +34,35 @@ GPIO.setwarnings(False)
 for pin in RELAY_PINS:
     GPIO.setup(pin, GPIO.OUT)
 
+def parse_set_command(cmd: str) -> dict:
+    """Parses a batched command (FORM: "SET relay#=0/1,relay#=0/1,...") into {relay: GPIO level}"""
+    relay_levels = {}
+    for relay_state in cmd.strip()[len("SET "):].split(','):
+        relay, _, state = relay_state.partition('=')
+        relay = int(relay)
+        if not (1 <= relay <= 8):
+            raise ValueError("Invalid Relay Number")
+        if state.strip() not in ("0", "1"):
+            raise ValueError("Invalid State")
+        relay_levels[relay] = GPIO.HIGH if state.strip() == "1" else GPIO.LOW
+    return relay_levels
+
+def read_relay_mask() -> int:
+    """Reads back every relay as a bitmask, bit 0 is relay 1"""
+    return sum(1 << i for i, pin in enumerate(RELAY_PINS) if GPIO.input(pin) == GPIO.HIGH)
+
 start_time = time.time()
  
 # socket client -> server set up
-controller_pi_address = "192.168.1.30"
+controller_pi_address = os.environ.get("WANDA_CONTROLLER_ADDRESS", "192.168.1.30")
 controller_pi_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+# send each ACK right away, Nagle would hold the ACKs of a batch back for the controller's delayed ACK
+controller_pi_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+# the controller identifies workers by IP, WANDA_WORKER_ADDRESS sets the source
+# address so several workers can run on one box (e.g. 127.0.0.31)
+worker_address = os.environ.get("WANDA_WORKER_ADDRESS")
+if worker_address:
+    controller_pi_socket.bind((worker_address, 0))
 connected = False
 print_log(f"Attempting to connect to {controller_pi_address}")
 while not connected:
@@ -47,6 +76,8 @@ while not connected:
 if connected:
     print_log(f"Connected to {controller_pi_address}")
 
+# end of the last message if it was split in the middle of a command
+buffer = ""
 try:
     while True:
         # Receive data from COSMO (up to 1024 bytes at a time)
@@ -57,8 +88,8 @@ try:
             print_log("No data received. Closing connection.")
             break
         
-        # splits message into each command
-        cmds = msg.rstrip(';').split(';')
+        # splits message into each command, the controller may send several at once
+        *cmds, buffer = (buffer + msg).split(';')
         for cmd in cmds:
             if not cmd:
                 continue
@@ -67,9 +98,34 @@ try:
             
             if cmd.strip().upper() == "SHUTDOWN":
                 print_log("SHUTDOWN command received. Stopping")
-                controller_pi_socket.send(f"ACK: {cmd}".encode())
+                controller_pi_socket.send(f"ACK: {cmd};".encode())
                 raise KeyboardInterrupt
 
+            # batched command, every relay is set in one pass and answered once
+            if cmd.strip().upper().startswith("SET "):
+                err_msg = ""
+                try:
+                    relay_levels = parse_set_command(cmd)
+                    GPIO.output([RELAY_PINS[relay-1] for relay in relay_levels], list(relay_levels.values()))
+                except ValueError as e:
+                    err_msg = e
+
+                # check relay states
+                relay_mask = read_relay_mask()
+                if not err_msg:
+                    mismatched = [relay for relay, level in relay_levels.items() if (relay_mask >> (relay-1)) & 1 != level]
+                    if mismatched:
+                        err_msg = f"Relay State Mismatch {mismatched}"
+
+                # (FORM: "ACK: <cmd> RELAYS=0x<mask>;" or "ERR: <cmd>,<error> RELAYS=0x<mask>;")
+                if not err_msg:
+                    print_log(f"Sending ACK, relays 0x{relay_mask:02X}\n")
+                    controller_pi_socket.send(f"ACK: {cmd} RELAYS=0x{relay_mask:02X};".encode())
+                else:
+                    print_log(f"Sending ERR, relays 0x{relay_mask:02X}\n")
+                    controller_pi_socket.send(f"ERR: {cmd},{err_msg} RELAYS=0x{relay_mask:02X};".encode())
+                continue
+
             success = False
             err_msg = ""
 
@@ -107,12 +163,13 @@ try:
                 success = False
                 err_msg = e
             
+            # one response per command (FORM: "ACK: <cmd>;" or "ERR: <cmd>,<error>;")
             if success:
                 print_log(f"Sending ACK\n")
-                controller_pi_socket.send(f"ACK: {msg}".encode())
+                controller_pi_socket.send(f"ACK: {cmd};".encode())
             else:
                 print_log(f"Sending ERR\n")
-                controller_pi_socket.send(f"ERR: {msg},{err_msg}".encode())
+                controller_pi_socket.send(f"ERR: {cmd},{err_msg};".encode())
 
 except KeyboardInterrupt:
     print_log("Interrupted by user")
@@ -1,7 +1,18 @@
-import RPi.GPIO as GPIO
-import spidev
+import os
+import sys
 import time
 
+# the hardware backends (Pi or simulator) live in Wanda/hardware
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from hardware import GPIO
+
+try:
+    from . import timing
+    from .transport import SpiTransport
+except ImportError: # imported as a top level module
+    import timing
+    from transport import SpiTransport
+
 # gain channel
 GAIN_E = {'GAIN_1' : 0, # GAIN   1
           'GAIN_2' : 1,	# GAIN   2
@@ -62,17 +73,43 @@ CMD = {'CMD_WAKEUP' : 0x00,     # Completes SYNC and Exits Standby Mode 0000  00
        'CMD_RESET' : 0xFE,      # Reset to Power-Up Values 1111   1110 (FEh)
       }
 
-SPI = spidev.SpiDev(0, 0)
-SPI.max_speed_hz = 500000  # 500 kHz
+# cached single command frames
+CMD_FRAMES = {cmd: bytes([value]) for cmd, value in CMD.items()}
+# WAKEUP followed by RDATA, used by the pipelined scan
+WAKEUP_RDATA_FRAME = bytes([CMD['CMD_WAKEUP'], CMD['CMD_RDATA']])
+
+# commands sent back to back in one frame are separated by half an SCLK period,
+# which has to cover t11 after WREG (4 tCLKIN = 0.52 us), so SCLK must stay below ~960 kHz
+SPI_SPEED_HZ = 500000  # 500 kHz
+
+T11_SYNC_NS = timing.clkin_to_ns(timing.T11_SYNC_CLKIN)
 
 
 class ADS1256:
-    def __init__(self, rst_pin, cs_pin, drdy_pin):
+    # each instance owns its own handle to the SPI bus (spi_bus, spi_device)
+    def __init__(self, rst_pin, cs_pin, drdy_pin, spi_bus=0, spi_device=0):
         self.rst_pin = rst_pin
         self.cs_pin = cs_pin
         self.drdy_pin = drdy_pin
         # this was missing from the original library, without this, the mode would not be set by the setMode since it was not a parameter of the class
         self.scan_mode = 1 # currently set as default: 1=differential mode
+        self.continuous = False # True while the chip is in RDATAC mode
+
+        # DRDY wait settings
+        # "edge": blocks on a GPIO falling edge (does not busy wait the CPU)
+        # "poll": spins on GPIO.input like the original library
+        self.drdy_mode = "edge"
+        self.drdy_timeout_ms = 100
+        self.drdy_timeouts = 0 # number of DRDY waits that timed out
+        self.drdy_time_ns = 0 # time.monotonic_ns() of the last DRDY
+
+        # pipelined scan list (see setScanList)
+        self.scan_list = []
+        self.scan_mux = []
+        self.primed_mux = None # MUX value of the conversion currently running for a scan
+        self.mux_frames = {} # cached WREG MUX + SYNC frames by MUX value
+
+        self.transport = SpiTransport(cs_pin, spi_bus, spi_device, SPI_SPEED_HZ)
 
     # raspberry pi pin managment
     def digital_write(self, pin, value):
@@ -82,13 +119,13 @@ class ADS1256:
         return GPIO.input(self.drdy_pin)
 
     def delay_ms(self, delaytime):
-        time.sleep(delaytime // 1000.0)
+        timing.delay_ms(delaytime)
 
     def spi_writebyte(self, data):
-        SPI.writebytes(data)
+        self.transport.spi.writebytes(data)
         
     def spi_readbytes(self, reg):
-        return SPI.readbytes(reg)
+        return self.transport.spi.readbytes(reg)
         
     def module_init(self):
         GPIO.setmode(GPIO.BCM)
@@ -97,13 +134,13 @@ class ADS1256:
         GPIO.setup(self.cs_pin, GPIO.OUT)
         #GPIO.setup(DRDY_PIN, GPIO.IN)
         GPIO.setup(self.drdy_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        # SPI.max_speed_hz = 20000
-        SPI.mode = 0b01
+        GPIO.output(self.cs_pin, GPIO.HIGH)
+        self.transport.open()
         return 0
 
     def module_exit(self):
         GPIO.cleanup()
-        SPI.close()
+        self.transport.close()
 
     # Hardware reset
     def reset(self):
@@ -114,30 +151,67 @@ class ADS1256:
         self.digital_write(self.rst_pin, GPIO.HIGH)
     
     def writeCmd(self, reg):
-        self.digital_write(self.cs_pin, GPIO.LOW)#cs  0
-        self.spi_writebyte([reg])
-        self.digital_write(self.cs_pin, GPIO.HIGH)#cs 1
+        self.transport.write(bytes([reg]))
     
     def writeReg(self, reg, data):
-        self.digital_write(self.cs_pin, GPIO.LOW)#cs  0
-        self.spi_writebyte([CMD['CMD_WREG'] | reg, 0x00, data])
-        self.digital_write(self.cs_pin, GPIO.HIGH)#cs 1
+        if reg == REG_E['REG_MUX']:
+            self.primed_mux = None
+        self.transport.write(bytes([CMD['CMD_WREG'] | reg, 0x00, data]))
         
     def readData(self, reg):
-        self.digital_write(self.cs_pin, GPIO.LOW)#cs  0
-        self.spi_writebyte([CMD['CMD_RREG'] | reg, 0x00])
-        data = self.spi_readbytes(1)
-        self.digital_write(self.cs_pin, GPIO.HIGH)#cs 1
+        return self.transport.query(bytes([CMD['CMD_RREG'] | reg, 0x00]), 1)
 
-        return data
+    # returns the cached frame that writes a MUX value and sends SYNC
+    def getMuxFrame(self, mux):
+        frame = self.mux_frames.get(mux)
+        if frame is None:
+            frame = bytes([CMD['CMD_WREG'] | REG_E['REG_MUX'], 0x00, mux, CMD['CMD_SYNC']])
+            self.mux_frames[mux] = frame
+        return frame
         
+    def setDRDYWait(self, mode="edge", timeout_ms=100):
+        """Sets how `waitDRDY()` waits for a conversion
+
+        Args:
+            mode (str): "edge" to wait on a falling edge interrupt, "poll" to busy wait
+            timeout_ms (int): max time to wait for DRDY before counting a timeout
+        """
+        if mode not in ("edge", "poll"):
+            raise ValueError(f"Unknown DRDY wait mode <{mode}>")
+        self.drdy_mode = mode
+        self.drdy_timeout_ms = int(timeout_ms)
+
     def waitDRDY(self):
-        for i in range(0,400000,1):
-            if(self.digital_read(self.drdy_pin) == 0):
-                
-                break
-        if(i >= 400000):
-            print ("Time Out ...\r\n")
+        """Waits for DRDY to go low
+
+        The time DRDY was seen low is stored in `drdy_time_ns`
+        (`time.monotonic_ns()`).
+
+        Returns:
+            bool: True if DRDY went low, False if the wait timed out. Timeouts
+                are counted in `drdy_timeouts`.
+        """
+        # DRDY may already be low (conversion finished before we started waiting)
+        ready = self.digital_read(self.drdy_pin) == 0
+
+        if not ready and self.drdy_mode == "edge":
+            ready = GPIO.wait_for_edge(self.drdy_pin, GPIO.FALLING, timeout=self.drdy_timeout_ms) is not None
+            # the edge may have been missed between the read above and arming the wait
+            if not ready:
+                ready = self.digital_read(self.drdy_pin) == 0
+        elif not ready:
+            deadline = time.monotonic() + self.drdy_timeout_ms / 1000.0
+            while not ready and time.monotonic() < deadline:
+                ready = self.digital_read(self.drdy_pin) == 0
+
+        if ready:
+            self.drdy_time_ns = time.monotonic_ns()
+            return True
+        self.drdy_timeouts += 1
+        return False
+
+    def getDRDYTimeouts(self):
+        return self.drdy_timeouts
         
         
     def readChipID(self):
@@ -150,19 +224,24 @@ class ADS1256:
     #The configuration parameters of ADC, gain and data rate
     def configADC(self, gain, drate):
         self.waitDRDY()
-        buf = [0,0,0,0,0,0,0,0]
+        buf = [0,0,0,0]
         buf[0] = (0<<3) | (1<<2) | (0<<1)
         buf[1] = 0x08
         buf[2] = (0<<5) | (0<<3) | (gain<<0)
         buf[3] = drate
         
-        self.digital_write(self.cs_pin, GPIO.LOW)#cs  0
-        self.spi_writebyte([CMD['CMD_WREG'] | 0, 0x03])
-        self.spi_writebyte(buf)
-        
-        self.digital_write(self.cs_pin, GPIO.HIGH)#cs 1
+        # write STATUS, MUX, ADCON and DRATE in one transaction
+        self.transport.write(bytes([CMD['CMD_WREG'] | 0, 0x03] + buf))
+        self.primed_mux = None
         self.delay_ms(1) 
         self.gain = 2 ** gain
+        self.drate = drate
+        self.settling_time_us = timing.settling_time_us(drate)
+
+        # a DRDY wait shorter than one settling time would always time out
+        min_timeout_ms = 2 * self.settling_time_us / 1000
+        if self.drdy_timeout_ms < min_timeout_ms:
+            self.drdy_timeout_ms = int(min_timeout_ms) + 1
 
 
 
@@ -183,6 +262,35 @@ class ADS1256:
             self.writeReg(REG_E['REG_MUX'], (6 << 4) | 7) 	#DiffChannel   AIN6-AIN7
 
 
+    # returns the MUX register value for a channel
+    # int: channel number in the current scan mode (same as getChannelValue)
+    # tuple: (positive input, negative input), 0-7 for AIN0-AIN7 and 8 for AINCOM
+    def getMuxCode(self, Channel):
+        if isinstance(Channel, tuple):
+            pos, neg = Channel
+            if not (0 <= pos <= 8 and 0 <= neg <= 8) or pos == neg:
+                raise ValueError(f"Invalid input pair {Channel}")
+            return (pos << 4) | neg
+        if self.scan_mode == 0:
+            if not (0 <= Channel < 8):
+                raise ValueError(f"Invalid single-ended channel {Channel}")
+            return (Channel << 4) | (1 << 3)
+        if not (0 <= Channel < 4):
+            raise ValueError(f"Invalid differential channel {Channel}")
+        return ((2 * Channel) << 4) | (2 * Channel + 1)
+
+    # selects a channel using the current scan mode
+    def selectChannel(self, Channel):
+        if self.scan_mode == 0:
+            if Channel >= 8:
+                raise ValueError(f"Invalid single-ended channel {Channel}")
+            self.setChannel(Channel)
+        else:
+            if Channel >= 4:
+                raise ValueError(f"Invalid differential channel {Channel}")
+            self.setDiffChannel(Channel)
+
+
     # sets mode
     # 0: single ended mode
     # 1: differential mode
@@ -204,14 +312,21 @@ class ADS1256:
         self.configADC(GAIN_E['GAIN_1'], DRATE_E['30000SPS'])
         return 0
         
+    # restarts the digital filter on the current MUX setting
+    # DRDY falls once the new conversion has fully settled
+    def startConversion(self):
+        self.transport.write_pair(CMD_FRAMES['CMD_SYNC'], T11_SYNC_NS, CMD_FRAMES['CMD_WAKEUP'])
+
     def read_ADC_Data(self):
         self.waitDRDY()
-        self.digital_write(self.cs_pin, GPIO.LOW)#cs  0
-        self.spi_writebyte([CMD['CMD_RDATA']])
-        self.delay_ms(10)
+        return self.readConversion()
 
-        buf = self.spi_readbytes(3)
-        self.digital_write(self.cs_pin, GPIO.HIGH)#cs 1
+    # reads the data register with RDATA without waiting for DRDY
+    def readConversion(self):
+        return self.decodeData(self.transport.query(CMD_FRAMES['CMD_RDATA'], 3))
+
+    # converts the 3 data bytes into a signed 24-bit value
+    def decodeData(self, buf):
         read = (buf[0]<<16) & 0xff0000
         read |= (buf[1]<<8) & 0xff00
         read |= (buf[2]) & 0xff
@@ -219,6 +334,62 @@ class ADS1256:
         if read & 0x800000:
             read -= 0x1000000
         return read
+
+    # continuous conversion (RDATAC) mode
+    # the MUX is written once and every following conversion is clocked out
+    # as soon as DRDY falls, skipping the WREG/SYNC/WAKEUP/RDATA handshake
+    def startContinuous(self, Channel):
+        """Selects a channel, enters RDATAC mode and returns the first raw value"""
+        self.selectChannel(Channel)
+        self.startConversion()
+
+        # RDATAC must be issued after DRDY goes low, the first result follows after t6
+        self.waitDRDY()
+        buf = self.transport.query(CMD_FRAMES['CMD_RDATAC'], 3)
+        self.continuous = True
+        return self.decodeData(buf)
+
+    def readContinuousData(self):
+        """Reads the next conversion while in RDATAC mode"""
+        self.waitDRDY()
+        return self.decodeData(self.transport.read(3))
+
+    def stopContinuous(self):
+        """Leaves RDATAC mode so registers and RDATA can be used again"""
+        if not self.continuous:
+            return
+        # SDATAC has to be sent while DRDY is low to avoid clashing with new data
+        self.waitDRDY()
+        self.transport.write(CMD_FRAMES['CMD_SDATAC'])
+        self.continuous = False
+
+    def streamChannelValues(self, Channel, num_samples=None):
+        """Yields raw 24-bit values from one channel at the configured data rate
+
+        Args:
+            Channel (int): channel to stream (respects the scan mode)
+            num_samples (int, optional): stop after this many samples. Streams
+                forever when None.
+
+        Note:
+            RDATAC mode is left when the generator finishes or is closed, so
+            always exhaust it or call `close()` before using other functions.
+        """
+        if num_samples is not None and num_samples <= 0:
+            return
+        try:
+            yield self.startContinuous(Channel)
+            count = 1
+            while num_samples is None or count < num_samples:
+                yield self.readContinuousData()
+                count += 1
+        finally:
+            self.stopContinuous()
+
+    def streamChannelVoltages(self, Channel, num_samples=None):
+        """Same as `streamChannelValues()` but yields voltages"""
+        for value in self.streamChannelValues(Channel, num_samples):
+            yield (value * 5.0 / 0x7fffff) / self.gain
  
     def getChannelValue(self, Channel):
         if(self.scan_mode == 0):# 0  Single-ended input  8 channel1 Differential input  4 channe
@@ -226,38 +397,90 @@ class ADS1256:
                 return 0
             # print(self.scan_mode)
             self.setChannel(Channel)
-            self.writeCmd(CMD['CMD_SYNC'])
-            # self.delay_ms(10)
-            self.writeCmd(CMD['CMD_WAKEUP'])
-            # self.delay_ms(200)
+            self.startConversion()
             Value = self.read_ADC_Data()
         else:
             if(Channel>=4):
                 return 0
             self.setDiffChannel(Channel)
-            self.writeCmd(CMD['CMD_SYNC'])
-            self.delay_ms(10)
-            self.writeCmd(CMD['CMD_WAKEUP'])
-            self.delay_ms(10)
+            self.startConversion()
             Value = self.read_ADC_Data()
         return Value
     
+    # pipelined multiplexer scan
+    # once DRDY falls the next channel is written to the MUX and its conversion
+    # started (SYNC/WAKEUP) before the finished result of the previous channel is
+    # read, so every channel only costs one settling time
+    def setScanList(self, channels):
+        """Sets the ordered channel list used by `readScan()`
+
+        Args:
+            channels (list): channel numbers in the current scan mode and/or
+                (positive, negative) input tuples, see `getMuxCode()`
+        """
+        if not channels:
+            raise ValueError("Scan list is empty")
+        self.scan_list = list(channels)
+        self.scan_mux = [self.getMuxCode(channel) for channel in self.scan_list]
+
+    def scanMux(self, mux_codes, next_mux=None):
+        """Runs one pipelined sweep over a list of MUX register values
+
+        Args:
+            mux_codes (list): MUX values to convert in order
+            next_mux (int, optional): MUX value started at the end of the sweep.
+                Defaults to the first entry so repeated sweeps stay pipelined.
+
+        Returns:
+            list: raw 24-bit values in the same order as `mux_codes`
+        """
+        num_channels = len(mux_codes)
+        if next_mux is None:
+            next_mux = mux_codes[0]
+
+        # start the first conversion if it is not already running
+        if self.primed_mux != mux_codes[0]:
+            self.writeReg(REG_E['REG_MUX'], mux_codes[0])
+            self.startConversion()
+
+        values = [0] * num_channels
+        for i in range(num_channels):
+            mux = mux_codes[i + 1] if i + 1 < num_channels else next_mux
+            self.waitDRDY()
+            # WREG MUX + SYNC, t11, WAKEUP + RDATA, t6, read in a single CS window
+            # the data register still holds the result of the previous channel
+            buf = self.transport.write_query(self.getMuxFrame(mux), T11_SYNC_NS, WAKEUP_RDATA_FRAME, 3)
+            values[i] = self.decodeData(buf)
+        self.primed_mux = next_mux
+        return values
+
+    def scanChannels(self, channels, next_channel=None):
+        """Runs one pipelined sweep over `channels` and returns the raw values"""
+        mux_codes = [self.getMuxCode(channel) for channel in channels]
+        next_mux = None if next_channel is None else self.getMuxCode(next_channel)
+        return self.scanMux(mux_codes, next_mux)
+
+    def readScan(self):
+        """Runs one pipelined sweep over the scan list and returns the raw values"""
+        return self.scanMux(self.scan_mux)
+
+    def readScanVoltages(self):
+        """Same as `readScan()` but returns voltages"""
+        return [(value * 5.0 / 0x7fffff) / self.gain for value in self.readScan()]
+
     def getChannelVoltage(self, channel, Vref=2.5):
         value = self.getChannelValue(channel)
         voltage = (value * 5.0 / 0x7fffff) / self.gain
         return voltage
         
-    # returns all values by channel
-    # automatically handles differential mode through getChannelValue
+    # returns all values by channel using a pipelined scan
+    # in differential mode only the first 4 values are used, the rest are 0
     def getAllValues(self):
+        num_channels = 8 if self.scan_mode == 0 else 4
         ADC_Value = [0,0,0,0,0,0,0,0]
-        for i in range(0,8,1):
-            ADC_Value[i] = self.getChannelValue(i)
+        ADC_Value[:num_channels] = self.scanChannels(range(num_channels))
         return ADC_Value
     
     def getAllVoltages(self):
-        ADC_Voltage = [0,0,0,0,0,0,0,0]
-        for i in range(0,8,1):
-            ADC_Voltage[i] = self.getChannelVoltage(i)
-        return ADC_Voltage
+        return [(value * 5.0 / 0x7fffff) / self.gain for value in self.getAllValues()]
 ### END OF FILE ###
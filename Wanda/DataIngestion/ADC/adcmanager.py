@@ -6,7 +6,15 @@
 #TODO change tare to be in ram and have a zero value that is set in the config file
 
 from ADC import ADS1256
+from ADC import decimation
+from ADC import sensormodels
+from ADC import timing
+from ADC.sample import Sample, SampleSchema
+import math
 import numpy as np
+from fractions import Fraction
+import threading
+import time
 import yaml
 
 from datetime import datetime
@@ -23,11 +31,231 @@ module_path = os.path.abspath(__file__)
 module_directory = os.path.dirname(module_path)
 del os
 
+# longest repeating scan table the scheduler will build
+MAX_SCHEDULE_SLOTS = 1000
+
+# an ADC worker further behind its scan grid than this restarts the grid,
+# shorter stalls are caught up so the average sample rates stay exact
+MAX_SCAN_LAG_NS = 100_000_000
+
+
+def build_schedule(rates: list) -> list:
+    """Builds a repeating scan table for the sensors of one ADC
+
+    A sensor with half the rate of the fastest sensor is scanned every second
+    slot, one with a tenth of the rate every tenth slot, and so on. Sensors
+    without a rate are scanned every slot. Sensors are spread over the slots
+    so every slot takes about the same time.
+
+    Args:
+        rates (list): sample rate in Hz (or None) of each sensor, in scan order
+
+    Returns:
+        schedule (list): slots, each a list of sensor indices in scan order
+    """
+    given_rates = [rate for rate in rates if rate]
+    fastest = max(given_rates) if given_rates else 1
+    divisors = [max(1, round(fastest / rate)) if rate else 1 for rate in rates]
+
+    num_slots = 1
+    for divisor in divisors:
+        num_slots = num_slots * divisor // math.gcd(num_slots, divisor)
+    if num_slots > MAX_SCHEDULE_SLOTS:
+        raise ValueError(f"Sensor rates {rates} need a scan table of {num_slots} slots, "
+                         f"use rates whose ratios share common factors")
+
+    load = [0] * num_slots
+    schedule = [[] for _ in range(num_slots)]
+    for sensor_index, divisor in enumerate(divisors):
+        # least loaded offset
+        offset = min(range(divisor), key=lambda o: sum(load[o::divisor]))
+        for slot in range(offset, num_slots, divisor):
+            load[slot] += 1
+            schedule[slot].append(sensor_index)
+    return schedule
+
+
+def channel_rates(drate: int, schedule: list, num_channels: int) -> list:
+    """Returns the raw sample rate of each channel scanned by an `ADCWorker`
+
+    A single channel is read in continuous mode at the data rate. Otherwise
+    each channel gets its share of the paced scan steps in the scan table.
+
+    Args:
+        drate (int): DRATE register value of the ADC
+        schedule (list): scan table, see `build_schedule()`
+        num_channels (int): number of channels in the scan table
+
+    Returns:
+        rates (list): raw sample rate in Hz of each channel as an exact `Fraction`
+    """
+    sps = Fraction(timing.DATA_RATE_SPS[drate])
+    if num_channels == 1:
+        return [sps]
+    step_rate = sps / timing.scan_step_periods(drate)
+    conversions = sum(len(slot) for slot in schedule)
+    return [step_rate * sum(slot.count(channel) for slot in schedule) / conversions
+            for channel in range(num_channels)]
+
+
+class ADCWorker(threading.Thread):
+    """Continuously runs pipelined sweeps over one ADC in its own thread
+
+    The worker cycles through a scan table (see `build_schedule()`), each slot
+    is one pipelined sweep over the channels in it. After every slot the
+    values of all channels are published by replacing `latest` with a new
+    (sweep number, values, DRDY time) tuple, channels that were not in the
+    slot keep their previous value. The DRDY time is the `time.monotonic_ns()`
+    of the last conversion of the slot. The list is never modified after it is published,
+    so readers can use it without taking a lock.
+
+    Channels with a decimator get every raw sample pushed into it and publish
+    the newest decimator output instead of the raw code. An ADC with a single
+    channel is read in continuous (RDATAC) mode to get the full data rate.
+
+    The worker does not scan flat out: the slots start on a fixed grid of scan
+    steps (`timing.scan_step_periods()` conversion periods per channel) and
+    the worker sleeps until the next step, so every channel is sampled at a
+    fixed rate. In continuous mode it sleeps until just before the next
+    conversion and then blocks on DRDY.
+    """
+
+    def __init__(self, adc_id: int, adc: ADS1256.ADS1256, channels: list,
+                 decimators: list = None, schedule: list = None):
+        super().__init__(name=f"ADC{adc_id}", daemon=True)
+        self.adc_id = adc_id
+        self.adc = adc
+        self.channels = channels
+        self.adc.setScanList(channels)
+
+        # one decimator (or None) per channel
+        self.decimators = decimators or [None] * len(channels)
+        # slots of channel indices, defaults to every channel in every slot
+        self.schedule = schedule or [list(range(len(channels)))]
+
+        # scan pacing (see read_slots)
+        self.period_ns = timing.data_period_ns(adc.drate)
+        self.step_ns = self.period_ns * timing.scan_step_periods(adc.drate)
+
+        self.latest = None
+        self.last_read_sweep = 0
+        self.sweep_time_ns = 0 # DRDY time of the sweep returned by get_sweep()
+        self.new_sweep = threading.Event()
+        self.running = False
+        self.error = None
+
+    def sleep_until(self, deadline_ns: int):
+        """Sleeps until `deadline_ns` (`time.monotonic_ns()`) without spinning"""
+        remaining_ns = deadline_ns - time.monotonic_ns()
+        if remaining_ns > 0:
+            time.sleep(remaining_ns / 1e9)
+
+    def read_slots(self):
+        """Yields (channel indices, raw values) of each slot until the worker is stopped"""
+        if len(self.channels) == 1:
+            stream = self.adc.streamChannelValues(self.channels[0])
+            try:
+                for value in stream:
+                    if not self.running:
+                        break
+                    yield self.schedule[0], [value]
+                    # wake up shortly before the next conversion and block on its DRDY
+                    self.sleep_until(int(self.adc.drdy_time_ns + self.period_ns) - timing.SPIN_THRESHOLD_NS)
+            finally:
+                stream.close()
+            return
+
+        # MUX codes of each slot and the first channel of the following slot
+        scan_mux = self.adc.scan_mux
+        slots = []
+        for i, slot in enumerate(self.schedule):
+            next_slot = self.schedule[(i + 1) % len(self.schedule)]
+            slots.append((slot, [scan_mux[channel] for channel in slot], scan_mux[next_slot[0]]))
+
+        # slots start on the grid of scan steps, computed from the start so
+        # sleep overshoot does not accumulate
+        start_ns = time.monotonic_ns()
+        steps = 0
+        while True:
+            for slot, mux_codes, next_mux in slots:
+                if not self.running:
+                    return
+                deadline_ns = start_ns + int(steps * self.step_ns)
+                now_ns = time.monotonic_ns()
+                if now_ns - deadline_ns > MAX_SCAN_LAG_NS:
+                    # stalled for too long, restart the grid instead of catching up
+                    start_ns = now_ns
+                    steps = 0
+                else:
+                    self.sleep_until(deadline_ns)
+                yield slot, self.adc.scanMux(mux_codes, next_mux)
+                steps += len(mux_codes)
+
+    def run(self):
+        sweep = 0
+        outputs = [0] * len(self.channels)
+        slots = self.read_slots()
+        try:
+            for slot, values in slots:
+                outputs = list(outputs)
+                for channel, value in zip(slot, values):
+                    decimator = self.decimators[channel]
+                    if decimator is not None:
+                        decimator.push(value)
+                        # until a decimator has an output the channel reports its raw value
+                        if decimator.output is not None:
+                            value = decimator.output
+                    outputs[channel] = value
+                sweep += 1
+                self.latest = (sweep, outputs, self.adc.drdy_time_ns)
+                self.new_sweep.set()
+        except Exception as e:
+            self.error = e
+            self.new_sweep.set()
+        finally:
+            slots.close()
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self, timeout: float = 1.0):
+        self.running = False
+        self.join(timeout)
+
+    def get_sweep(self, timeout: float = 1.0) -> list:
+        """Returns the raw values of the newest sweep that was not returned yet
+
+        Args:
+            timeout (float): seconds to wait for a new sweep
+
+        Raises:
+            RuntimeError: if the worker failed or no sweep finished in time
+        """
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"ADC{self.adc_id} acquisition failed: {self.error}") from self.error
+            latest = self.latest
+            if latest is not None and latest[0] != self.last_read_sweep:
+                self.last_read_sweep = latest[0]
+                self.sweep_time_ns = latest[2]
+                return latest[1]
+            if not self.new_sweep.wait(timeout):
+                raise RuntimeError(f"ADC{self.adc_id} acquisition stalled")
+            self.new_sweep.clear()
+
 
 class DAQ:
 
-    def __init__(self, config_filename: str):
+    def __init__(self, config_filename: str, default_rate: float = None):
+        """
+        Args:
+            config_filename (str): path of the YAML config file
+            default_rate (float, optional): rate in Hz of the sensors without a
+                `rate`, if None they are scanned in every slot
+        """
         self.config_filename = config_filename
+        self.default_rate = default_rate
 
         self.config = {}
         self.enabled_adc_ids = []
@@ -36,8 +264,28 @@ class DAQ:
         self.sensor_names = []
         self.sensors = {}
 
+        # sensors read by each ADC, in scan order ({adc_id: [Sensor, ...]})
+        self.scan_plan = {}
+        self.schedules = {}         # {adc_id: scan table}, see build_schedule()
+        self.decimation_ratios = {} # {adc_id: raw samples per output of each scanned sensor}
+        self.workers = {}
+
+        # compiled channel plan (see build_scan_plan)
+        self.plan_names = []        # output order of the sensor values
+        self.schema = None          # SampleSchema of `plan_names`
+        self.plan_index = {}        # {adc_id: output index of each scanned channel}
+        self.raw_codes = None       # raw ADC codes in output order (float64 if any sensor is decimated)
+        self.code_scale = None      # code -> volts -> engineering units factor
+        self.code_zero = None       # engineering units offset
+        self.values = None          # reusable structured array with one field per sensor
+        self.values_flat = None     # float64 view of `values`
+        self.sample_time_ns = 0     # time.monotonic_ns() of the newest DRDY in `values`
+        self.sample_seq = 0         # sequence number of the next Sample
+        self.model_groups = []      # [(model, output indices, cold junction index)] for nonlinear models
+
         self.load_ADC_from_config()
         self.load_sensors_from_config()
+        self.build_scan_plan()
 
     def load_ADC_from_config(self):
         if not self.config:
@@ -62,8 +310,10 @@ class DAQ:
             rst_pin = self.config[f"ADC{adc_id}"]["RST_PIN"]
             cs_pin = self.config[f"ADC{adc_id}"]["CS_PIN"]
             drdy_pin = self.config[f"ADC{adc_id}"]["DRDY_PIN"]
+            spi_bus = self.config[f"ADC{adc_id}"].get("spi_bus", 0)
+            spi_device = self.config[f"ADC{adc_id}"].get("spi_device", 0)
 
-            self.adcs[adc_id] = ADS1256.ADS1256(rst_pin, cs_pin, drdy_pin)
+            self.adcs[adc_id] = ADS1256.ADS1256(rst_pin, cs_pin, drdy_pin, spi_bus, spi_device)
             self.init_adc(adc_id)
 
             print_log(f"ADC{adc_id} Initialized")
@@ -73,6 +323,8 @@ class DAQ:
         gain = self.config[f"ADC{adc_id}"]["gain"]
         data_rate = self.config[f"ADC{adc_id}"]["data_rate"]
 
+        adc.setDRDYWait(self.config[f"ADC{adc_id}"].get("drdy_wait", "edge"),
+                        self.config[f"ADC{adc_id}"].get("drdy_timeout_ms", 100))
         adc.init()
         adc.configADC(ADS1256.GAIN_E[gain], ADS1256.DRATE_E[data_rate])
         if not self.config[f"ADC{adc_id}"]["differential"]:
@@ -94,26 +346,227 @@ class DAQ:
             self.sensor_names.append(sensor_name)
             self.sensors[sensor_name] = self.create_sensor(sensor_name)
         
+    def build_scan_plan(self):
+        """Groups the sensors by ADC in the order they are scanned and compiles
+        the calibration of every channel into vectors
+
+        Calibration of a raw code is `code * (5 / 0x7fffff / gain) * scale + zero`,
+        so the first three factors are folded into one `code_scale` per channel.
+        Sensors with a nonlinear model get scale 1 and zero 0 (volts) and are
+        then evaluated in groups of sensors sharing the same model.
+
+        Sensors with a `rate` are scanned according to a repeating scan table
+        per ADC so the ADC time goes to the fastest sensors.
+        """
+        self.scan_plan = {adc_id: [] for adc_id in self.enabled_adc_ids}
+        mapped_sensors = []
+        for sensor_name in self.sensor_names:
+            sensor = self.sensors[sensor_name]
+            if not hasattr(sensor, "adc_id"):
+                continue
+            self.scan_plan[sensor.adc_id].append(sensor)
+            mapped_sensors.append(sensor)
+
+        self.schedules = {}
+        for adc_id, sensors in self.scan_plan.items():
+            if not sensors:
+                continue
+            self.schedules[adc_id] = build_schedule([sensor.rate or self.default_rate for sensor in sensors])
+            if len(self.schedules[adc_id]) > 1:
+                print_log(f"ADC{adc_id} scan table: {len(self.schedules[adc_id])} slots")
+
+        self.build_decimation_ratios()
+
+        self.plan_names = [sensor.name for sensor in mapped_sensors]
+        self.schema = SampleSchema(self.plan_names)
+        output_index = {name: i for i, name in enumerate(self.plan_names)}
+        self.plan_index = {adc_id: np.array([output_index[sensor.name] for sensor in sensors], dtype=np.intp)
+                           for adc_id, sensors in self.scan_plan.items()}
+
+        # decimator outputs are averages of codes, keep their fractional part
+        decimated = any(sensor.decimation for sensor in mapped_sensors)
+        self.raw_codes = np.zeros(len(mapped_sensors), dtype=np.float64 if decimated else np.int32)
+        self.code_scale = np.array([(5.0 / 0x7fffff) / self.adcs[sensor.adc_id].gain * sensor.scale
+                                    for sensor in mapped_sensors], dtype=np.float64)
+        self.code_zero = np.array([sensor.zero for sensor in mapped_sensors], dtype=np.float64)
+
+        self.values = np.zeros(1, dtype=[(name, np.float64) for name in self.plan_names])
+        self.values_flat = self.values.view(np.float64)
+
+        # group nonlinear sensors by model, thermocouples go last since their
+        # cold junction may be measured by another sensor
+        groups = {}
+        for sensor in mapped_sensors:
+            if isinstance(sensor.model, sensormodels.LinearModel):
+                continue
+            if sensor.model.key not in groups:
+                groups[sensor.model.key] = (sensor.model, [])
+            groups[sensor.model.key][1].append(output_index[sensor.name])
+
+        self.model_groups = []
+        for model, indices in groups.values():
+            cold_junction_index = None
+            if isinstance(model, sensormodels.ThermocoupleModel) and isinstance(model.cold_junction, str):
+                cold_junction = self.sensors.get(model.cold_junction)
+                if (cold_junction is None or model.cold_junction not in output_index
+                        or isinstance(cold_junction.model, sensormodels.ThermocoupleModel)):
+                    raise ValueError(f"Cold junction sensor <{model.cold_junction}> must be a mapped, non thermocouple sensor")
+                cold_junction_index = output_index[model.cold_junction]
+            self.model_groups.append((model, np.array(indices, dtype=np.intp), cold_junction_index))
+        self.model_groups.sort(key=lambda group: isinstance(group[0], sensormodels.ThermocoupleModel))
+
+    def build_decimation_ratios(self):
+        """Computes the decimation ratio of every scanned sensor
+
+        A decimated sensor uses the `ratio` of its `decimation` entry. Without
+        one, the raw sample rate of its channel (from the ADC data rate and the
+        scan table, see `channel_rates()`) is divided by its output rate (its
+        `rate` or the DAQ's `default_rate`) and rounded to a whole number. The
+        effective output rate of every decimated sensor is logged.
+
+        Raises:
+            ValueError: if a decimation config is invalid
+        """
+        self.decimation_ratios = {}
+        for adc_id, sensors in self.scan_plan.items():
+            if not sensors:
+                continue
+            raw_rates = channel_rates(self.adcs[adc_id].drate, self.schedules[adc_id], len(sensors))
+            ratios = []
+            for sensor, raw_rate in zip(sensors, raw_rates):
+                ratio = 1
+                if sensor.decimation:
+                    output_rate = sensor.rate or self.default_rate
+                    if sensor.decimation.get("ratio") is not None:
+                        ratio = int(sensor.decimation["ratio"])
+                    elif output_rate:
+                        ratio = decimation.decimation_ratio(raw_rate, output_rate)
+                    else:
+                        raise ValueError(f"Decimated sensor <{sensor.name}> needs a `ratio`, a `rate` or a DAQ default rate")
+                    try:
+                        # fail on a bad decimation config at startup instead of in the worker
+                        decimation.create_decimator(sensor.decimation, ratio)
+                    except ValueError as e:
+                        raise ValueError(f"Decimation of sensor <{sensor.name}> on ADC{adc_id}: {e}") from e
+                    print_log(f"Decimation <{sensor.name}>: {float(raw_rate):g} Hz / {ratio} = "
+                              f"{float(raw_rate / ratio):g} Hz"
+                              + (f" (output rate {output_rate:g} Hz)" if output_rate else ""))
+                ratios.append(ratio)
+            self.decimation_ratios[adc_id] = ratios
+
+    def start_acquisition(self):
+        """Starts one worker thread per ADC that scans its sensors continuously"""
+        if self.workers:
+            return
+        for adc_id, sensors in self.scan_plan.items():
+            if not sensors:
+                continue
+            channels = [sensor.channel_id for sensor in sensors]
+            # fresh decimators so no samples from a previous run are mixed in
+            decimators = [decimation.create_decimator(sensor.decimation, ratio)
+                          for sensor, ratio in zip(sensors, self.decimation_ratios[adc_id])]
+            self.workers[adc_id] = ADCWorker(adc_id, self.adcs[adc_id], channels, decimators,
+                                             self.schedules[adc_id])
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop_acquisition(self) -> bool:
+        """Stops the ADC worker threads. Returns True if they were running."""
+        if not self.workers:
+            return False
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers = {}
+        return True
+
     def get_sensor_names(self) -> list:
         return self.sensor_names       
 
     def get_sensor_dict(self) -> dict:
         return self.sensors
 
+    def get_rate_groups(self) -> dict:
+        """Groups the mapped sensors by their configured `rate`
+
+        Sensors without a `rate` use the DAQ's `default_rate`.
+
+        Returns:
+            groups (dict): {rate: [sensor_name, ...]} sorted from fastest to slowest
+        """
+        groups = {}
+        for name in self.plan_names:
+            rate = self.sensors[name].rate or self.default_rate
+            groups.setdefault(rate, []).append(name)
+        return dict(sorted(groups.items(), reverse=True))
+
     def get_all_sensor_values(self) -> dict:
         """
         Fetches and applies calibration to all configured sensors.
+
+        The ADCs are read concurrently by their worker threads (started on the
+        first call), each sweep is only returned once.
         
         Returns:
             results (dict): dictionary of {sensor_name: calibrated_value}.
         """
-        sensor_values = {}
-        for sensor in self.sensors.values():
-            sensor_values[sensor.name] = sensor.get_calibrated_value_linear()
-        return sensor_values
+        return self.get_sample().as_dict()
+
+    def get_sample(self, schema: SampleSchema = None) -> Sample:
+        """
+        Fetches all sensors like `get_all_sensor_values()` as a compact `Sample`.
+
+        Args:
+            schema (SampleSchema): schema of the sample, defaults to `schema`. It
+                must start with `plan_names`, values of any extra (derived)
+                channels after them are left at 0 for the caller to fill.
+
+        Returns:
+            sample (Sample): calibrated values, stamped with the DRDY time of
+                the newest conversion (`time.monotonic_ns()`).
+        """
+        schema = schema or self.schema
+        values = np.zeros(len(schema))
+        values[:len(self.plan_names)] = self.get_all_sensor_array().view(np.float64)
+        sample = Sample(schema, self.sample_seq, self.sample_time_ns, values)
+        self.sample_seq += 1
+        return sample
+
+    def get_all_sensor_array(self) -> np.ndarray:
+        """
+        Fetches and applies calibration to all configured sensors without
+        building any per-sensor Python objects.
+
+        Returns:
+            values (np.ndarray): structured array of shape (1,) with one float64
+                field per sensor. The same array is overwritten on every call,
+                copy it if the values need to be kept. The DRDY time of the
+                newest conversion is stored in `sample_time_ns`.
+        """
+        self.start_acquisition()
+
+        for adc_id, worker in self.workers.items():
+            self.raw_codes[self.plan_index[adc_id]] = worker.get_sweep()
+        self.sample_time_ns = max((worker.sweep_time_ns for worker in self.workers.values()), default=0)
+
+        np.multiply(self.raw_codes, self.code_scale, out=self.values_flat)
+        np.add(self.values_flat, self.code_zero, out=self.values_flat)
+
+        for model, indices, cold_junction_index in self.model_groups:
+            if cold_junction_index is None:
+                self.values_flat[indices] = model.evaluate(self.values_flat[indices])
+            else:
+                self.values_flat[indices] = model.evaluate(self.values_flat[indices], self.values_flat[cold_junction_index])
+        return self.values
     
+    def get_drdy_timeouts(self) -> dict:
+        """Returns the number of DRDY timeouts for each ADC as {adc_id: count}."""
+        return {adc_id: adc.getDRDYTimeouts() for adc_id, adc in self.adcs.items()}
+
     def check_health(self, retries: int = 1) -> bool:
         """Checks if the connected ADCs are responding properly, and attempts to reconnect if not."""
+        # the workers own the ADCs while they run
+        was_acquiring = self.stop_acquisition()
+
         all_healthy = True
         for adc_id, adc in self.adcs.items():
             chip_id = adc.readChipID()
@@ -135,9 +588,13 @@ class DAQ:
                 if not reconnected:
                     print_log(f"ADC{adc_id} reconnection failed.")
                     all_healthy = False
+
+        if was_acquiring and all_healthy:
+            self.start_acquisition()
         return all_healthy
 
     def cleanup(self):
+        self.stop_acquisition()
         for adc in self.adcs.values():
             adc.module_exit()
     
@@ -192,18 +649,31 @@ class Sensor:
             return
             # might raise some exception here
 
-        self.zero = self.daq.config["sensors"][sensor_name]["zero"]
-        if self.zero == None:
-            self.zero = 0
-            print_log(f"Warning no zero set for sensor <{self.name}> check config file")
-
-        self.scale = self.daq.config["sensors"][sensor_name]["scale"]
-        if self.scale == None:
-            self.scale = 1
-            print_log(f"Warning no scale set for sensor <{self.name}> check config file")
+        sensor_config = self.daq.config["sensors"][sensor_name] or {}
+        self.model = sensormodels.create_model(sensor_config)
+        self.decimation = sensor_config.get("decimation")
+        # sample rate in Hz, None scans the sensor in every slot
+        self.rate = sensor_config.get("rate")
+        if self.rate is not None and self.rate <= 0:
+            raise ValueError(f"Rate of sensor <{self.name}> must be positive")
+
+        # nonlinear models are applied to the voltage
+        self.zero = 0
+        self.scale = 1
+        if isinstance(self.model, sensormodels.LinearModel):
+            if sensor_config.get("zero") is None:
+                print_log(f"Warning no zero set for sensor <{self.name}> check config file")
+            if sensor_config.get("scale") is None:
+                print_log(f"Warning no scale set for sensor <{self.name}> check config file")
+            self.zero = self.model.zero
+            self.scale = self.model.scale
 
     def get_voltage(self) -> float:
         """Gets the voltages of a sensor
+
+        Note:
+            Reads the ADC directly, do not use while the DAQ acquisition
+            threads are running (see `DAQ.start_acquisition()`).
         
         Returns:
             sensor_voltage (float): the voltage (0-5V) returned from the sensor
@@ -218,8 +688,23 @@ class Sensor:
         Returns:
             cal_value (float): the calibrated value from the sensor
         """
-        cal_value = self.get_voltage()*self.scale + self.zero
-        return cal_value
+        return self.calibrate_linear(self.get_voltage())
+
+    def get_calibrated_value(self) -> float:
+        """Gets the calibrated value using the calibration model from the config file
+
+        Returns:
+            cal_value (float): the calibrated value from the sensor
+        """
+        voltage = self.get_voltage()
+        if isinstance(self.model, sensormodels.ThermocoupleModel) and isinstance(self.model.cold_junction, str):
+            cold_junction = self.daq.sensors[self.model.cold_junction].get_calibrated_value()
+            return float(self.model.evaluate(voltage, cold_junction))
+        return float(self.model.evaluate(voltage))
+
+    def calibrate_linear(self, voltage: float) -> float:
+        """Applies the zero and scale from the config file to a voltage"""
+        return voltage*self.scale + self.zero
 
     # def calibrate_tare(self, num_samples: int):
     #     """Calibrates the tare of the load cell from several samples
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Decimation filters between the ADC and ingestion
+
+The ADCs convert much faster than the ingest rate. Instead of dropping the
+extra conversions, every raw sample of a sensor is pushed into a decimator
+which outputs one filtered value every `ratio` samples, lowering the noise
+without raising the number of rows written.
+
+Decimators are configured per sensor with the `decimation` key in the
+`sensors` section of the config file (see the ADC README). Without a
+configured `ratio` the raw sample rate of the channel divided by the output
+rate of the sensor is used, rounded to a whole number (see `decimation_ratio()`).
+"""
+
+from fractions import Fraction
+
+import numpy as np
+
+
+class BoxcarDecimator:
+    """Averages each block of `ratio` samples"""
+
+    def __init__(self, ratio: int):
+        self.ratio = ratio
+        self.total = 0
+        self.count = 0
+        self.output = None
+
+    def push(self, value) -> bool:
+        """Adds a sample, returns True when a new `output` is available"""
+        self.total += value
+        self.count += 1
+        if self.count < self.ratio:
+            return False
+        self.output = self.total / self.ratio
+        self.total = 0
+        self.count = 0
+        return True
+
+
+class CICDecimator:
+    """Cascaded integrator-comb decimator (differential delay of 1)
+
+    Integer raw codes keep the integrators exact (Python ints do not overflow).
+    The output is normalized by the DC gain `ratio ** order`.
+    """
+
+    def __init__(self, ratio: int, order: int = 3):
+        self.ratio = ratio
+        self.order = order
+        self.gain = ratio ** order
+        self.integrators = [0] * order
+        self.combs = [0] * order
+        self.count = 0
+        self.output = None
+
+    def push(self, value) -> bool:
+        """Adds a sample, returns True when a new `output` is available"""
+        integrators = self.integrators
+        for stage in range(self.order):
+            value += integrators[stage]
+            integrators[stage] = value
+        self.count += 1
+        if self.count < self.ratio:
+            return False
+        self.count = 0
+
+        for stage in range(self.order):
+            previous = self.combs[stage]
+            self.combs[stage] = value
+            value -= previous
+        self.output = value / self.gain
+        return True
+
+
+def design_lowpass(ratio: int, num_taps: int) -> np.ndarray:
+    """Windowed-sinc (Hamming) low pass with its cutoff at the output Nyquist rate"""
+    cutoff = 0.5 / ratio  # cycles per input sample
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+    return taps / np.sum(taps)
+
+
+class FIRDecimator:
+    """FIR low pass evaluated once every `ratio` samples"""
+
+    def __init__(self, ratio: int, taps=None):
+        self.ratio = ratio
+        if taps is None:
+            taps = 4 * ratio + 1
+        if isinstance(taps, int):
+            taps = design_lowpass(ratio, taps)
+        # reversed so the newest sample lines up with taps[0]
+        self.taps = np.asarray(taps, dtype=np.float64)[::-1].copy()
+        self.num_taps = len(self.taps)
+
+        # samples are written twice so the newest `num_taps` are always contiguous
+        self.buffer = np.zeros(2 * self.num_taps)
+        self.position = 0
+        self.filled = False
+        self.count = 0
+        self.output = None
+
+    def push(self, value) -> bool:
+        """Adds a sample, returns True when a new `output` is available"""
+        if not self.filled:
+            # start from a settled state instead of ramping up from zero
+            self.buffer[:] = value
+            self.filled = True
+        self.buffer[self.position] = value
+        self.buffer[self.position + self.num_taps] = value
+        self.position = (self.position + 1) % self.num_taps
+
+        self.count += 1
+        if self.count < self.ratio:
+            return False
+        self.count = 0
+        window = self.buffer[self.position:self.position + self.num_taps]
+        self.output = float(np.dot(self.taps, window))
+        return True
+
+
+def decimation_ratio(input_rate, output_rate) -> int:
+    """Returns the whole number of raw samples per output closest to `input_rate / output_rate`
+
+    Args:
+        input_rate: raw sample rate of the channel in Hz
+        output_rate: rate in Hz the decimated values are read at
+
+    The decimated output then runs at `input_rate / ratio`, which is only
+    exactly `output_rate` if the input rate is a whole multiple of it.
+    """
+    return max(1, round(Fraction(input_rate) / Fraction(output_rate)))
+
+
+def create_decimator(decimation_config: dict, ratio: int = 1):
+    """Creates the decimator described by the `decimation` entry of a sensor
+
+    Args:
+        decimation_config (dict): `decimation` entry of the sensor
+        ratio (int): raw samples per output used if the entry has no `ratio`,
+            see `decimation_ratio()`
+
+    Returns None if the sensor is not decimated.
+    """
+    if not decimation_config:
+        return None
+
+    filter_type = decimation_config.get("filter", "boxcar")
+    ratio = int(decimation_config.get("ratio", ratio))
+    if ratio < 1:
+        raise ValueError(f"Decimation ratio must be at least 1, got {ratio}")
+    if ratio == 1:
+        return None
+
+    if filter_type == "boxcar":
+        return BoxcarDecimator(ratio)
+    if filter_type == "cic":
+        return CICDecimator(ratio, int(decimation_config.get("order", 3)))
+    if filter_type == "fir":
+        return FIRDecimator(ratio, decimation_config.get("taps"))
+    raise ValueError(f"Unknown decimation filter <{filter_type}>")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Compact sample records
+
+A `SampleSchema` holds the channel names of a sample stream once. Every
+`Sample` only carries its sequence number, timestamp and one float64 NumPy
+vector in schema order, so passing a sample through the ingest pipeline does
+not build a dict, a key per channel or a float object per value.
+"""
+
+import numpy as np
+
+
+class SampleSchema:
+    """Channel names of a sample stream and their positions in `Sample.values`"""
+
+    __slots__ = ("names", "index")
+
+    def __init__(self, names: list):
+        self.names = tuple(names)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError(f"Duplicate channel names in sample schema {self.names}")
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def indices(self, names: list) -> np.ndarray:
+        """Returns the positions of `names` in the value vectors"""
+        return np.array([self.index[name] for name in names], dtype=np.intp)
+
+
+class Sample:
+    """One reading of every channel of a schema"""
+
+    __slots__ = ("schema", "seq", "time_ns", "values")
+
+    def __init__(self, schema: SampleSchema, seq: int, time_ns: int, values: np.ndarray):
+        """
+        Args:
+            schema (SampleSchema): names of the values
+            seq (int): sequence number of the sample in its stream
+            time_ns (int): timestamp in ns
+            values (np.ndarray): float64 vector in schema order, owned by the sample
+        """
+        self.schema = schema
+        self.seq = seq
+        self.time_ns = time_ns
+        self.values = values
+
+    def __getitem__(self, name: str) -> float:
+        return self.values[self.schema.index[name]]
+
+    def __setitem__(self, name: str, value: float):
+        self.values[self.schema.index[name]] = value
+
+    def as_dict(self) -> dict:
+        """Returns {channel_name: value}, for callers that want the old dict form"""
+        return dict(zip(self.schema.names, self.values.tolist()))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Calibration models that convert sensor voltages to engineering units
+
+Models are selected per sensor with the `model` key in the `sensors` section of
+the config file (see the ADC README). All models evaluate NumPy arrays so a
+whole block of samples, or all sensors sharing a model, can be converted in
+one call. Lookup tables are built once at startup, evaluation is a binary
+search + linear interpolation.
+
+Models with equal parameters have equal `key`s, which the DAQ uses to group
+sensors that can be evaluated together.
+"""
+
+import numpy as np
+
+# NIST ITS-90 thermocouple reference functions, E(t) in mV for t in degC
+# each range is (t_min, t_max, coefficients c0..cn, exponential term or None)
+# the exponential term (a0, a1, a2) adds a0 * exp(a1 * (t - a2)^2)
+THERMOCOUPLE_FUNCTIONS = {
+    'K': [
+        (-270.0, 0.0,
+         [0.0, 0.394501280250E-01, 0.236223735980E-04, -0.328589067840E-06,
+          -0.499048287770E-08, -0.675090591730E-10, -0.574103274280E-12,
+          -0.310888728940E-14, -0.104516093650E-16, -0.198892668780E-19,
+          -0.163226974860E-22],
+         None),
+        (0.0, 1372.0,
+         [-0.176004136860E-01, 0.389212049750E-01, 0.185587700320E-04,
+          -0.994575928740E-07, 0.318409457190E-09, -0.560728448890E-12,
+          0.560750590590E-15, -0.320207200030E-18, 0.971511471520E-22,
+          -0.121047212750E-25],
+         (0.118597600000E+00, -0.118343200000E-03, 0.126968600000E+03)),
+    ],
+    'T': [
+        (-270.0, 0.0,
+         [0.0, 3.8748106364E-02, 4.4194434347E-05, 1.1844323105E-07,
+          2.0032973554E-08, 9.0138019559E-10, 2.2651156593E-11,
+          3.6071154205E-13, 3.8493939883E-15, 2.8213521925E-17,
+          1.4251594779E-19, 4.8768662286E-22, 1.0795539270E-24,
+          1.3945027062E-27, 7.9795153927E-31],
+         None),
+        (0.0, 400.0,
+         [0.0, 3.8748106364E-02, 3.3292227880E-05, 2.0618243404E-07,
+          -2.1882256846E-09, 1.0996880928E-11, -3.0815758772E-14,
+          4.5479135290E-17, -2.7512901673E-20],
+         None),
+    ],
+}
+
+# temperature step of the precomputed thermocouple tables in degC
+THERMOCOUPLE_TABLE_STEP = 0.1
+
+
+class LinearModel:
+    """value = voltage * scale + zero"""
+    name = "linear"
+
+    def __init__(self, scale: float = 1, zero: float = 0):
+        self.scale = scale
+        self.zero = zero
+        self.key = (self.name, scale, zero)
+
+    def evaluate(self, volts):
+        return volts * self.scale + self.zero
+
+
+class PolynomialModel:
+    """value = c0 + c1 * voltage + c2 * voltage^2 + ..."""
+    name = "polynomial"
+
+    def __init__(self, coefficients: list):
+        if not coefficients:
+            raise ValueError("Polynomial model needs at least one coefficient")
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.key = (self.name, tuple(self.coefficients))
+
+    def evaluate(self, volts):
+        return np.polynomial.polynomial.polyval(volts, self.coefficients)
+
+
+class LookupTableModel:
+    """Piecewise-linear interpolation between (voltage, value) points
+
+    Voltages outside of the table are clamped to the first/last value.
+    """
+    name = "table"
+
+    def __init__(self, table: list):
+        points = np.asarray(table, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 2:
+            raise ValueError("Lookup table must be a list of at least two [voltage, value] pairs")
+        order = np.argsort(points[:, 0])
+        self.volts = np.ascontiguousarray(points[order, 0])
+        self.values = np.ascontiguousarray(points[order, 1])
+        if np.any(np.diff(self.volts) == 0):
+            raise ValueError("Lookup table has duplicate voltages")
+        self.key = (self.name, tuple(self.volts), tuple(self.values))
+
+    def evaluate(self, volts):
+        return np.interp(volts, self.volts, self.values)
+
+
+def thermocouple_emf(tc_type: str, temperature):
+    """Evaluates the NIST reference function E(t) in mV"""
+    temperature = np.asarray(temperature, dtype=np.float64)
+    emf = np.zeros_like(temperature)
+    for t_min, t_max, coefficients, exponential in THERMOCOUPLE_FUNCTIONS[tc_type]:
+        in_range = (temperature >= t_min) & (temperature <= t_max)
+        t = temperature[in_range]
+        e = np.polynomial.polynomial.polyval(t, coefficients)
+        if exponential is not None:
+            a0, a1, a2 = exponential
+            e = e + a0 * np.exp(a1 * (t - a2) ** 2)
+        emf[in_range] = e
+    return emf
+
+
+class ThermocoupleModel:
+    """Thermocouple voltage to temperature (degC) with cold junction compensation
+
+    The NIST reference function is tabulated once at startup and inverted with
+    a binary search, the thermocouple voltage is read in volts and converted
+    to mV. The cold junction temperature is either a constant or, when the DAQ
+    is given the name of a sensor, the value of that sensor.
+    """
+    name = "thermocouple"
+
+    def __init__(self, tc_type: str = 'K', cold_junction=25.0):
+        tc_type = str(tc_type).upper()
+        if tc_type not in THERMOCOUPLE_FUNCTIONS:
+            raise ValueError(f"Unsupported thermocouple type <{tc_type}>, "
+                             f"supported: {list(THERMOCOUPLE_FUNCTIONS)}")
+        self.tc_type = tc_type
+        # either a temperature in degC or a sensor name (resolved by the DAQ)
+        self.cold_junction = cold_junction
+        self.key = (self.name, tc_type, cold_junction)
+
+        ranges = THERMOCOUPLE_FUNCTIONS[tc_type]
+        t_min, t_max = ranges[0][0], ranges[-1][1]
+        num_points = int(round((t_max - t_min) / THERMOCOUPLE_TABLE_STEP)) + 1
+        self.table_temperature = np.linspace(t_min, t_max, num_points)
+        self.table_emf = thermocouple_emf(tc_type, self.table_temperature)
+
+    def cold_junction_emf(self, cold_junction_temperature):
+        return np.interp(cold_junction_temperature, self.table_temperature, self.table_emf)
+
+    def evaluate(self, volts, cold_junction_temperature=None):
+        if cold_junction_temperature is None:
+            cold_junction_temperature = self.cold_junction
+        emf = volts * 1000 + self.cold_junction_emf(cold_junction_temperature)
+        return np.interp(emf, self.table_emf, self.table_temperature)
+
+
+def create_model(sensor_config: dict):
+    """Creates the calibration model described by a sensor entry of the config file
+
+    Sensors without a `model` key use the linear model with `scale` and `zero`.
+    """
+    model_type = sensor_config.get("model") or "linear"
+
+    if model_type == "linear":
+        scale = sensor_config.get("scale")
+        zero = sensor_config.get("zero")
+        return LinearModel(1 if scale is None else scale, 0 if zero is None else zero)
+    if model_type == "polynomial":
+        return PolynomialModel(sensor_config["coefficients"])
+    if model_type == "table":
+        return LookupTableModel(sensor_config["table"])
+    if model_type == "thermocouple":
+        return ThermocoupleModel(sensor_config.get("type", 'K'), sensor_config.get("cold_junction", 25.0))
+    raise ValueError(f"Unknown calibration model <{model_type}>")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Precise delays for the ADS1256 library
+
+`time.sleep()` on the Pi overshoots by 50-100 us, which is longer than most of
+the ADS1256 serial interface delays and a large part of the settling time at
+high data rates. Delays here sleep for the bulk of the wait and spin on
+`time.perf_counter_ns()` for the last part so they land within a few
+microseconds of the target.
+
+Delays are expressed in ADS1256 master clock periods (tCLKIN) so they can be
+taken directly from the datasheet.
+"""
+
+import math
+import time
+
+# master clock of the ADS1256 on the KXR Pi hat
+CLKIN_HZ = 7_680_000
+T_CLKIN_NS = 1e9 / CLKIN_HZ  # ~130 ns
+
+# serial interface timing in tCLKIN (datasheet, timing characteristics)
+T6_CLKIN = 50           # RDATA/RDATAC/RREG command -> first data bit
+T11_SYNC_CLKIN = 24     # SYNC -> next command
+T11_CMD_CLKIN = 4       # RREG/WREG/RDATA -> next command
+
+# settling time in ms for each DRATE register value (datasheet table 13)
+SETTLING_TIME_MS = {0xF0: 0.21,    # 30000SPS
+                    0xE0: 0.25,    # 15000SPS
+                    0xD0: 0.31,    # 7500SPS
+                    0xC0: 0.44,    # 3750SPS
+                    0xB0: 0.68,    # 2000SPS
+                    0xA1: 1.18,    # 1000SPS
+                    0x92: 2.18,    # 500SPS
+                    0x82: 10.18,   # 100SPS
+                    0x72: 16.84,   # 60SPS
+                    0x63: 20.18,   # 50SPS
+                    0x53: 33.51,   # 30SPS
+                    0x43: 40.18,   # 25SPS
+                    0x33: 66.84,   # 15SPS
+                    0x20: 100.18,  # 10SPS
+                    0x13: 200.18,  # 5SPS
+                    0x03: 400.18,  # 2d5SPS
+                    }
+
+# output data rate in SPS for each DRATE register value
+DATA_RATE_SPS = {0xF0: 30000,
+                 0xE0: 15000,
+                 0xD0: 7500,
+                 0xC0: 3750,
+                 0xB0: 2000,
+                 0xA1: 1000,
+                 0x92: 500,
+                 0x82: 100,
+                 0x72: 60,
+                 0x63: 50,
+                 0x53: 30,
+                 0x43: 25,
+                 0x33: 15,
+                 0x20: 10,
+                 0x13: 5,
+                 0x03: 2.5,
+                 }
+
+# DRDY wakeup latency and SPI transfer of one pipelined scan step, on top of
+# the settling time of the conversion
+SCAN_STEP_OVERHEAD_NS = 150_000
+
+# waits shorter than this are spun entirely, longer waits sleep until this
+# much time is left (covers the scheduler wakeup latency of the Pi)
+SPIN_THRESHOLD_NS = 200_000
+
+
+def delay_ns(delaytime: int):
+    """Waits `delaytime` nanoseconds using a hybrid sleep + spin"""
+    deadline = time.perf_counter_ns() + delaytime
+    wait_until_ns(deadline)
+
+
+def wait_until_ns(deadline: int):
+    """Waits until `time.perf_counter_ns()` reaches `deadline`"""
+    remaining = deadline - time.perf_counter_ns()
+    if remaining > SPIN_THRESHOLD_NS:
+        time.sleep((remaining - SPIN_THRESHOLD_NS) / 1e9)
+    while time.perf_counter_ns() < deadline:
+        pass
+
+
+def delay_us(delaytime: float):
+    """Waits `delaytime` microseconds"""
+    delay_ns(int(delaytime * 1000))
+
+
+def delay_ms(delaytime: float):
+    """Waits `delaytime` milliseconds"""
+    delay_ns(int(delaytime * 1_000_000))
+
+
+def clkin_to_ns(periods: float) -> int:
+    """Converts ADS1256 master clock periods to nanoseconds"""
+    return int(periods * T_CLKIN_NS + 0.5)
+
+
+def settling_time_clkin(drate: int) -> int:
+    """Returns the settling time in tCLKIN for a DRATE register value"""
+    return int(SETTLING_TIME_MS[drate] * CLKIN_HZ / 1000 + 0.5)
+
+
+def settling_time_us(drate: int) -> float:
+    """Returns the settling time in microseconds for a DRATE register value"""
+    return clkin_to_ns(settling_time_clkin(drate)) / 1000
+
+
+def data_period_ns(drate: int) -> float:
+    """Returns the conversion period in nanoseconds of continuous conversions for a DRATE register value"""
+    return 1e9 / DATA_RATE_SPS[drate]
+
+
+def scan_step_periods(drate: int) -> int:
+    """Returns the number of conversion periods one pipelined scan step is paced to
+
+    A MUX change restarts the digital filter, so a step takes one settling
+    time plus the step overhead. It is rounded up to whole conversion periods
+    so the per-channel sample rates of a scan are exact fractions of the data rate.
+    """
+    step_ns = SETTLING_TIME_MS[drate] * 1e6 + SCAN_STEP_OVERHEAD_NS
+    return math.ceil(step_ns / data_period_ns(drate) - 1e-9)
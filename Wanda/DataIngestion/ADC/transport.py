@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""SPI transport for the ADS1256 library
+
+Each ADS1256 transaction is one chip select window in which every frame is
+sent with a single `xfer2` call. Frames are passed as preallocated `bytes`
+objects so the hot path does not build new lists for every sample.
+
+The Pi hat drives CS from a GPIO (the `spi0-0cs` overlay frees CE0/CE1), and
+RDATA/RREG need a t6 gap between the command and the data with CS held low,
+so CS stays under software control here.
+
+Every transport opens its own handle to the bus, so each ADC can be driven
+from its own thread. Chips on the same bus share a lock that is held for the
+duration of a CS window.
+"""
+
+import os
+import sys
+import threading
+
+# the hardware backends (Pi or simulator) live in Wanda/hardware
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from hardware import GPIO, spidev
+
+try:
+    from . import timing
+except ImportError: # imported as a top level module
+    import timing
+
+# zero filled frames used to clock data out of the chip (DIN must stay low in RDATAC mode)
+READ_FRAMES = {num_bytes: bytes(num_bytes) for num_bytes in range(1, 5)}
+
+T6_NS = timing.clkin_to_ns(timing.T6_CLKIN)
+
+# one lock per SPI bus, shared by all transports on that bus
+_bus_locks = {}
+_bus_locks_lock = threading.Lock()
+
+
+def get_bus_lock(bus: int) -> threading.Lock:
+    with _bus_locks_lock:
+        if bus not in _bus_locks:
+            _bus_locks[bus] = threading.Lock()
+        return _bus_locks[bus]
+
+
+class SpiTransport:
+    """Sends frames to one chip on an SPI bus with a GPIO chip select"""
+
+    def __init__(self, cs_pin, bus=0, device=0, max_speed_hz=500000, mode=0b01):
+        """
+        Args:
+            cs_pin (int): BCM pin number of the chip select
+            bus (int): SPI bus number
+            device (int): spidev device number on the bus
+            max_speed_hz (int): SCLK frequency
+            mode (int): SPI mode (the ADS1256 uses mode 1)
+        """
+        self.cs_pin = cs_pin
+        self.bus = bus
+        self.device = device
+        self.max_speed_hz = max_speed_hz
+        self.mode = mode
+        self.spi = None
+        self.lock = get_bus_lock(bus)
+
+    def open(self):
+        if self.spi is not None:
+            return
+        self.spi = spidev.SpiDev(self.bus, self.device)
+        self.spi.max_speed_hz = self.max_speed_hz
+        self.spi.mode = self.mode
+
+    def close(self):
+        if self.spi is not None:
+            self.spi.close()
+            self.spi = None
+
+    def write(self, frame):
+        """Sends one frame"""
+        with self.lock:
+            GPIO.output(self.cs_pin, GPIO.LOW)
+            self.spi.xfer2(frame)
+            GPIO.output(self.cs_pin, GPIO.HIGH)
+
+    def write_pair(self, first, gap_ns, second):
+        """Sends two frames in one CS window with `gap_ns` between them"""
+        with self.lock:
+            GPIO.output(self.cs_pin, GPIO.LOW)
+            self.spi.xfer2(first)
+            timing.delay_ns(gap_ns)
+            self.spi.xfer2(second)
+            GPIO.output(self.cs_pin, GPIO.HIGH)
+
+    def read(self, num_bytes):
+        """Clocks out `num_bytes` without sending a command (RDATAC mode)"""
+        with self.lock:
+            GPIO.output(self.cs_pin, GPIO.LOW)
+            data = self.spi.xfer2(READ_FRAMES[num_bytes])
+            GPIO.output(self.cs_pin, GPIO.HIGH)
+        return data
+
+    def query(self, frame, num_bytes):
+        """Sends a read command (RDATA, RDATAC, RREG), waits t6 and reads the response"""
+        with self.lock:
+            GPIO.output(self.cs_pin, GPIO.LOW)
+            self.spi.xfer2(frame)
+            timing.delay_ns(T6_NS)
+            data = self.spi.xfer2(READ_FRAMES[num_bytes])
+            GPIO.output(self.cs_pin, GPIO.HIGH)
+        return data
+
+    def write_query(self, first, gap_ns, frame, num_bytes):
+        """Sends a frame, waits `gap_ns`, then runs `query()` in the same CS window"""
+        with self.lock:
+            GPIO.output(self.cs_pin, GPIO.LOW)
+            self.spi.xfer2(first)
+            timing.delay_ns(gap_ns)
+            self.spi.xfer2(frame)
+            timing.delay_ns(T6_NS)
+            data = self.spi.xfer2(READ_FRAMES[num_bytes])
+            GPIO.output(self.cs_pin, GPIO.HIGH)
+        return data
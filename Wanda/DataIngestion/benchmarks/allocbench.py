@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Measures the allocations of the ingest hot path per sample
+
+Compares the original dict packets (`get_all_sensor_values()` dict, a dict per
+QuestDB row, a packet dict and a dict copy for Grafana) with `Sample`
+records, from the DAQ values to the QuestDB column batches and the Grafana
+filters. The DAQ is emulated with a preallocated structured array, so no
+hardware is needed.
+
+tracemalloc measures the memory blocks a sample keeps alive while it waits in
+the queues (producer side) and the peak of the consumer side (the column
+batches are allocated beforehand).
+
+Usage:
+    python benchmarks/allocbench.py [--sensors N] [--samples N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+module_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(module_directory))
+
+from ADC.sample import Sample, SampleSchema
+from columnbatch import ColumnBatch
+from filters import FilterEngine
+
+LOAD_CELLS = ['s0', 's1', 's2']
+DEFAULT_CHAIN = [{'filter': 'median', 'window': 10}, {'filter': 'ema', 'strength': 0.25}]
+
+
+class BenchDAQ:
+    """Stands in for `DAQ`, returns the same calibrated array on every read"""
+
+    def __init__(self, names: list):
+        self.plan_names = list(names)
+        self.schema = SampleSchema(self.plan_names)
+        self.values = np.zeros(1, dtype=[(name, np.float64) for name in names])
+        self.values.view(np.float64)[:] = np.random.default_rng(0).normal(100, 5, len(names))
+        self.sample_time_ns = 0
+        self.sample_seq = 0
+
+    def get_all_sensor_array(self) -> np.ndarray:
+        self.sample_time_ns += 10_000_000
+        return self.values
+
+    def get_all_sensor_values(self) -> dict:
+        """The original dict form"""
+        return dict(zip(self.plan_names, self.get_all_sensor_array()[0].tolist()))
+
+    def get_sample(self, schema: SampleSchema) -> Sample:
+        """Same as `DAQ.get_sample()`"""
+        values = np.zeros(len(schema))
+        values[:len(self.plan_names)] = self.get_all_sensor_array().view(np.float64)
+        sample = Sample(schema, self.sample_seq, self.sample_time_ns, values)
+        self.sample_seq += 1
+        return sample
+
+
+def legacy_producer(daq: BenchDAQ, groups: list, row_count: int) -> tuple:
+    """The original per-sample loop body: dict columns, dict rows and a packet dict"""
+    columns = daq.get_all_sensor_values()
+    columns['lc_net_force'] = sum(columns.get(lc, 0) for lc in LOAD_CELLS)
+    rows = []
+    for table_name, divisor, group_names, group_net_force in groups:
+        if row_count % divisor == 0:
+            group_columns = {name: columns[name] for name in group_names}
+            if group_net_force:
+                group_columns['lc_net_force'] = columns['lc_net_force']
+            rows.append((table_name, group_columns))
+    packet = {'rows': rows, 'time_ns': daq.sample_time_ns}
+    # questdb queue item and grafana queue item
+    return packet, (columns, packet['time_ns'])
+
+
+def legacy_consumer(items: list, batches: dict, engine: FilterEngine):
+    values = np.zeros(len(engine.names))
+    for packet, (columns, timestamp_ns) in items:
+        for table_name, row_columns in packet['rows']:
+            batches[table_name].append(packet['time_ns'], row_columns)
+        for i, field in enumerate(engine.names):
+            values[i] = columns.get(field, values[i])
+        engine.update(values).tolist()
+
+
+def sample_producer(daq: BenchDAQ, schema: SampleSchema, net_force_index: np.ndarray) -> Sample:
+    sample = daq.get_sample(schema)
+    sample.values[-1] = sample.values[net_force_index].sum()
+    return sample
+
+
+def sample_consumer(samples: list, groups: list, batches: dict, engine: FilterEngine):
+    for sample in samples:
+        for table_name, divisor, group_names, group_index in groups:
+            if sample.seq % divisor == 0:
+                batches[table_name].append_values(sample.time_ns, sample.values, group_index)
+        engine.update(sample.values)
+
+
+def measure(produce, consume, num_samples: int) -> dict:
+    """Returns the blocks and bytes kept alive per queued sample and the consumer peak"""
+    produce() # warm up caches and lazy imports
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    queued = [produce() for _ in range(num_samples)]
+    produce_time = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    retained = [stat for stat in after.compare_to(before, 'filename')
+                if not stat.traceback[0].filename.endswith('tracemalloc.py')]
+
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    consume(queued)
+    consume_time = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        'blocks': sum(stat.count_diff for stat in retained) / num_samples,
+        'bytes': sum(stat.size_diff for stat in retained) / num_samples,
+        'produce_us': produce_time / num_samples * 1e6,
+        'consume_us': consume_time / num_samples * 1e6,
+        'consumer_peak_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sample allocations of the ingest hot path")
+    parser.add_argument("--sensors", type=int, default=13, help="number of sensors")
+    parser.add_argument("--samples", type=int, default=10000, help="number of samples")
+    args = parser.parse_args()
+
+    names = [f"s{i}" for i in range(args.sensors)]
+    fields = names + ['lc_net_force']
+    # one fast group with the load cells and net force, one group at a tenth of the rate
+    fast, slow = names[:len(names) // 2], names[len(names) // 2:]
+
+    def new_batches() -> dict:
+        return {'fast': ColumnBatch('fast', fast + ['lc_net_force'], args.samples),
+                'slow': ColumnBatch('slow', slow, args.samples)}
+
+    daq = BenchDAQ(names)
+    legacy_groups = [('fast', 1, fast, True), ('slow', 10, slow, False)]
+    engine = FilterEngine(fields, {}, 100, DEFAULT_CHAIN)
+    row_count = iter(range(10 ** 9))
+    legacy = measure(lambda: legacy_producer(daq, legacy_groups, next(row_count)),
+                     lambda items, batches=new_batches(): legacy_consumer(items, batches, engine), args.samples)
+
+    daq = BenchDAQ(names)
+    schema = SampleSchema(fields)
+    net_force_index = schema.indices(LOAD_CELLS)
+    sample_groups = [('fast', 1, fast + ['lc_net_force'], schema.indices(fast + ['lc_net_force'])),
+                     ('slow', 10, slow, schema.indices(slow))]
+    engine = FilterEngine(fields, {}, 100, DEFAULT_CHAIN)
+    sample = measure(lambda: sample_producer(daq, schema, net_force_index),
+                     lambda samples, batches=new_batches(): sample_consumer(samples, sample_groups, batches, engine),
+                     args.samples)
+
+    print(f"{'':<8}{'blocks/sample':>14}{'bytes/sample':>14}{'produce us':>12}{'consume us':>12}{'consumer peak':>15}")
+    for name, result in (("dicts", legacy), ("Sample", sample)):
+        print(f"{name:<8}{result['blocks']:>14.1f}{result['bytes']:>14.0f}{result['produce_us']:>12.1f}"
+              f"{result['consume_us']:>12.1f}{result['consumer_peak_kb']:>12.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
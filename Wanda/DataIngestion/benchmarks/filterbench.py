@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Benchmarks the Grafana display filters
+
+Compares the original per-field loop of `grafana_worker` (deque per sensor,
+`statistics.median` + EMA per field) with the vectorised `FilterEngine` on
+the same random samples, and checks that both produce the same values.
+
+Usage:
+    python benchmarks/filterbench.py [--sensors N] [--samples N] [--window N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+module_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(module_directory))
+
+from filters import FilterEngine
+
+EMA_STRENGTH = 0.25
+
+
+def legacy_filter(samples: list, window: int) -> list:
+    """The original grafana_worker filter loop"""
+    prev_data_columns = None
+    raw_history = {}
+    outputs = []
+    for columns in samples:
+        grafana_cols = columns.copy()
+        if prev_data_columns is None:
+            prev_data_columns = grafana_cols.copy()
+            for field, value in grafana_cols.items():
+                raw_history[field] = deque([value] * window, maxlen=window)
+        for field, value in grafana_cols.items():
+            raw_history[field].append(value)
+            median_value = statistics.median(raw_history[field])
+            grafana_cols[field] = (EMA_STRENGTH * median_value) + ((1 - EMA_STRENGTH) * prev_data_columns[field])
+        prev_data_columns = grafana_cols.copy()
+        outputs.append(grafana_cols)
+    return outputs
+
+
+def engine_filter(samples: list, window: int) -> list:
+    names = list(samples[0].keys())
+    default_chain = [{'filter': 'median', 'window': window}, {'filter': 'ema', 'strength': EMA_STRENGTH}]
+    engine = FilterEngine(names, {}, 100, default_chain)
+    values = np.zeros(len(names))
+    outputs = []
+    for columns in samples:
+        for i, field in enumerate(names):
+            values[i] = columns[field]
+        outputs.append(dict(zip(names, engine.update(values).tolist())))
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grafana display filter benchmark")
+    parser.add_argument("--sensors", type=int, default=13, help="number of sensors")
+    parser.add_argument("--samples", type=int, default=10000, help="number of samples")
+    parser.add_argument("--window", type=int, default=10, help="moving median window")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = [f"s{i}" for i in range(args.sensors)]
+    data = rng.normal(100, 5, (args.samples, args.sensors))
+    samples = [dict(zip(names, row)) for row in data.tolist()]
+
+    results = {}
+    for name, function in (("legacy", legacy_filter), ("engine", engine_filter)):
+        start = time.perf_counter()
+        results[name] = function(samples, args.window)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<7} {elapsed / args.samples * 1e6:>8.1f} us/sample   "
+              f"{elapsed / args.samples / args.sensors * 1e6:>6.2f} us/sensor")
+
+    legacy = np.array([list(row.values()) for row in results["legacy"]])
+    engine = np.array([list(row.values()) for row in results["engine"]])
+    print(f"max difference: {np.max(np.abs(legacy - engine)):.3g}")
+
+
+if __name__ == '__main__':
+    main()
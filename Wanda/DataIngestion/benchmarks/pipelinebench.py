@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Per-stage latency and throughput benchmark of the acquisition pipeline
+
+Runs every stage of the data ingestion path on its own and reports latency
+percentiles and calls per second for each:
+
+    ads1256.read_scan      one pipelined sweep over the channels of an ADC
+    ads1256.stream         one RDATAC sample of the first channel
+    daq.get_all_sensor_values, daq.get_sample
+                           one sample of all sensors from the ADC worker threads
+                           (blocks until every ADC finished a new sweep, so the
+                           calls per second are the acquisition throughput)
+    grafana.filter         the display filters of one sample
+    grafana.lines          filtering and formatting the samples of one push
+    questdb.append         one row into the column batches
+    questdb.flush          serializing and sending one batch of rows
+    pipeline               get_sample + net force + batch rows + filters per sample
+
+The ADCs run on the simulated backend (`Wanda/hardware`, `--backend pi` uses
+the Pi hat) with the wiring, data rates and sensors of `config.yaml`. QuestDB
+is a local stand-in that accepts InfluxDB line protocol over HTTP and counts
+the rows, so the QuestDB stages measure the client side only.
+
+The report is written as JSON (`--json`); `--compare` prints the change of
+every stage against an earlier report, e.g. one from the parent commit.
+
+Usage:
+    python benchmarks/pipelinebench.py [--samples N] [--json FILE] [--compare FILE]
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import yaml
+
+module_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(module_directory))
+
+DAQ_CONFIG_FILENAME = os.path.join(os.path.dirname(module_directory), "config.yaml")
+REPORT_VERSION = 1
+PERCENTILES = (50, 90, 99, 99.9)
+
+# same as dataingestion.py
+TARGET_RPS = 100
+EMA_STRENGTH = 0.25
+MEDIAN_RANGE = 10
+QDB_FLUSH_ROWS = 1000
+GRAFANA_DISPLAY_RATE = 25
+GRAFANA_MAX_LINES = 4
+LOAD_CELLS_FOR_NET_FORCE = ['lc1', 'lc2', 'lc3']
+
+
+class QuestDBStandIn(ThreadingHTTPServer):
+    """Local HTTP server that accepts QuestDB line protocol writes and counts the rows"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), QuestDBHandler)
+        self.rows = 0
+        self.bytes = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, name="QuestDBStandIn", daemon=True)
+
+    @property
+    def conf(self) -> str:
+        return f"http::addr=127.0.0.1:{self.server_address[1]};auto_flush=off;"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class QuestDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.rows += body.count(b"\n")
+            self.server.bytes += len(body)
+            self.server.requests += 1
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        # /settings: an old server without protocol version negotiation
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_calls(function, count: int) -> dict:
+    """Calls `function` `count` times and returns the latency statistics"""
+    latencies = np.empty(count)
+    start = time.perf_counter_ns()
+    for i in range(count):
+        call_start = time.perf_counter_ns()
+        function()
+        latencies[i] = time.perf_counter_ns() - call_start
+    return summarize(latencies, time.perf_counter_ns() - start)
+
+
+def summarize(latencies_ns: np.ndarray, total_ns: int) -> dict:
+    latencies_us = latencies_ns / 1000
+    result = {'count': len(latencies_us), 'mean_us': float(np.mean(latencies_us))}
+    for percentile, value in zip(PERCENTILES, np.percentile(latencies_us, PERCENTILES)):
+        result[f"p{percentile:g}_us"] = float(value)
+    result['max_us'] = float(np.max(latencies_us))
+    result['per_second'] = len(latencies_us) / (total_ns / 1e9) if total_ns else 0.0
+    return result
+
+
+def bench_ads1256(config: dict, samples: int) -> dict:
+    from ADC import ADS1256
+
+    adc_config = next(config[key] for key in sorted(config) if key.startswith("ADC") and config[key].get("enabled"))
+    adc = ADS1256.ADS1256(adc_config["RST_PIN"], adc_config["CS_PIN"], adc_config["DRDY_PIN"],
+                          adc_config.get("spi_bus", 0), adc_config.get("spi_device", 0))
+    if adc.init() != 0:
+        raise RuntimeError("ADS1256 init failed")
+    adc.setMode(1 if adc_config["differential"] else 0)
+    adc.configADC(ADS1256.GAIN_E[adc_config["gain"]], ADS1256.DRATE_E[adc_config["data_rate"]])
+    channels = [channel for channel, name in adc_config["channels"].items() if name is not None]
+    adc.setScanList(channels)
+
+    results = {'ads1256.read_scan': time_calls(adc.readScan, samples)}
+    stream = adc.streamChannelValues(channels[0])
+    results['ads1256.stream'] = time_calls(lambda: next(stream), samples)
+    stream.close()
+    if adc.getDRDYTimeouts():
+        print(f"Warning: {adc.getDRDYTimeouts()} DRDY timeouts")
+    adc.module_exit()
+    return results
+
+
+def build_pipeline(daq):
+    """The schema, net force indices, write groups and display filters of dataingestion.py"""
+    from ADC.sample import SampleSchema
+    from filters import FilterEngine
+
+    sensor_names = daq.get_sensor_names()
+    net_force_measured = any(name in LOAD_CELLS_FOR_NET_FORCE for name in sensor_names)
+    rate_groups = daq.get_rate_groups()
+    loop_rps = max(rate_groups)
+    net_force_rate = None
+    if net_force_measured:
+        net_force_rate = next(rate for rate, group_names in rate_groups.items()
+                              if any(lc in group_names for lc in LOAD_CELLS_FOR_NET_FORCE))
+
+    schema = SampleSchema(daq.plan_names + (['lc_net_force'] if net_force_measured else []))
+    net_force_index = None
+    if net_force_measured:
+        net_force_index = schema.indices([lc for lc in LOAD_CELLS_FOR_NET_FORCE if lc in daq.schema])
+
+    write_groups = []
+    for rate, group_names in rate_groups.items():
+        divisor = max(1, round(loop_rps / rate))
+        group_names = group_names + (['lc_net_force'] if rate == net_force_rate else [])
+        write_groups.append((f"bench_{rate:g}hz", divisor, group_names, schema.indices(group_names)))
+
+    grafana_filters = {name: (daq.config["sensors"][name] or {}).get("display_filter") for name in sensor_names}
+    default_chain = [{'filter': 'median', 'window': MEDIAN_RANGE}, {'filter': 'ema', 'strength': EMA_STRENGTH}]
+    filter_engine = FilterEngine(schema.names, grafana_filters, loop_rps, default_chain)
+    return schema, net_force_index, write_groups, filter_engine, loop_rps
+
+
+def bench_daq(samples: int, questdb_conf: str) -> tuple:
+    """Runs the DAQ, display filter, QuestDB and whole pipeline stages
+
+    Returns:
+        results (dict): statistics by stage
+        rows (int): rows sent to QuestDB
+    """
+    from ADC.adcmanager import DAQ
+    from columnbatch import ColumnBatch
+    from grafanapublisher import GrafanaPublisher
+    from questdb.ingress import Sender
+
+    results = {}
+    rows = 0
+    with DAQ(DAQ_CONFIG_FILENAME, default_rate=TARGET_RPS) as daq:
+        schema, net_force_index, write_groups, filter_engine, loop_rps = build_pipeline(daq)
+        daq.get_sample(schema) # starts the ADC workers
+
+        results['daq.get_all_sensor_values'] = time_calls(daq.get_all_sensor_values, samples)
+        queued = []
+        results['daq.get_sample'] = time_calls(lambda: queued.append(daq.get_sample(schema)), samples)
+        if net_force_index is not None:
+            for sample in queued:
+                sample.values[-1] = sample.values[net_force_index].sum()
+
+        # the recorded samples are replayed through the writer stages
+        replay = itertools.cycle(queued)
+        results['grafana.filter'] = time_calls(lambda: filter_engine.update(next(replay).values), samples)
+
+        publisher = GrafanaPublisher("http://127.0.0.1:9/", {}, "bench", filter_engine,
+                                     GRAFANA_DISPLAY_RATE, GRAFANA_MAX_LINES)
+        samples_per_push = max(1, round(loop_rps / GRAFANA_DISPLAY_RATE))
+
+        def collect_push():
+            publisher.samples.extend(queued[:samples_per_push])
+            publisher.collect_lines()
+        results['grafana.lines'] = time_calls(collect_push, max(1, samples // samples_per_push))
+        publisher.session.close()
+
+        batches = {table_name: ColumnBatch(table_name, group_names, QDB_FLUSH_ROWS)
+                   for table_name, _, group_names, _ in write_groups}
+
+        def append_rows():
+            sample = next(replay)
+            for table_name, divisor, _, group_index in write_groups:
+                if sample.seq % divisor == 0:
+                    batch = batches[table_name]
+                    if batch.full():
+                        batch.clear()
+                    batch.append_values(sample.time_ns, sample.values, group_index)
+        results['questdb.append'] = time_calls(append_rows, samples)
+
+        with Sender.from_conf(questdb_conf) as sender:
+            buffer = sender.new_buffer()
+            # full batches of the fastest table
+            table_name, _, _, group_index = write_groups[0]
+            flush_batch_rows = batches[table_name]
+            flush_batch_rows.clear()
+            for i in range(QDB_FLUSH_ROWS):
+                sample = queued[i % len(queued)]
+                flush_batch_rows.append_values(sample.time_ns, sample.values, group_index)
+            timestamps = flush_batch_rows.timestamps.copy()
+            values = flush_batch_rows.values.T.copy()
+
+            def flush_batch():
+                flush_batch_rows.clear()
+                flush_batch_rows.append_block(timestamps, values)
+                flush_batch_rows.write_to(buffer)
+                sender.flush(buffer)
+            flushes = max(10, samples // QDB_FLUSH_ROWS)
+            results['questdb.flush'] = time_calls(flush_batch, flushes)
+            rows += flushes * QDB_FLUSH_ROWS
+
+            # everything the acquisition loop and the writers do per sample, flushing full batches
+            for batch in batches.values():
+                batch.clear()
+
+            def pipeline():
+                nonlocal rows
+                sample = daq.get_sample(schema)
+                if net_force_index is not None:
+                    sample.values[-1] = sample.values[net_force_index].sum()
+                for table_name, divisor, _, group_index in write_groups:
+                    if sample.seq % divisor == 0:
+                        batch = batches[table_name]
+                        batch.append_values(sample.time_ns, sample.values, group_index)
+                        if batch.full():
+                            rows += len(batch)
+                            batch.write_to(buffer)
+                            sender.flush(buffer)
+                filter_engine.update(sample.values)
+            results['pipeline'] = time_calls(pipeline, samples)
+
+        timeouts = daq.get_drdy_timeouts()
+        if any(timeouts.values()):
+            print(f"Warning: DRDY timeouts {timeouts}")
+    return results, rows
+
+
+def git_revision() -> dict:
+    """Returns the commit and whether the working tree has changes"""
+    def git(*arguments):
+        return subprocess.run(["git", *arguments], cwd=module_directory, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    try:
+        return {'commit': git("rev-parse", "HEAD"), 'dirty': bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def print_results(stages: dict):
+    print(f"{'stage':<28}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'p99.9 us':>10}{'max us':>10}{'per s':>11}")
+    for name, result in stages.items():
+        print(f"{name:<28}{result['p50_us']:>10.1f}{result['p90_us']:>10.1f}{result['p99_us']:>10.1f}"
+              f"{result['p99.9_us']:>10.1f}{result['max_us']:>10.1f}{result['per_second']:>11.1f}")
+
+
+def print_comparison(report: dict, baseline: dict):
+    """Prints the p50/p99 latency and rate of every stage against `baseline`"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:>+8.1f}%" if old else f"{'':>9}"
+
+    print(f"\nChange against {baseline.get('commit') or 'baseline'} ({baseline.get('created')})")
+    print(f"{'stage':<28}{'p50 us':>20}{'':>9}{'p99 us':>20}{'':>9}{'per s':>9}")
+    for name, result in report['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if old is None:
+            print(f"{name:<28}{'(new stage)':>20}")
+            continue
+        print(f"{name:<28}{old['p50_us']:>9.1f} -> {result['p50_us']:>6.1f}{change(result['p50_us'], old['p50_us'])}"
+              f"{old['p99_us']:>9.1f} -> {result['p99_us']:>6.1f}{change(result['p99_us'], old['p99_us'])}"
+              f"{change(result['per_second'], old['per_second'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the acquisition pipeline")
+    parser.add_argument("--samples", type=int, default=2000, help="calls per stage")
+    parser.add_argument("--backend", choices=["sim", "pi"], default="sim", help="hardware backend of the ADCs")
+    parser.add_argument("--json", default="pipelinebench.json", help="report file")
+    parser.add_argument("--compare", help="earlier report to compare with")
+    args = parser.parse_args()
+
+    # before the ADC modules import the backend
+    os.environ["WANDA_BACKEND"] = args.backend
+
+    with open(DAQ_CONFIG_FILENAME, 'r') as file:
+        config = yaml.safe_load(file)
+
+    questdb = QuestDBStandIn()
+    questdb.start()
+    try:
+        stages = bench_ads1256(config, args.samples)
+        daq_stages, rows = bench_daq(args.samples, questdb.conf)
+        stages.update(daq_stages)
+    finally:
+        questdb.stop()
+    if questdb.rows != rows:
+        print(f"Warning: {rows} rows sent, the QuestDB stand-in received {questdb.rows}")
+
+    report = {
+        'version': REPORT_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        **git_revision(),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'backend': args.backend,
+        'samples': args.samples,
+        'questdb': {'rows': questdb.rows, 'bytes': questdb.bytes, 'requests': questdb.requests},
+        'stages': stages,
+    }
+    print_results(stages)
+    with open(args.json, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Report written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            print_comparison(report, json.load(baseline_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Benchmarks the ADS1256 delay helpers and per-sample read latency
+
+Part 1 (runs anywhere) compares the accuracy of the old `delay_ms` helper,
+plain `time.sleep` and the hybrid sleep + spin delays in `ADC/timing.py` for
+the waits used by the driver.
+
+Part 2 (Pi only, `--adc 1` or `--adc 2`) measures the per-sample latency of
+`getChannelValue`, `readScan` and `streamChannelValues` with the configured
+data rate, once with the old (floored to zero) delays and once with the
+timing module.
+
+Usage:
+    python benchmarks/timingbench.py [--adc ADC_ID] [--samples N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+module_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(module_directory))
+
+from ADC import timing
+
+DAQ_CONFIG_FILENAME = os.path.join(os.path.dirname(module_directory), "config.yaml")
+
+
+def legacy_delay_ms(delaytime):
+    """The original ADS1256.delay_ms (floors every delay below 1 s to zero)"""
+    time.sleep(delaytime // 1000.0)
+
+
+def measure(delay_function, target_ns: int, repeats: int) -> np.ndarray:
+    """Returns the error in us of `repeats` calls to `delay_function`"""
+    errors = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter_ns()
+        delay_function()
+        errors[i] = (time.perf_counter_ns() - start - target_ns) / 1000
+    return errors
+
+
+def print_errors(label: str, errors: np.ndarray):
+    print(f"  {label:<14} mean {np.mean(errors):>9.1f} us   "
+          f"p99 {np.percentile(errors, 99):>9.1f} us   "
+          f"max {np.max(errors):>9.1f} us")
+
+
+def bench_delays(repeats: int):
+    targets = {
+        "t6 (RDATA)": timing.clkin_to_ns(timing.T6_CLKIN),
+        "t11 (SYNC)": timing.clkin_to_ns(timing.T11_SYNC_CLKIN),
+        "settle 3750SPS": int(timing.settling_time_us(0xC0) * 1000),
+        "settle 1000SPS": int(timing.settling_time_us(0xA1) * 1000),
+        "10 ms": 10_000_000,
+    }
+    print("Delay accuracy (error vs target)")
+    for name, target_ns in targets.items():
+        print(f"{name}: {target_ns / 1000:.2f} us")
+        print_errors("delay_ms (old)", measure(lambda: legacy_delay_ms(target_ns / 1e6), target_ns, repeats))
+        print_errors("time.sleep", measure(lambda: time.sleep(target_ns / 1e9), target_ns, repeats))
+        print_errors("timing", measure(lambda: timing.delay_ns(target_ns), target_ns, repeats))
+
+
+def bench_adc(adc_id: int, samples: int):
+    from ADC import ADS1256
+
+    with open(DAQ_CONFIG_FILENAME, 'r') as file:
+        config = yaml.safe_load(file)[f"ADC{adc_id}"]
+
+    adc = ADS1256.ADS1256(config["RST_PIN"], config["CS_PIN"], config["DRDY_PIN"])
+    adc.init()
+    adc.configADC(ADS1256.GAIN_E[config["gain"]], ADS1256.DRATE_E[config["data_rate"]])
+    if not config["differential"]:
+        adc.setMode(0)
+    channels = [channel for channel, name in config["channels"].items() if name is not None]
+    adc.setScanList(channels)
+
+    def per_sample(function, reads_per_call):
+        latencies = np.empty(samples)
+        for i in range(samples):
+            start = time.perf_counter_ns()
+            function()
+            latencies[i] = (time.perf_counter_ns() - start) / 1000 / reads_per_call
+        return latencies
+
+    def run():
+        stream = adc.streamChannelValues(channels[0])
+        results = {
+            "getChannelValue": per_sample(lambda: adc.getChannelValue(channels[0]), 1),
+            "readScan": per_sample(adc.readScan, len(channels)),
+            "stream": per_sample(lambda: next(stream), 1),
+        }
+        stream.close()
+        return results
+
+    # before: the old delay helpers that floored every delay to zero, the
+    # t6 and command gap waits of the SPI transport go through delay_ns
+    # (adc.delay_ms is replaced on its own, so it does not reach the stub)
+    transport_timing = sys.modules[type(adc.transport).__module__].timing
+    timing_delay_ns = transport_timing.delay_ns
+    transport_timing.delay_ns = lambda delaytime: None
+    adc.delay_ms = legacy_delay_ms
+    before = run()
+    transport_timing.delay_ns = timing_delay_ns
+    del adc.delay_ms
+
+    after = run()
+
+    print(f"\nADC{adc_id} per-sample latency ({config['data_rate']}, {samples} samples)")
+    for name in after:
+        print(f"{name}:")
+        print_errors("before", before[name])
+        print_errors("after", after[name])
+    print(f"DRDY timeouts: {adc.getDRDYTimeouts()}")
+    adc.module_exit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ADS1256 timing benchmark")
+    parser.add_argument("--adc", type=int, choices=[1, 2], help="also benchmark reads on this ADC (Pi only)")
+    parser.add_argument("--samples", type=int, default=1000, help="repeats per measurement")
+    args = parser.parse_args()
+
+    bench_delays(args.samples)
+    if args.adc:
+        bench_adc(args.adc, args.samples)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Preallocated column buffers for bulk QuestDB ingestion
+
+Rows of one table are collected into one NumPy array per column plus an int64
+nanosecond timestamp column. A full batch is handed to QuestDB as a single
+DataFrame (`Buffer.dataframe()`), which serializes whole columns at once
+instead of one `row()` call per row.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnBatch:
+    """Column buffers for the rows of one table"""
+
+    def __init__(self, table_name: str, columns: list, capacity: int):
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        # one contiguous row per column
+        self.values = np.zeros((len(self.columns), capacity), dtype=np.float64)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nbytes(self) -> int:
+        """Returns the size of the buffered rows in bytes"""
+        return self.size * (len(self.columns) + 1) * 8
+
+    def full(self) -> bool:
+        return self.size >= self.capacity
+
+    def append(self, timestamp_ns: int, columns: dict):
+        """Appends one row, `columns` must have the batch's columns"""
+        self.timestamps[self.size] = timestamp_ns
+        self.values[:, self.size] = [columns[name] for name in self.columns]
+        self.size += 1
+
+    def append_values(self, timestamp_ns: int, values: np.ndarray, index: np.ndarray = None):
+        """Appends one row from a value vector, `index` picks the batch's columns out of it"""
+        self.timestamps[self.size] = timestamp_ns
+        if index is None:
+            self.values[:, self.size] = values
+        else:
+            np.take(values, index, out=self.values[:, self.size])
+        self.size += 1
+
+    def append_block(self, timestamps_ns: np.ndarray, values: np.ndarray):
+        """Appends rows from arrays of shape (rows,) and (rows, columns)"""
+        end = self.size + len(timestamps_ns)
+        self.timestamps[self.size:end] = timestamps_ns
+        self.values[:, self.size:end] = values.T
+        self.size = end
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns the buffered rows as a DataFrame (views of the buffers, no copy)"""
+        data = {name: self.values[i, :self.size] for i, name in enumerate(self.columns)}
+        data['timestamp'] = self.timestamps[:self.size].view('datetime64[ns]')
+        return pd.DataFrame(data, copy=False)
+
+    def write_to(self, buffer):
+        """Serializes the buffered rows into a QuestDB `Buffer` and clears the batch"""
+        if self.size:
+            buffer.dataframe(self.to_dataframe(), table_name=self.table_name, at='timestamp')
+        self.clear()
+
+    def clear(self):
+        self.size = 0
@@ -2,21 +2,33 @@
 
 # from Wanda.DataIngestion.ADC import adcmanager
 from ADC.adcmanager import DAQ
+from ADC.sample import Sample, SampleSchema
 
 import numpy as np
-from questdb.ingress import Sender, Protocol, TimestampNanos
+import pandas as pd
+from questdb.ingress import Sender, Protocol, TimestampNanos, IngressError
+
+from columnbatch import ColumnBatch
+from filters import FilterEngine
+from grafanapublisher import GrafanaPublisher
+from metrics import MetricsServer, Registry
+from realtime import enter_realtime, set_thread_realtime, describe_scheduling, other_cpus
+from samplingclock import SamplingClock
+from sharedring import SharedRing
+from spilllog import SpillStore
 
 import time
 import socket
 import json
-import requests
 import threading
 import queue
+import argparse
+import multiprocessing
+import signal
 
 from datetime import datetime
 from pytz import timezone
 
-import statistics
 from collections import deque
 
 import os
@@ -25,24 +37,36 @@ module_directory = os.path.dirname(module_path)
 
 # config
 DAQ_CONFIG_FILENAME = os.path.join(module_directory, "config.yaml")
-TARGET_RPS = 100
+TARGET_RPS = 100 # rate of the sensors without a `rate` in the config file
 EMA_STRENGTH = 0.25
 MEDIAN_RANGE = 10
-SAMPLE_INTERVAL = 1.0 / TARGET_RPS
 est = timezone('US/Eastern')
 HOSTNAME = socket.gethostname()
 
 # questdb config
 QDB_CONF = (
     'http::addr=192.168.1.32:9000;'
-    'auto_flush=on;'
-    'auto_flush_interval=15;'
-    # 'auto_flush_rows=2;'
+    'auto_flush=off;' # flushed by questdb_worker with the policy below
 )
+QDB_FLUSH_ROWS = 1000           # flush once this many rows are buffered
+QDB_FLUSH_INTERVAL = 0.5        # or this many seconds after the last flush
+QDB_FLUSH_BYTES = 512 * 1024    # or once the buffer is this large
+QDB_QUEUE_SECONDS = 30          # seconds of data the questdb queue can hold
+QDB_SHUTDOWN_TIMEOUT = 15       # seconds to wait for the last flush on exit
+
+# spill log config (rows that could not be sent to questdb)
+SPILL_DIRECTORY = os.path.join(module_directory, "spill")
+SPILL_SEGMENT_BYTES = 64 * 1024 * 1024
+SPILL_REPLAY_ROWS = 5000        # rows per replay flush
+SPILL_POLL_INTERVAL = 1.0       # seconds between checks for new spilled rows
+SPILL_RETRY_INTERVAL = 5.0      # seconds between replay attempts while questdb is down
 
 # grafana config
 GRAFANA_URL = f"http://192.168.1.32:3000/api/live/push/{HOSTNAME}"
-GRAFANA_ENABLED = True
+GRAFANA_DISPLAY_RATE = 25   # pushes per second
+GRAFANA_MAX_LINES = 4       # newest samples sent per push, older ones are dropped
+GRAFANA_TIMEOUT = 0.5
+GRAFANA_ENABLED = False
 try:
     with open(os.path.join(module_directory, "grafana.key"), 'r') as grafana_key_file:
         GRAFANA_TOKEN = grafana_key_file.read().strip()
@@ -51,179 +75,598 @@ try:
 except FileNotFoundError:
     pass
 
+# real-time mode (--rt)
+RT_CPU = 3          # core of the acquisition process, isolate it with isolcpus=3
+RT_PRIORITY = 80    # SCHED_FIFO priority of the ADC worker threads, the main loop runs one below
+RING_NAME = "wanda_samples"     # shared memory ring between acquisition and writers
+RING_SECONDS = 30               # seconds of samples the ring holds
+RING_POLL_INTERVAL = 0.005      # seconds a writer sleeps when the ring is empty
+
+# metrics endpoint (Prometheus text format at /metrics), 0 disables it
+# in real-time mode the QuestDB and Grafana writer processes serve theirs on the next two ports
+METRICS_PORT = 9101
+
+parser = argparse.ArgumentParser(description="Reads all sensors and sends data to QuestDB and Grafana")
+parser.add_argument("--rt", action="store_true",
+                    help="run acquisition in a pinned SCHED_FIFO process and the network writers in a separate process")
+parser.add_argument("--cpu", type=int, default=RT_CPU, help=f"core of the acquisition process with --rt (default {RT_CPU})")
+parser.add_argument("--priority", type=int, default=RT_PRIORITY,
+                    help=f"SCHED_FIFO priority of the ADC worker threads with --rt, the main loop runs "
+                         f"one below (default {RT_PRIORITY})")
+args = parser.parse_args()
+
 # stats
 stats = {
     'adc_time': deque(maxlen=100),
     'questdb_send_time': deque(maxlen=100),
-    'grafana_send_time': deque(maxlen=100),
+    'questdb_flush_rows': deque(maxlen=100),
+    'questdb_flush_bytes': deque(maxlen=100),
     'main_loop_time': deque(maxlen=100),
-    'queue_wait': deque(maxlen=100)
+    'queue_wait': deque(maxlen=100),
+    'spill_replay_time': deque(maxlen=100)
+}
+spill_stats = {
+    'replayed': 0
+}
+last_report = {
+    'spilled': 0,
+    'replayed': 0,
+    'grafana_dropped': 0,
+    'queue_full_warning': 0.0
+}
+
+# metrics, scraped from METRICS_PORT (see metrics.py)
+registry = Registry()
+# acquisition
+metric_samples = registry.counter("wanda_samples_total", "Samples read from the ADCs")
+metric_adc_time = registry.histogram("wanda_adc_seconds", "Time to read one sample of all sensors")
+metric_queue_wait = registry.histogram("wanda_queue_wait_seconds", "Time to hand one sample to the writers")
+metric_loop_time = registry.histogram("wanda_loop_seconds", "Time of one loop iteration without the wait")
+metric_loop_jitter = registry.histogram("wanda_loop_jitter_seconds", "Wake-up delay of the loop after its deadline")
+metric_missed_deadlines = registry.counter("wanda_loop_missed_deadlines_total", "Loop deadlines skipped")
+metric_drdy_timeouts = registry.counter("wanda_adc_drdy_timeouts_total", "DRDY waits that timed out", ("adc",))
+metric_ring_written = registry.counter("wanda_ring_samples_written_total", "Samples written to the sample ring")
+# questdb writer
+metric_questdb_flush_time = registry.histogram("wanda_questdb_flush_seconds", "Time of one QuestDB flush")
+metric_questdb_rows = registry.counter("wanda_questdb_rows_total", "Rows flushed to QuestDB")
+metric_questdb_bytes = registry.counter("wanda_questdb_bytes_total", "Bytes flushed to QuestDB")
+metric_questdb_errors = registry.counter("wanda_questdb_flush_errors_total", "Failed QuestDB flushes")
+metric_questdb_queue_full = registry.counter("wanda_questdb_queue_full_total",
+                                             "Samples spilled because the QuestDB queue was full")
+metric_questdb_queue = registry.gauge("wanda_questdb_queue_depth", "Samples waiting in the QuestDB queue")
+metric_questdb_queue.set_function(lambda: questdb_queue.qsize() if questdb_queue is not None else 0)
+metric_questdb_queue_capacity = registry.gauge("wanda_questdb_queue_capacity", "Size of the QuestDB queue")
+metric_questdb_queue_capacity.set_function(lambda: questdb_queue.maxsize if questdb_queue is not None else 0)
+metric_questdb_up = registry.gauge("wanda_questdb_up", "1 while QuestDB accepts flushes, 0 while rows are spilled")
+metric_questdb_up.set_function(lambda: questdb_online.is_set())
+metric_spilled = registry.counter("wanda_spill_rows_total", "Rows written to the spill log")
+metric_spilled.set_function(lambda: spill.appended())
+metric_spill_backlog = registry.gauge("wanda_spill_backlog_rows", "Spilled rows not replayed yet")
+metric_spill_backlog.set_function(lambda: spill.backlog())
+metric_replayed = registry.counter("wanda_spill_replayed_rows_total", "Spilled rows replayed to QuestDB")
+metric_replayed.set_function(lambda: spill_stats['replayed'])
+metric_replay_time = registry.histogram("wanda_spill_replay_seconds", "Time of one spill replay flush")
+# grafana writer
+metric_grafana_push_time = registry.histogram("wanda_grafana_push_seconds", "Time of one Grafana Live push")
+metric_grafana_pushes = registry.counter("wanda_grafana_pushes_total", "Successful Grafana Live pushes")
+metric_grafana_pushes.set_function(lambda: grafana_publisher.pushes if grafana_publisher is not None else 0)
+metric_grafana_failures = registry.counter("wanda_grafana_push_failures_total", "Failed Grafana Live pushes")
+metric_grafana_failures.set_function(lambda: grafana_publisher.failures if grafana_publisher is not None else 0)
+metric_grafana_dropped = registry.counter("wanda_grafana_dropped_samples_total",
+                                          "Stale samples skipped between Grafana pushes")
+metric_grafana_dropped.set_function(lambda: grafana_publisher.dropped if grafana_publisher is not None else 0)
+# real-time mode writers
+metric_ring_lag = registry.gauge("wanda_ring_lag", "Samples in the ring not read by a writer yet", ("writer",))
+metric_ring_overruns = registry.counter("wanda_ring_overruns_total", "Samples a writer lost to ring overruns",
+                                        ("writer",))
+# metrics served by each process in real-time mode
+ACQUISITION_METRICS = ["wanda_samples_", "wanda_adc_", "wanda_queue_wait_", "wanda_loop_", "wanda_ring_samples_"]
+WRITER_METRICS = {
+    'questdb': ["wanda_questdb_", "wanda_spill_", "wanda_ring_lag", "wanda_ring_overruns_"],
+    'grafana': ["wanda_grafana_", "wanda_ring_lag", "wanda_ring_overruns_"],
 }
 
-# queues
-questdb_queue = queue.Queue(5)
-grafana_queue = queue.Queue(5)
+# writers, started by start_writers once the loop rate is known
+questdb_queue = None
+questdb_thread = None
+grafana_publisher = None
+
+# spill log, written when questdb is slow or down and replayed by spill_replayer
+spill = SpillStore(SPILL_DIRECTORY, SPILL_SEGMENT_BYTES)
+questdb_online = threading.Event()
+questdb_online.set()
 
 def print_log(message:str):
     lines = message.split('\n')
     for line in lines:
         print(f"[{datetime.now(tz=est).strftime('%Y-%m-%d %H:%M:%S')}] {line}")
 
-def questdb_worker():
+def start_metrics_server(metrics: Registry, port: int):
+    """Serves `metrics` at http://<pi>:<port>/metrics, returns the server or None"""
+    if not port:
+        return None
     try:
-        with Sender.from_conf(QDB_CONF) as sender:
-            while True:
-                data = questdb_queue.get()
-                if data is None: 
-                    break
-
-                start = time.perf_counter()
-                sender.row(
-                    table_name=HOSTNAME,
-                    columns=data['columns'],
-                    at=data['time']
-                )
-                stats['questdb_send_time'].append(time.perf_counter() - start)
-
-                questdb_queue.task_done()
-
-    except Exception as e:
-        print_log(f"QuestDB Error: {e}")
-
-
-def grafana_worker():
-    prev_data_columns = None
-    raw_history = {}
+        server = MetricsServer(metrics, port)
+    except OSError as e:
+        print_log(f"Warning: metrics endpoint on port {port} not started: {e}")
+        return None
+    server.start()
+    print_log(f"Metrics: http://{HOSTNAME}:{port}/metrics")
+    return server
+
+def spill_samples(samples):
+    """Writes the QuestDB rows of the samples to the spill log"""
+    for sample in samples:
+        for table_name, divisor, group_names, group_index in write_groups:
+            if sample.seq % divisor == 0:
+                spill.append(table_name, sample.time_ns, dict(zip(group_names, sample.values[group_index].tolist())))
+
+def questdb_flush(sender, buffer, buffered_rows):
+    buffered_bytes = len(buffer)
+    start = time.perf_counter()
+    sender.flush(buffer)
+    elapsed = time.perf_counter() - start
+    stats['questdb_send_time'].append(elapsed)
+    stats['questdb_flush_rows'].append(buffered_rows)
+    stats['questdb_flush_bytes'].append(buffered_bytes)
+    metric_questdb_flush_time.observe(elapsed)
+    metric_questdb_rows.inc(buffered_rows)
+    metric_questdb_bytes.inc(buffered_bytes)
+
+def connect_questdb():
+    """Returns a new QuestDB sender, raises IngressError while QuestDB cannot be reached"""
+    sender = Sender.from_conf(QDB_CONF)
+    sender.establish()
+    return sender
+
+def close_questdb(sender):
+    if sender is None:
+        return
     try:
+        sender.close()
+    except Exception:
+        pass
+
+def questdb_worker():
+    """Sends the queued samples to QuestDB in batches, spills them while QuestDB is down
+
+    Errors are handled per iteration, the rows that were not flushed are
+    spilled and the thread keeps running. The sender is reconnected once
+    spill_replayer finds QuestDB available again.
+    """
+    sender = None
+    buffer = None
+    batches = {} # {table_name: ColumnBatch}, sent as one dataframe per table
+    pending = [] # samples in the batches, spilled if the flush fails
+    buffered_rows = 0
+    last_flush = time.perf_counter()
+    running = True
+    while running:
+        # wait for data, but wake up in time for the flush interval
+        timeout = max(0.0, QDB_FLUSH_INTERVAL - (time.perf_counter() - last_flush))
+        try:
+            samples = [questdb_queue.get(timeout=timeout)]
+        except queue.Empty:
+            samples = []
+
+        # drain everything else that is already queued
         while True:
-            data = grafana_queue.get()
-            if data is None:
+            try:
+                samples.append(questdb_queue.get_nowait())
+            except queue.Empty:
                 break
+        num_samples = len(samples)
+        if None in samples:
+            running = False
+            samples = samples[:samples.index(None)]
+
+        try:
+            if not questdb_online.is_set():
+                # questdb is down, spill_replayer backfills once it is back
+                spill_samples(samples)
+            else:
+                # spilled with the batches if anything below fails
+                pending.extend(samples)
+                if sender is None:
+                    sender = connect_questdb()
+                    buffer = sender.new_buffer()
+                for sample in samples:
+                    # each rate group is written every `divisor` samples
+                    for table_name, divisor, group_names, group_index in write_groups:
+                        if sample.seq % divisor:
+                            continue
+                        batch = batches.get(table_name)
+                        if batch is None:
+                            batch = batches[table_name] = ColumnBatch(table_name, group_names, QDB_FLUSH_ROWS)
+                        batch.append_values(sample.time_ns, sample.values, group_index)
+                        buffered_rows += 1
+                        if batch.full():
+                            batch.write_to(buffer)
+
+            buffered_bytes = (len(buffer) if buffer is not None else 0) + sum(batch.nbytes() for batch in batches.values())
+            if pending and (not running
+                            or buffered_rows >= QDB_FLUSH_ROWS
+                            or buffered_bytes >= QDB_FLUSH_BYTES
+                            or time.perf_counter() - last_flush >= QDB_FLUSH_INTERVAL):
+                for batch in batches.values():
+                    batch.write_to(buffer)
+                questdb_flush(sender, buffer, buffered_rows)
+                pending = []
+                buffered_rows = 0
+                last_flush = time.perf_counter()
+            elif not pending:
+                last_flush = time.perf_counter()
+
+        except Exception as e:
+            if isinstance(e, IngressError):
+                metric_questdb_errors.inc()
+                print_log(f"QuestDB Error: {e}")
+                print_log("Warning: QuestDB unavailable, spilling to disk")
+            else:
+                print_log(f"QuestDB Worker Error: {e!r}, spilling to disk")
+            questdb_online.clear()
+            # a new sender is connected once QuestDB is back
+            close_questdb(sender)
+            sender = None
+            buffer = None
+            for batch in batches.values():
+                batch.clear()
+            try:
+                spill_samples(pending)
+            except Exception as e:
+                print_log(f"Spill Error: {e!r}, {len(pending)} rows lost")
+            pending = []
+            buffered_rows = 0
+            last_flush = time.perf_counter()
 
-            grafana_cols = data['columns'].copy()
-
-            if prev_data_columns is None:
-                prev_data_columns = grafana_cols.copy()
-                for field, value in grafana_cols.items():
-                    raw_history[field] = deque([value]*MEDIAN_RANGE, maxlen=MEDIAN_RANGE)
-
-            # apply moving median and exponential moving average
-            for field, value in grafana_cols.items():
-                if field not in raw_history:
-                    raw_history[field] = deque([value]*MEDIAN_RANGE, maxlen=MEDIAN_RANGE)
-                raw_history[field].append(value)
+        finally:
+            for _ in range(num_samples):
+                questdb_queue.task_done()
 
-                median_value = statistics.median(raw_history[field])
+    close_questdb(sender)
 
-                # diff = abs(median_value - prev_data_columns[field])
-                # dynamic_strength = min(0.5, EMA_STRENGTH + (diff * 0.02))
+def spill_replayer():
+    """Backfills QuestDB from the spill log with the original timestamps
 
-                grafana_cols[field] = (EMA_STRENGTH * median_value) + ((1-EMA_STRENGTH) * prev_data_columns[field])
-            prev_data_columns = grafana_cols.copy()
+    Errors are handled per iteration and retried after SPILL_RETRY_INTERVAL,
+    the rows stay in the spill log until a flush succeeds.
+    """
+    sender = None
+    while True:
+        try:
+            spilled = spill.read(SPILL_REPLAY_ROWS)
+            if spilled is None:
+                time.sleep(SPILL_POLL_INTERVAL)
+                continue
 
+            table_name, columns, records, position = spilled
+            start = time.perf_counter()
             try:
-                fields = ",".join([f"{k}={v}" for k, v in grafana_cols.items()])
-                payload = f"{HOSTNAME} {fields}"
+                if sender is None:
+                    sender = connect_questdb()
+                buffer = sender.new_buffer()
+                frame = pd.DataFrame(records['values'], columns=columns)
+                frame['timestamp'] = records['timestamp'].view('datetime64[ns]')
+                buffer.dataframe(frame, table_name=table_name, at='timestamp')
+                sender.flush(buffer)
+            except IngressError:
+                # still down, the rows stay in the spill log
+                close_questdb(sender)
+                sender = None
+                time.sleep(SPILL_RETRY_INTERVAL)
+                continue
+
+            spill.commit(table_name, position)
+            replay_time = time.perf_counter() - start
+            stats['spill_replay_time'].append(replay_time)
+            metric_replay_time.observe(replay_time)
+            spill_stats['replayed'] += len(records)
+            if not questdb_online.is_set():
+                print_log("QuestDB available again, replaying spill log")
+                questdb_online.set()
+
+        except Exception as e:
+            print_log(f"Spill Replay Error: {e!r}")
+            close_questdb(sender)
+            sender = None
+            time.sleep(SPILL_RETRY_INTERVAL)
+
+def start_writers(schema: SampleSchema, grafana_filters: dict, loop_rps: float,
+                  questdb: bool = True, grafana: bool = True):
+    """Starts the QuestDB (with spill replay) and/or Grafana workers of this process"""
+    global questdb_queue, questdb_thread, grafana_publisher
+
+    if questdb:
+        # the questdb queue holds QDB_QUEUE_SECONDS of data to ride out network hiccups
+        questdb_queue = queue.Queue(int(QDB_QUEUE_SECONDS * loop_rps))
+        questdb_thread = threading.Thread(target=questdb_worker, daemon=True)
+        questdb_thread.start()
+        threading.Thread(target=spill_replayer, daemon=True).start()
+        spill_backlog = spill.backlog()
+        if spill_backlog:
+            print_log(f"Replaying {spill_backlog} spilled rows from a previous run")
+        last_report['spilled'] = spill.appended()
+
+    if grafana and GRAFANA_ENABLED:
+        # default chain: moving median then exponential moving average
+        default_chain = [{'filter': 'median', 'window': MEDIAN_RANGE},
+                         {'filter': 'ema', 'strength': EMA_STRENGTH}]
+        filter_engine = FilterEngine(schema.names, grafana_filters, loop_rps, default_chain)
+        grafana_publisher = GrafanaPublisher(GRAFANA_URL, GRAFANA_HEADERS, HOSTNAME, filter_engine,
+                                             GRAFANA_DISPLAY_RATE, GRAFANA_MAX_LINES, GRAFANA_TIMEOUT,
+                                             push_seconds=metric_grafana_push_time)
+        grafana_publisher.start()
+    elif grafana:
+        print_log("Warning: grafana.key not found. Grafana streaming disabled.")
 
-                start = time.perf_counter()
-                requests.post(GRAFANA_URL, data=payload, headers=GRAFANA_HEADERS, timeout=0.1)
-                stats['grafana_send_time'].append(time.perf_counter() - start)
+def send_sample(sample: Sample):
+    """Hands one sample to the QuestDB and Grafana workers of this process, never blocks"""
+    if questdb_queue is not None:
+        try:
+            questdb_queue.put_nowait(sample)
+        except queue.Full:
+            # keep the rows on disk, spill_replayer sends them later
+            spill_samples([sample])
+            metric_questdb_queue_full.inc()
+            if time.monotonic() - last_report['queue_full_warning'] >= 1:
+                print_log("Warning: <QUESTDB QUEUE FULL> spilling to disk")
+                last_report['queue_full_warning'] = time.monotonic()
+
+    if grafana_publisher is not None:
+        grafana_publisher.publish(sample)
+
+def report_writers(elapsed: float):
+    """Prints the QuestDB, spill log and Grafana stats of the last `elapsed` seconds"""
+    if questdb_queue is not None:
+        avg_questdb = np.mean(stats['questdb_send_time']) * 1000
+        max_questdb = np.max(stats['questdb_send_time'], initial=0) * 1000
+        avg_flush_rows = np.mean(stats['questdb_flush_rows'])
+        avg_flush_kb = np.mean(stats['questdb_flush_bytes']) / 1024
+        spilled = spill.appended()
+        replayed = spill_stats['replayed']
+        new_spilled = spilled - last_report['spilled']
+        replay_rps = (replayed - last_report['replayed']) / elapsed
+        spill_backlog = spill.backlog()
+
+        print_log(f"AVG QuestDB: {avg_questdb:.1f} ms/flush (max {max_questdb:.1f} ms), "
+                  f"{avg_flush_rows:.0f} rows, {avg_flush_kb:.1f} KB")
+        print_log(f"QuestDB Queue: {questdb_queue.qsize()}/{questdb_queue.maxsize}")
+        if new_spilled or spill_backlog:
+            print_log(f"Spill:       {new_spilled} rows spilled, {replay_rps:.0f} rows/s replayed, "
+                      f"backlog {spill_backlog} rows{'' if questdb_online.is_set() else ' (QuestDB down)'}")
+        last_report['spilled'] = spilled
+        last_report['replayed'] = replayed
+    if grafana_publisher is not None:
+        avg_grafana = np.mean(grafana_publisher.send_times) * 1000
+        grafana_dropped = grafana_publisher.dropped
+        print_log(f"AVG Grafana: {avg_grafana:.1f} ms/push, {grafana_publisher.failures} failed, "
+                  f"{grafana_dropped - last_report['grafana_dropped']} stale samples skipped")
+        last_report['grafana_dropped'] = grafana_dropped
+
+def stop_writers():
+    if grafana_publisher is not None:
+        grafana_publisher.stop()
+
+    if questdb_queue is not None:
+        # flush (or spill) the rows that are still queued before exiting
+        try:
+            questdb_queue.put(None, timeout=1)
+        except queue.Full:
+            # QuestDB is slow or down, spill the queued rows to make room for the stop signal
+            drained = []
+            while True:
+                try:
+                    drained.append(questdb_queue.get_nowait())
+                except queue.Empty:
+                    break
+            spill_samples(drained)
+            for _ in drained:
+                questdb_queue.task_done()
+            questdb_queue.put_nowait(None)
+        # the worker spills its pending batch itself, the spill log is closed after it
+        questdb_thread.join(timeout=QDB_SHUTDOWN_TIMEOUT)
+        if questdb_thread.is_alive():
+            print_log(f"Warning: QuestDB worker still busy after {QDB_SHUTDOWN_TIMEOUT} s, closing the spill log")
+        spill.close()
+
+def writer_process(ring: SharedRing, writer: str, schema: SampleSchema, grafana_filters: dict,
+                   loop_rps: float, cpus: set):
+    """Runs one network writer in its own process (real-time mode)
+
+    Reads the samples from the shared ring at its own pace until the
+    acquisition process closes the ring.
+
+    Args:
+        writer (str): "questdb" (QuestDB worker, spill log and replay) or "grafana"
+    """
+    # Ctrl+C goes to the acquisition process, which closes the ring to stop the writers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print_log(f"Warning: {writer} writer CPU affinity not set: {e}")
+    print_log(f"Writer <{writer}>: {describe_scheduling()}")
+
+    start_writers(schema, grafana_filters, loop_rps, questdb=writer == "questdb", grafana=writer == "grafana")
+    consumer = ring.consumer()
+    metric_ring_lag.labels(writer=writer).set_function(consumer.lag)
+    metric_ring_overruns.labels(writer=writer).set_function(lambda: consumer.overruns)
+    port_offset = 1 + list(WRITER_METRICS).index(writer)
+    start_metrics_server(registry.subset(WRITER_METRICS[writer]), METRICS_PORT and METRICS_PORT + port_offset)
+    last_report_time = time.monotonic()
+    last_report_overruns = 0
+    while True:
+        records = consumer.read()
+        if records is None:
+            if ring.closed and consumer.lag() == 0:
+                break
+            time.sleep(RING_POLL_INTERVAL)
+        else:
+            # the value rows are views of the copied records, no per-value objects
+            for seq, timestamp_ns, values in zip(records['seq'].tolist(), records['timestamp'].tolist(),
+                                                 records['values']):
+                send_sample(Sample(schema, seq, timestamp_ns, values))
 
-            except requests.exceptions.RequestException:
-                pass # Silently ignore network timeouts so we don't spam logs
-            except Exception as e:
-                print_log(f"Unexpected Grafana Formatting Error: {e}")
-            finally:
-                grafana_queue.task_done()
+        current_time = time.monotonic()
+        if current_time - last_report_time > 10:
+            print_log("-"*50)
+            report_writers(current_time - last_report_time)
+            print_log(f"Ring <{writer}>: lag {consumer.lag()}, "
+                      f"{consumer.overruns - last_report_overruns} samples overrun")
+            last_report_overruns = consumer.overruns
+            last_report_time = current_time
+
+    stop_writers()
 
-    except Exception as e:
-        print_log(f"Grafana Error: {e}")
 
 # init sensors
-with DAQ(DAQ_CONFIG_FILENAME) as daq:
+with DAQ(DAQ_CONFIG_FILENAME, default_rate=TARGET_RPS) as daq:
     sensor_dict = daq.get_sensor_dict()
 
     # sensors = [adcmanager.Sensor(name) for name in adcmanager.config["sensors"]]
     load_cells_for_net_force = ['lc1', 'lc2', 'lc3']
     net_force_measured = any(sensor_name in load_cells_for_net_force for sensor_name in sensor_dict.keys())
 
-    # start worker threads
-    threading.Thread(target=questdb_worker, daemon=True).start()
-    if GRAFANA_ENABLED:
-        threading.Thread(target=grafana_worker, daemon=True).start()
+    # each rate group is written to its own table every `divisor` loop iterations
+    rate_groups = daq.get_rate_groups()
+    loop_rps = max(rate_groups)
+    # net force goes to the fastest group that has one of its load cells
+    net_force_rate = None
+    if net_force_measured:
+        net_force_rate = next(rate for rate, group_names in rate_groups.items()
+                              if any(lc in group_names for lc in load_cells_for_net_force))
+
+    # channel names are held once in the schema, samples only carry a value vector
+    schema = SampleSchema(daq.plan_names + (['lc_net_force'] if net_force_measured else []))
+    if net_force_measured:
+        net_force_column = schema.index['lc_net_force']
+        net_force_index = schema.indices([lc for lc in load_cells_for_net_force if lc in daq.schema])
+
+    write_groups = [] # (table_name, divisor, column names, their positions in the sample values)
+    for rate, group_names in rate_groups.items():
+        table_name = HOSTNAME if len(rate_groups) == 1 else f"{HOSTNAME}_{rate:g}hz"
+        divisor = max(1, round(loop_rps / rate))
+        group_names = group_names + (['lc_net_force'] if rate == net_force_rate else [])
+        write_groups.append((table_name, divisor, group_names, schema.indices(group_names)))
+        print_log(f"Table <{table_name}> at {loop_rps / divisor:g} Hz: {', '.join(group_names)}")
+
+    # per sensor display filters for grafana (see filters.py)
+    grafana_filters = {name: (daq.config["sensors"][name] or {}).get("display_filter") for name in daq.get_sensor_names()}
+
+    if args.rt:
+        # every sample goes into a shared memory ring, each writer process reads it at its own pace
+        ring = SharedRing.create(RING_NAME, schema.names, int(RING_SECONDS * loop_rps))
+        print_log(f"Sample ring <{ring.name}>: {ring.capacity} samples")
+        if not GRAFANA_ENABLED:
+            print_log("Warning: grafana.key not found. Grafana streaming disabled.")
+
+        # forked before the ADC threads start and before the priority is raised,
+        # so the writers keep the default scheduler and stay off the acquisition core
+        rt_cpus = {args.cpu}
+        mp_context = multiprocessing.get_context('fork')
+        writers = [mp_context.Process(target=writer_process, name=f"{writer}_writer",
+                                      args=(ring, writer, schema, grafana_filters, loop_rps, other_cpus(rt_cpus)))
+                   for writer in (["questdb", "grafana"] if GRAFANA_ENABLED else ["questdb"])]
+        for writer in writers:
+            writer.start()
+        metric_ring_written.set_function(lambda: ring.write_seq)
+        # started before the priority is raised so the server thread keeps the default scheduler
+        metrics_server = start_metrics_server(registry.subset(ACQUISITION_METRICS), METRICS_PORT)
+        # the ADC worker threads do the DRDY waits and SPI reads, they run on the
+        # acquisition core at the top priority. The main loop only copies their
+        # sweeps into the ring and runs one priority below them.
+        loop_priority = max(1, args.priority - 1)
+        for error in enter_realtime(rt_cpus, loop_priority):
+            print_log(f"Warning: {error}")
+        daq.start_acquisition()
+        for worker in daq.workers.values():
+            for error in set_thread_realtime(rt_cpus, args.priority, worker.native_id):
+                print_log(f"Warning: ADC{worker.adc_id} worker {error}")
+        print_log(f"Acquisition: {describe_scheduling()}")
+        for adc_id, worker in daq.workers.items():
+            print_log(f"ADC{adc_id} worker: {describe_scheduling(worker.native_id)}")
     else:
-        print_log("Warning: grafana.key not found. Grafana streaming disabled.")
+        # start worker threads
+        start_writers(schema, grafana_filters, loop_rps)
+        metrics_server = start_metrics_server(registry, METRICS_PORT)
+
+    # paces the loop on the monotonic clock and converts DRDY times to wall time
+    clock = SamplingClock(loop_rps)
 
     row_count = 0
-    start_time = time.time()
+    metric_samples.set_function(lambda: row_count)
+    metric_missed_deadlines.set_function(lambda: clock.missed_deadlines_total)
+    for adc_id, adc in daq.adcs.items():
+        metric_drdy_timeouts.labels(adc=adc_id).set_function(adc.getDRDYTimeouts)
     last_report_rows = 0
-    last_report_time = time.time()
+    last_report_time = time.monotonic()
+    last_report_drdy_timeouts = 0
 
     print_log("Starting Data Ingestion")
     try:
-        next_sample_time = time.time()
         while True:
             loop_start = time.perf_counter()
             # save all sensor values
             adc_start = time.perf_counter()
-            columns = daq.get_all_sensor_values()
+            sample = daq.get_sample(schema)
 
             # sum net force
             if net_force_measured:
-                columns['lc_net_force'] = sum(columns.get(lc, 0) for lc in load_cells_for_net_force)
-            stats['adc_time'].append(time.perf_counter() - adc_start)
-            timestamp = datetime.now(tz=est)
+                sample.values[net_force_column] = sample.values[net_force_index].sum()
+            adc_time = time.perf_counter() - adc_start
+            stats['adc_time'].append(adc_time)
+            metric_adc_time.observe(adc_time)
+            # stamped with the DRDY time of the newest conversion, not the time of the read
+            sample.time_ns = clock.to_wall_ns(sample.time_ns)
 
             # send to workers
             queue_start = time.perf_counter()
-            packet = {'columns': columns, 'time': timestamp}
-            
-            try:
-                questdb_queue.put_nowait(packet)
-            except queue.Full:
-                if row_count % TARGET_RPS == 0:
-                    print_log("Warning: Data Loss <QUESTDB QUEUE FULL>")
-
-            try:    
-                if GRAFANA_ENABLED:
-                    grafana_queue.put_nowait(packet)
-            except queue.Full:
-                if row_count % TARGET_RPS == 0:
-                    print_log("Warning: Data Loss <GRAFANA QUEUE FULL>")
+            if args.rt:
+                # never blocks, writers that fall behind lose their oldest samples
+                ring.write(sample.time_ns, sample.values)
+            else:
+                send_sample(sample)
 
-            stats['queue_wait'].append(time.perf_counter() - queue_start)
+            queue_wait = time.perf_counter() - queue_start
+            stats['queue_wait'].append(queue_wait)
+            metric_queue_wait.observe(queue_wait)
 
             row_count += 1
-            stats['main_loop_time'].append(time.perf_counter() - loop_start)
+            loop_time = time.perf_counter() - loop_start
+            stats['main_loop_time'].append(loop_time)
+            metric_loop_time.observe(loop_time)
 
             # report speed stats
-            current_time = time.time()
+            current_time = time.monotonic()
             if current_time - last_report_time > 10:
                 # get averages
                 avg_rps = (row_count - last_report_rows) / (current_time - last_report_time)
                 avg_adc = np.mean(stats['adc_time']) * 1000
-                avg_questdb = np.mean(stats['questdb_send_time']) * 1000
-                if GRAFANA_ENABLED:
-                    avg_grafana = np.mean(stats['grafana_send_time']) * 1000
                 avg_queuew = np.mean(stats['queue_wait']) * 1000
+                drdy_timeouts = daq.get_drdy_timeouts()
+                new_drdy_timeouts = sum(drdy_timeouts.values()) - last_report_drdy_timeouts
 
                 # report
                 print_log(f"="*50)
                 print_log(f"AVG RPS:     {avg_rps:.1f}")
                 print_log(f"AVG ADC:     {avg_adc:.1f} ms")
-                print_log(f"AVG QuestDB: {avg_questdb:.1f} ms")
-                if GRAFANA_ENABLED:
-                    print_log(f"AVG Grafana: {avg_grafana:.1f} ms")
+                if args.rt:
+                    # the writer processes report the QuestDB, spill and Grafana stats themselves
+                    print_log(f"Sample Ring: {ring.write_seq} samples written, {ring.capacity} slots")
+                else:
+                    report_writers(current_time - last_report_time)
                 print_log(f"AVG Queue:   {avg_queuew:.1f} ms")
+                print_log(f"Loop Jitter: {clock.report()}")
+                if new_drdy_timeouts:
+                    print_log(f"Warning: {new_drdy_timeouts} DRDY timeouts {drdy_timeouts}")
 
                 # reset last
                 last_report_rows = row_count
+                last_report_drdy_timeouts += new_drdy_timeouts
                 last_report_time = current_time
 
-            next_sample_time += SAMPLE_INTERVAL
-            sleep_time = next_sample_time - time.time()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            deadline_ns = clock.wait()
+            metric_loop_jitter.observe((time.monotonic_ns() - deadline_ns) / 1e9)
 
     except KeyboardInterrupt:
         print_log("Program interuppted by user")
@@ -232,3 +675,16 @@ with DAQ(DAQ_CONFIG_FILENAME) as daq:
         print_log(f"Unexpected error: {e}")
         import traceback
         traceback.print_exc()
+
+    if args.rt:
+        # the writers read the rest of the ring and flush (or spill) it
+        ring.close_writer()
+        for writer in writers:
+            writer.join(timeout=QDB_SHUTDOWN_TIMEOUT + 5)
+            if writer.is_alive():
+                writer.terminate()
+        ring.close()
+    else:
+        stop_writers()
+    if metrics_server is not None:
+        metrics_server.stop()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Vectorised display filters for the Grafana stream
+
+Every sensor has a chain of filters (moving median, EMA, Butterworth low pass)
+set with the `display_filter` key of its entry in the `sensors` section of the
+config file. The engine applies the chains to all sensors at once: the n-th
+filter of every chain is grouped with the n-th filter of the other chains that
+have the same type and parameters, and each group is evaluated with one NumPy
+call over its sensors.
+
+Example:
+    sensors:
+      lc1:
+        display_filter:
+          - {filter: median, window: 10}
+          - {filter: ema, strength: 0.25}
+      tc1:
+        display_filter:
+          - {filter: butterworth, cutoff: 2}    # Hz, 2nd order low pass
+
+Sensors without `display_filter` use the default chain given to the engine.
+"""
+
+import math
+
+import numpy as np
+
+
+class MedianFilter:
+    """Moving median over the last `window` samples, backed by a 2-D ring buffer"""
+
+    def __init__(self, num_channels: int, window: int):
+        if window < 1:
+            raise ValueError(f"Median window must be at least 1, got {window}")
+        self.window = window
+        self.ring = np.zeros((num_channels, window))
+        self.sorted = np.zeros((num_channels, window))
+        self.position = 0
+        # middle column(s) of the sorted window
+        self.lower = (window - 1) // 2
+        self.upper = window // 2
+
+    def reset(self, x: np.ndarray):
+        self.ring[:] = x[:, np.newaxis]
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        self.ring[:, self.position] = x
+        self.position = (self.position + 1) % self.window
+        # an in-place sort of a small window is much faster than np.median
+        np.copyto(self.sorted, self.ring)
+        self.sorted.sort(axis=1)
+        return (self.sorted[:, self.lower] + self.sorted[:, self.upper]) * 0.5
+
+
+class EMAFilter:
+    """Exponential moving average, y = strength * x + (1 - strength) * y"""
+
+    def __init__(self, num_channels: int, strength: float):
+        if not 0 < strength <= 1:
+            raise ValueError(f"EMA strength must be in (0, 1], got {strength}")
+        self.strength = strength
+        self.y = np.zeros(num_channels)
+
+    def reset(self, x: np.ndarray):
+        self.y[:] = x
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        self.y *= 1 - self.strength
+        self.y += self.strength * x
+        return self.y
+
+
+class ButterworthFilter:
+    """2nd order Butterworth low pass (bilinear transform, transposed direct form II)"""
+
+    def __init__(self, num_channels: int, cutoff: float, sample_rate: float):
+        if not 0 < cutoff < sample_rate / 2:
+            raise ValueError(f"Butterworth cutoff must be between 0 and {sample_rate / 2} Hz, got {cutoff}")
+        k = math.tan(math.pi * cutoff / sample_rate)
+        norm = 1 / (1 + math.sqrt(2) * k + k * k)
+        self.b0 = k * k * norm
+        self.b1 = 2 * self.b0
+        self.b2 = self.b0
+        self.a1 = 2 * (k * k - 1) * norm
+        self.a2 = (1 - math.sqrt(2) * k + k * k) * norm
+        self.z1 = np.zeros(num_channels)
+        self.z2 = np.zeros(num_channels)
+
+    def reset(self, x: np.ndarray):
+        # steady state for a constant input
+        self.z1[:] = x * (1 - self.b0)
+        self.z2[:] = x * (self.b2 - self.a2)
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        y = self.b0 * x + self.z1
+        self.z1 = self.b1 * x - self.a1 * y + self.z2
+        self.z2 = self.b2 * x - self.a2 * y
+        return y
+
+
+def create_filter(filter_config: dict, num_channels: int, sample_rate: float):
+    filter_type = filter_config.get("filter")
+    if filter_type == "median":
+        return MedianFilter(num_channels, int(filter_config.get("window", 10)))
+    if filter_type == "ema":
+        return EMAFilter(num_channels, float(filter_config.get("strength", 0.25)))
+    if filter_type == "butterworth":
+        return ButterworthFilter(num_channels, float(filter_config["cutoff"]), sample_rate)
+    raise ValueError(f"Unknown display filter <{filter_type}>")
+
+
+class FilterEngine:
+    """Applies the filter chains of all sensors to one sample vector at a time"""
+
+    def __init__(self, names: list, filter_configs: dict, sample_rate: float, default_chain: list):
+        """
+        Args:
+            names (list): sensor names, in the order of the sample vectors
+            filter_configs (dict): {sensor_name: filter chain}, a chain is a list
+                of dicts with a `filter` key and its parameters
+            sample_rate (float): rate in Hz at which `update()` is called
+            default_chain (list): chain of the sensors without an entry
+        """
+        self.names = list(names)
+        chains = [filter_configs.get(name) or default_chain for name in self.names]
+
+        # stages[n] holds the n-th filter of every chain grouped by type and parameters
+        self.stages = []
+        for position in range(max((len(chain) for chain in chains), default=0)):
+            groups = {}
+            for channel, chain in enumerate(chains):
+                if position < len(chain):
+                    key = tuple(sorted(chain[position].items()))
+                    groups.setdefault(key, []).append(channel)
+            stage = []
+            for key, channels in groups.items():
+                # a group of every sensor is indexed with a slice (a view, no gather)
+                index = slice(None) if len(channels) == len(self.names) else np.array(channels, dtype=np.intp)
+                stage.append((index, create_filter(dict(key), len(channels), sample_rate)))
+            self.stages.append(stage)
+
+        self.output = np.zeros(len(self.names))
+        self.initialized = False
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        """Filters one sample of every sensor
+
+        Returns:
+            output (np.ndarray): filtered values, the same array is overwritten
+                on every call
+        """
+        self.output[:] = x
+        if not self.initialized:
+            # start every filter from a settled state at the first sample
+            for stage in self.stages:
+                for channels, stage_filter in stage:
+                    stage_filter.reset(self.output[channels])
+            self.initialized = True
+
+        for stage in self.stages:
+            for channels, stage_filter in stage:
+                self.output[channels] = stage_filter.apply(self.output[channels])
+        return self.output
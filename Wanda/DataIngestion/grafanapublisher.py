@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Rate-limited Grafana Live publisher
+
+The ingest loop hands every `Sample` to `publish()`, which only appends it to
+a bounded deque. The publisher thread wakes up at the display rate, runs the
+display filters over all samples that arrived since the last push and sends
+the newest `max_lines` of them as one multi-line Influx line protocol request
+over a persistent HTTP session. If a push is slow the older samples are
+dropped, Grafana always gets the newest values instead of a stale backlog.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import requests
+
+
+class GrafanaPublisher(threading.Thread):
+
+    def __init__(self, url: str, headers: dict, measurement: str, filter_engine,
+                 display_rate: float = 25, max_lines: int = 4, timeout: float = 0.5, backlog: int = 1000,
+                 push_seconds=None):
+        """
+        Args:
+            url (str): Grafana Live push url
+            headers (dict): HTTP headers (authorization)
+            measurement (str): measurement name of the lines
+            filter_engine (FilterEngine): display filters, its `names` are the published
+                fields and the schema of the published samples
+            display_rate (float): pushes per second
+            max_lines (int): newest samples sent per push
+            timeout (float): HTTP timeout in seconds
+            backlog (int): samples kept between pushes, older ones are dropped
+            push_seconds (metrics.Histogram, optional): observes the time of every push
+        """
+        super().__init__(name="GrafanaPublisher", daemon=True)
+        self.url = url
+        self.measurement = measurement
+        self.filter_engine = filter_engine
+        self.interval = 1.0 / display_rate
+        self.max_lines = max_lines
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+
+        self.samples = deque(maxlen=backlog)
+        # newest filtered samples of the current push, written round robin
+        self.line_values = np.zeros((max_lines, len(filter_engine.names)))
+        self.line_times = [0] * max_lines
+        self.running = False
+
+        # stats
+        self.send_times = deque(maxlen=100)
+        self.push_seconds = push_seconds
+        self.pushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def publish(self, sample):
+        """Queues a sample (values in `filter_engine.names` order) for the next push, never blocks"""
+        self.samples.append(sample)
+
+    def run(self):
+        next_push = time.monotonic()
+        while self.running:
+            next_push += self.interval
+            delay = next_push - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # behind schedule, skip the missed pushes
+                next_push = time.monotonic()
+
+            lines = self.collect_lines()
+            if lines:
+                self.push(lines)
+
+    def collect_lines(self) -> list:
+        """Filters the queued samples and formats the newest `max_lines` of them"""
+        count = 0
+        while self.samples:
+            sample = self.samples.popleft()
+            # every sample goes through the filters so they keep their rate
+            filtered = self.filter_engine.update(sample.values)
+            slot = count % self.max_lines
+            self.line_values[slot] = filtered
+            self.line_times[slot] = sample.time_ns
+            count += 1
+        self.dropped += max(0, count - self.max_lines)
+
+        # oldest first
+        names = self.filter_engine.names
+        slots = [(count - i) % self.max_lines for i in range(min(count, self.max_lines), 0, -1)]
+        return [f"{self.measurement} {','.join(f'{field}={value}' for field, value in zip(names, self.line_values[slot].tolist()))} "
+                f"{self.line_times[slot]}"
+                for slot in slots]
+
+    def push(self, lines: list):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, data="\n".join(lines), timeout=self.timeout)
+            response.raise_for_status()
+            self.pushes += 1
+        except requests.exceptions.RequestException:
+            # network hiccups are expected, the next push has newer data anyway
+            self.failures += 1
+        elapsed = time.perf_counter() - start
+        self.send_times.append(elapsed)
+        if self.push_seconds is not None:
+            self.push_seconds.observe(elapsed)
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self, timeout: float = 1.0):
+        self.running = False
+        self.join(timeout)
+        self.session.close()
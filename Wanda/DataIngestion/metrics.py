@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""In-process metrics with a Prometheus text endpoint
+
+A `Registry` holds counters, gauges and histograms with fixed buckets. An
+update is a per-metric lock and an addition (a bisect for histograms), cheap
+enough for the acquisition loop. Counters and gauges can also read their value from a
+function when the registry is scraped (queue depths, counters kept by other
+objects).
+
+`MetricsServer` serves `Registry.render()` in the Prometheus text format
+(version 0.0.4) at `/metrics` from a daemon thread, so Prometheus, Grafana
+or the status server can scrape it.
+"""
+
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, 100 us to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metric:
+    """A named metric, optionally split into children by label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), **options):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self.lock = threading.Lock()
+        self.children = {}  # label values -> child metric
+        self.function = None
+
+    def labels(self, *values, **labels) -> "Metric":
+        """Returns the child for the given label values, created on first use"""
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Metric <{self.name}> has labels {self.labelnames}, got {values}")
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = type(self)(self.name, self.documentation, **self.options)
+            return child
+
+    def set_function(self, function):
+        """Reads the value from `function()` when the metric is scraped"""
+        self.function = function
+
+    def samples(self) -> list:
+        """Returns (name suffix, labels, value) of the metric and its children"""
+        if not self.labelnames:
+            return self.own_samples()
+        with self.lock:
+            children = sorted(self.children.items())
+        return [(suffix, {**dict(zip(self.labelnames, values)), **labels}, value)
+                for values, child in children
+                for suffix, labels, value in child.own_samples()]
+
+    def own_samples(self) -> list:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), **options):
+        super().__init__(name, documentation, labelnames, **options)
+        self.value = 0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self.lock:
+            self.value += amount
+
+    def own_samples(self) -> list:
+        return [("", {}, self.function() if self.function is not None else self.value)]
+
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), **options):
+        super().__init__(name, documentation, labelnames, **options)
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def own_samples(self) -> list:
+        return [("", {}, self.function() if self.function is not None else self.value)]
+
+
+class Histogram(Metric):
+    """Counts observations in fixed buckets (upper bounds, `le`)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, buckets=buckets)
+        self.bounds = sorted(buckets)
+        # one count per bound plus +Inf, not cumulative
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def own_samples(self) -> list:
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds + [math.inf], counts):
+            cumulative += bucket_count
+            samples.append(("_bucket", {'le': format_value(float(bound))}, cumulative))
+        samples.append(("_sum", {}, total))
+        samples.append(("_count", {}, count))
+        return samples
+
+
+class Registry:
+    """Named metrics of a process"""
+
+    def __init__(self, metrics: dict = None):
+        self.metrics = dict(metrics or {})
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric <{metric.name}> is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def subset(self, prefixes: list) -> "Registry":
+        """Returns a registry with the metrics whose names start with one of `prefixes`"""
+        with self.lock:
+            return Registry({name: metric for name, metric in self.metrics.items()
+                             if name.startswith(tuple(prefixes))})
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = metric.samples()
+            except Exception:
+                # a broken value function must not break the whole scrape
+                continue
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves a registry at /metrics from a daemon thread"""
+
+    daemon_threads = True
+
+    def __init__(self, registry: Registry, port: int, host: str = "0.0.0.0"):
+        super().__init__((host, port), MetricsHandler)
+        self.registry = registry
+        self.thread = threading.Thread(target=self.serve_forever, name="MetricsServer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Real-time scheduling for the acquisition process (Linux)
+
+`enter_realtime()` pins the calling thread to a set of cores, raises it to
+SCHED_FIFO and locks the process memory (`mlockall`) so page faults cannot
+stall the sampling loop. Threads started afterwards inherit the affinity and
+the scheduling policy, `set_thread_realtime()` gives a thread (e.g. an ADC
+worker) its own priority.
+
+The core should be isolated from the rest of the system with `isolcpus=3`
+(or `isolcpus=3 nohz_full=3 rcu_nocbs=3`) on the kernel command line in
+`/boot/firmware/cmdline.txt`. SCHED_FIFO and mlockall need root or the
+`LimitRTPRIO`/`LimitMEMLOCK` limits of the systemd unit.
+"""
+
+import ctypes
+import ctypes.util
+import os
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+POLICY_NAMES = {getattr(os, name): name for name in
+                ("SCHED_OTHER", "SCHED_BATCH", "SCHED_IDLE", "SCHED_FIFO", "SCHED_RR") if hasattr(os, name)}
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _mlockall = _libc.mlockall
+    _mlockall.argtypes = [ctypes.c_int]
+    _mlockall.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError): # no libc mlockall (not Linux)
+    _mlockall = None
+
+
+def lock_memory():
+    """Locks all current and future pages of the process in RAM"""
+    if _mlockall is None:
+        raise OSError("mlockall is not available on this system")
+    if _mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def locked_memory_kb() -> int:
+    """Returns the locked memory of the process in kB (`VmLck`)"""
+    try:
+        with open("/proc/self/status", "r") as status_file:
+            for line in status_file:
+                if line.startswith("VmLck:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def other_cpus(cpus: set) -> set:
+    """Returns the cores of the calling thread without `cpus` (all of them if none are left)"""
+    available = os.sched_getaffinity(0)
+    return (available - set(cpus)) or available
+
+
+def set_thread_realtime(cpus: set, priority: int, thread_id: int = 0) -> list:
+    """Pins a thread to `cpus` and sets SCHED_FIFO `priority`
+
+    Both steps are attempted even if the first one fails, check the result
+    with `describe_scheduling()`.
+
+    Args:
+        thread_id (int): native id of the thread (`threading.get_native_id()`),
+            0 for the calling thread
+
+    Returns:
+        errors (list): messages of the steps that failed
+    """
+    errors = []
+    try:
+        os.sched_setaffinity(thread_id, cpus)
+    except OSError as e:
+        errors.append(f"CPU affinity {sorted(cpus)} not set: {e}")
+    try:
+        os.sched_setscheduler(thread_id, os.SCHED_FIFO, os.sched_param(priority))
+    except (OSError, AttributeError) as e:
+        errors.append(f"SCHED_FIFO priority {priority} not set: {e}")
+    return errors
+
+
+def enter_realtime(cpus: set, priority: int) -> list:
+    """Pins the calling thread to `cpus`, sets SCHED_FIFO `priority` and locks memory
+
+    Every step is attempted even if an earlier one fails, check the result
+    with `describe_scheduling()`.
+
+    Returns:
+        errors (list): messages of the steps that failed
+    """
+    errors = set_thread_realtime(cpus, priority)
+    try:
+        lock_memory()
+    except OSError as e:
+        errors.append(f"Memory not locked: {e}")
+    return errors
+
+
+def describe_scheduling(thread_id: int = 0) -> str:
+    """Returns the policy, priority, affinity and locked memory of a thread
+
+    Args:
+        thread_id (int): native id of the thread (`threading.get_native_id()`),
+            0 for the calling thread
+    """
+    policy = os.sched_getscheduler(thread_id)
+    priority = os.sched_getparam(thread_id).sched_priority
+    cpus = ",".join(str(cpu) for cpu in sorted(os.sched_getaffinity(thread_id)))
+    return (f"{POLICY_NAMES.get(policy, policy)} priority {priority}, CPUs {cpus}, "
+            f"{locked_memory_kb()} kB locked")
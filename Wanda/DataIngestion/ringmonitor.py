@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Local display of the running data ingestion (real-time mode)
+
+Attaches to the shared memory sample ring of `dataingestion.py --rt` as one
+more consumer and prints the newest values with the sample rate, lag and
+overruns of this reader. It never slows down acquisition.
+
+Usage:
+    python ringmonitor.py [--name wanda_samples] [--interval 1.0]
+"""
+
+import argparse
+import time
+
+from sharedring import SharedRing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints the newest samples of the shared memory ring")
+    parser.add_argument("--name", default="wanda_samples", help="shared memory name of the ring")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between prints")
+    args = parser.parse_args()
+
+    ring = SharedRing.attach(args.name)
+    consumer = ring.consumer()
+    print(f"Attached to <{ring.name}>: {len(ring.channels)} channels, {ring.capacity} slots")
+    try:
+        while not ring.closed:
+            time.sleep(args.interval)
+            records = consumer.read()
+            if records is None:
+                print("No new samples")
+                continue
+            newest = records[-1]
+            age_ms = (time.time_ns() - int(newest['timestamp'])) / 1e6
+            print(f"seq {int(newest['seq'])} | {len(records) / args.interval:.1f} samples/s | "
+                  f"age {age_ms:.1f} ms | overruns {consumer.overruns}")
+            print("  " + "  ".join(f"{name}={value:.3f}" for name, value in zip(ring.channels, newest['values'])))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Drift-free sampling clock for the ingest loop
+
+The loop is paced on `time.monotonic_ns()` with absolute deadlines
+(`clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME)` when libc provides it), so
+late iterations do not shift the following ones and NTP steps of the wall
+clock do not affect the rate. Wall time is read once at startup, monotonic
+times (e.g. the DRDY time of a sample) are converted to wall time with that
+anchor.
+
+The wake-up jitter of every iteration is recorded in a log-linear (HDR-style)
+histogram with microsecond resolution.
+"""
+
+import ctypes
+import ctypes.util
+import time
+
+import numpy as np
+
+CLOCK_MONOTONIC = 1
+TIMER_ABSTIME = 1
+EINTR = 4
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _clock_nanosleep = _libc.clock_nanosleep
+    _clock_nanosleep.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(_Timespec), ctypes.POINTER(_Timespec)]
+    _clock_nanosleep.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError): # no libc clock_nanosleep (not Linux)
+    _clock_nanosleep = None
+
+
+def sleep_until_monotonic_ns(deadline: int):
+    """Sleeps until `time.monotonic_ns()` reaches `deadline`"""
+    if _clock_nanosleep is not None:
+        request = _Timespec(deadline // 1_000_000_000, deadline % 1_000_000_000)
+        while _clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, ctypes.byref(request), None) == EINTR:
+            pass
+        return
+    remaining = deadline - time.monotonic_ns()
+    if remaining > 0:
+        time.sleep(remaining / 1e9)
+
+
+class JitterHistogram:
+    """Log-linear histogram of non-negative durations in microseconds
+
+    Values below `2 ** sub_bucket_bits` us are counted exactly, larger values
+    in buckets of 1/2 ** (sub_bucket_bits - 1) of their power of two
+    (about 6 % with the default of 5 bits).
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5, max_magnitude: int = 40):
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = np.zeros(self.sub_bucket_count + max_magnitude * self.half_count, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.max_us = 0
+
+    def index(self, value_us: int) -> int:
+        if value_us < self.sub_bucket_count:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + (value_us >> shift) - self.half_count
+
+    def upper_bound(self, index: int) -> int:
+        """Returns the largest value (us) counted in a bucket"""
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index - self.sub_bucket_count) // self.half_count + 1
+        top = (index - self.sub_bucket_count) % self.half_count + self.half_count
+        return ((top + 1) << shift) - 1
+
+    def record_ns(self, value_ns: int):
+        value_us = max(0, value_ns) // 1000
+        self.counts[min(self.index(value_us), len(self.counts) - 1)] += 1
+        self.total += 1
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, percent: float) -> int:
+        """Returns the upper bound (us) of the bucket holding the given percentile"""
+        if self.total == 0:
+            return 0
+        rank = max(1, int(np.ceil(self.total * percent / 100)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self.upper_bound(index), self.max_us)
+
+
+class SamplingClock:
+    """Paces a loop at a fixed rate on the monotonic clock"""
+
+    def __init__(self, rate: float):
+        self.period_ns = round(1e9 / rate)
+        # wall time anchor, read once
+        self.anchor_monotonic_ns = time.monotonic_ns()
+        self.anchor_wall_ns = time.time_ns()
+        self.next_deadline_ns = self.anchor_monotonic_ns
+
+        self.jitter = JitterHistogram()
+        self.missed_deadlines = 0        # since the last report
+        self.missed_deadlines_total = 0
+
+    def to_wall_ns(self, monotonic_ns: int) -> int:
+        """Converts a `time.monotonic_ns()` time to ns since the epoch"""
+        return self.anchor_wall_ns + (monotonic_ns - self.anchor_monotonic_ns)
+
+    def now_wall_ns(self) -> int:
+        return self.to_wall_ns(time.monotonic_ns())
+
+    def wait(self) -> int:
+        """Sleeps until the next deadline and returns it (monotonic ns)
+
+        If the loop fell more than a period behind, the missed deadlines are
+        counted and skipped so the loop stays on its original time grid.
+        """
+        self.next_deadline_ns += self.period_ns
+        now = time.monotonic_ns()
+        if now - self.next_deadline_ns >= self.period_ns:
+            missed = (now - self.next_deadline_ns) // self.period_ns
+            self.missed_deadlines += missed
+            self.missed_deadlines_total += missed
+            self.next_deadline_ns += missed * self.period_ns
+
+        sleep_until_monotonic_ns(self.next_deadline_ns)
+        self.jitter.record_ns(time.monotonic_ns() - self.next_deadline_ns)
+        return self.next_deadline_ns
+
+    def report(self) -> str:
+        """Returns the jitter percentiles and missed deadlines and resets them"""
+        jitter = self.jitter
+        report = (f"p50 {jitter.percentile(50)} us, p99 {jitter.percentile(99)} us, "
+                  f"p99.9 {jitter.percentile(99.9)} us, max {jitter.max_us} us, "
+                  f"{self.missed_deadlines} missed deadlines")
+        jitter.reset()
+        self.missed_deadlines = 0
+        return report
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Lock-free shared-memory ring buffer of samples
+
+One producer (the acquisition loop) writes fixed-size records into a ring in
+`multiprocessing.shared_memory`, any number of consumers (QuestDB writer,
+Grafana publisher, local displays) read it at their own pace. Nothing is
+locked and the producer never waits: every consumer keeps its own cursor and
+counts the samples it lost because the producer lapped it (overruns).
+
+Layout of the shared memory block:
+    header (4096 bytes)   magic "WRNG", version, capacity, number of channels,
+                          write sequence, closed flag and the channel names as JSON
+    records               capacity x (seq int64, timestamp int64, float64 per channel)
+
+The producer fills a slot and then publishes it by advancing the write
+sequence. A consumer copies the slots up to the write sequence and keeps the
+ones whose slot sequence is the expected one and that the producer can not
+have started to overwrite during the copy.
+"""
+
+import json
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = b"WRNG"
+VERSION = 1
+HEADER_BYTES = 4096
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("capacity", "<i8"),
+    ("num_channels", "<i8"),
+    ("write_seq", "<i8"),
+    ("closed", "<i8"),
+    ("names_length", "<i8"),
+])
+
+
+def record_dtype(num_channels: int) -> np.dtype:
+    return np.dtype([("seq", "<i8"), ("timestamp", "<i8"), ("values", "<f8", (num_channels,))])
+
+
+class SharedRing:
+    """Single-producer, multi-consumer ring of (seq, timestamp, values) records"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        """Use `SharedRing.create()` or `SharedRing.attach()`"""
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if self.header["magic"] != MAGIC or self.header["version"] != VERSION:
+            raise ValueError(f"Shared memory <{shm.name}> is not a sample ring")
+
+        self.capacity = int(self.header["capacity"])
+        names_length = int(self.header["names_length"])
+        names_offset = HEADER_DTYPE.itemsize
+        self.channels = json.loads(bytes(shm.buf[names_offset:names_offset + names_length]).decode())
+        self.records = np.ndarray((self.capacity,), dtype=record_dtype(len(self.channels)),
+                                  buffer=shm.buf, offset=HEADER_BYTES)
+        # field views, written without building a record per sample
+        self.seq_field = self.records["seq"]
+        self.timestamp_field = self.records["timestamp"]
+        self.values_field = self.records["values"]
+        self.next_seq = int(self.header["write_seq"])
+
+    @classmethod
+    def create(cls, name: str, channels: list, capacity: int) -> "SharedRing":
+        """Creates the ring (the producer side), replacing a stale one with the same name"""
+        names = json.dumps(list(channels)).encode()
+        if HEADER_DTYPE.itemsize + len(names) > HEADER_BYTES:
+            raise ValueError(f"Too many channel names for the ring header ({len(names)} bytes)")
+        size = HEADER_BYTES + capacity * record_dtype(len(channels)).itemsize
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # left over by a run that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header["capacity"] = capacity
+        header["num_channels"] = len(channels)
+        header["write_seq"] = 0
+        header["closed"] = 0
+        header["names_length"] = len(names)
+        shm.buf[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + len(names)] = names
+        header["version"] = VERSION
+        header["magic"] = MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRing":
+        """Opens an existing ring by name (e.g. from an unrelated consumer process)"""
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError: # Python < 3.13 always tracks, the tracker would unlink the ring on exit
+            shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        """Sequence number of the next record, i.e. the number of records written"""
+        return int(self.header["write_seq"])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.header["closed"])
+
+    def write(self, timestamp_ns: int, values):
+        """Appends one record, overwriting the oldest one (producer only)"""
+        seq = self.next_seq
+        slot = seq % self.capacity
+        self.values_field[slot] = values
+        self.timestamp_field[slot] = timestamp_ns
+        self.seq_field[slot] = seq
+        # publish the slot
+        self.next_seq = seq + 1
+        self.header["write_seq"] = self.next_seq
+
+    def latest(self):
+        """Returns a copy of the newest record or None"""
+        seq = self.write_seq - 1
+        if seq < 0:
+            return None
+        record = self.records[seq % self.capacity].copy()
+        return record if record["seq"] == seq else None
+
+    def consumer(self, from_start: bool = False) -> "RingConsumer":
+        """Returns a new consumer that starts at the next record (or the oldest one kept)"""
+        return RingConsumer(self, from_start)
+
+    def close_writer(self):
+        """Tells the consumers that no more records follow"""
+        self.header["closed"] = 1
+
+    def close(self):
+        # drop the views before the buffer is released
+        del self.header, self.records, self.seq_field, self.timestamp_field, self.values_field
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingConsumer:
+    """Reads a `SharedRing` at its own pace with its own cursor"""
+
+    def __init__(self, ring: SharedRing, from_start: bool = False):
+        self.ring = ring
+        write_seq = ring.write_seq
+        self.cursor = max(0, write_seq - ring.capacity) if from_start else write_seq
+        self.overruns = 0   # records lost because the producer lapped this consumer
+        self.records_read = 0
+
+    def lag(self) -> int:
+        """Returns the number of records written but not read yet"""
+        return self.ring.write_seq - self.cursor
+
+    def read(self, max_records: int = None):
+        """Returns the records written since the last read
+
+        Returns:
+            records (np.ndarray): copied records with `seq`, `timestamp` and
+                `values` fields, oldest first, or None if there are none
+        """
+        ring = self.ring
+        capacity = ring.capacity
+        start = self.cursor
+        end = ring.write_seq
+        if end - start > capacity:
+            # lapped, the oldest unread records are gone
+            self.overruns += end - capacity - start
+            start = end - capacity
+        if max_records is not None:
+            end = min(end, start + max_records)
+        if end <= start:
+            self.cursor = start
+            return None
+
+        expected = np.arange(start, end)
+        records = ring.records[expected % capacity]
+
+        # slots the producer may have started to overwrite while they were copied
+        valid_from = ring.write_seq - capacity + 1
+        if valid_from > start:
+            dropped = min(valid_from, end) - start
+            self.overruns += dropped
+            records = records[dropped:]
+            expected = expected[dropped:]
+            start += dropped
+
+        # a slot whose sequence is not published yet ends the read, it is read next time
+        unpublished = np.flatnonzero(records["seq"] != expected)
+        if len(unpublished):
+            records = records[:unpublished[0]]
+        self.cursor = start + len(records)
+        self.records_read += len(records)
+        return records if len(records) else None
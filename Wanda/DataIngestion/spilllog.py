@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Append-only spill log for rows that could not be sent to QuestDB
+
+Rows are stored per table in fixed-width binary records (int64 timestamp in
+ns followed by one float64 per column) inside memory-mapped segment files.
+A segment is preallocated to `segment_bytes`, when it is full the log rotates
+to a new segment. Every segment starts with a header holding the column names
+and the number of committed records, so a segment can be read back after a
+crash up to the last complete record. Segments are created under a temporary
+name and renamed into place once the header is written, so a reader never
+sees a segment without a complete header.
+
+Layout of a spill directory:
+    {directory}/{table}/00000001.spill   segments, replayed in order
+    {directory}/{table}/cursor.json      replay position (segment, record)
+
+Fully replayed segments are deleted.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"WSPL"
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, number of columns, record size, committed records
+HEADER_FORMAT = "<4sHHIQ"
+COUNT_OFFSET = struct.calcsize("<4sHHI")
+COLUMNS_OFFSET = struct.calcsize(HEADER_FORMAT)
+
+SEGMENT_SUFFIX = ".spill"
+TEMP_SUFFIX = ".tmp"
+CURSOR_FILENAME = "cursor.json"
+
+
+def record_dtype(num_columns: int) -> np.dtype:
+    return np.dtype([('timestamp', '<i8'), ('values', '<f8', (num_columns,))])
+
+
+def read_header(filename: str):
+    """Returns (columns, record dtype, committed records) of a segment file"""
+    with open(filename, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    magic, version, num_columns, record_size, count = struct.unpack_from(HEADER_FORMAT, header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{filename} is not a spill segment")
+    columns_json = header[COLUMNS_OFFSET:].split(b'\0', 1)[0]
+    columns = json.loads(columns_json)
+    return columns, record_dtype(num_columns), count
+
+
+class SpillSegment:
+    """One preallocated, memory-mapped segment open for writing"""
+
+    def __init__(self, filename: str, columns: list, segment_bytes: int):
+        self.filename = filename
+        self.columns = list(columns)
+        self.dtype = record_dtype(len(self.columns))
+
+        columns_json = json.dumps(self.columns).encode()
+        if COLUMNS_OFFSET + len(columns_json) >= HEADER_SIZE:
+            raise ValueError("Too many columns for a spill segment header")
+        self.capacity = (segment_bytes - HEADER_SIZE) // self.dtype.itemsize
+        if self.capacity < 1:
+            raise ValueError("Spill segment size is smaller than one record")
+
+        temp_filename = filename + TEMP_SUFFIX
+        with open(temp_filename, 'w+b') as file:
+            file.truncate(HEADER_SIZE + self.capacity * self.dtype.itemsize)
+            self.map = mmap.mmap(file.fileno(), 0)
+        struct.pack_into(HEADER_FORMAT, self.map, 0, MAGIC, VERSION, len(self.columns), self.dtype.itemsize, 0)
+        self.map[COLUMNS_OFFSET:COLUMNS_OFFSET + len(columns_json)] = columns_json
+        # the map stays valid, the replayer only lists the segment from here on
+        os.replace(temp_filename, filename)
+        self.records = np.frombuffer(self.map, dtype=self.dtype, count=self.capacity, offset=HEADER_SIZE)
+        self.count = 0
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, timestamp_ns: int, values: list):
+        record = self.records[self.count]
+        record['timestamp'] = timestamp_ns
+        record['values'] = values
+        # the record is written before it is committed in the header
+        self.count += 1
+        struct.pack_into("<Q", self.map, COUNT_OFFSET, self.count)
+
+    def sync(self):
+        self.map.flush()
+
+    def close(self):
+        self.sync()
+        # the numpy view must be released before the map can be closed
+        self.records = None
+        self.map.close()
+
+
+class SpillLog:
+    """Spill log of one table, written by the ingest threads and read by the replayer"""
+
+    def __init__(self, directory: str, table_name: str, segment_bytes: int, sync_interval: float = 1.0):
+        self.table_name = table_name
+        self.directory = os.path.join(directory, table_name)
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        os.makedirs(self.directory, exist_ok=True)
+        # segments that were never completed (crash during rotate)
+        for filename in os.listdir(self.directory):
+            if filename.endswith(SEGMENT_SUFFIX + TEMP_SUFFIX):
+                os.remove(os.path.join(self.directory, filename))
+
+        self.lock = threading.Lock()
+        self.segment = None
+        self.last_sync = 0.0
+        self.appended = 0
+        self.cursor = self.load_cursor()
+
+    def segment_filename(self, sequence: int) -> str:
+        return os.path.join(self.directory, f"{sequence:08d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self) -> list:
+        """Returns the sequence numbers of the segments on disk in order"""
+        return sorted(int(filename[:-len(SEGMENT_SUFFIX)]) for filename in os.listdir(self.directory)
+                      if filename.endswith(SEGMENT_SUFFIX))
+
+    def load_cursor(self) -> tuple:
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILENAME), 'r') as file:
+                cursor = json.load(file)
+            return cursor["segment"], cursor["record"]
+        except FileNotFoundError:
+            segments = self.list_segments()
+            return (segments[0] if segments else 1), 0
+
+    def save_cursor(self):
+        filename = os.path.join(self.directory, CURSOR_FILENAME)
+        with open(filename + ".tmp", 'w') as file:
+            json.dump({"segment": self.cursor[0], "record": self.cursor[1]}, file)
+        os.replace(filename + ".tmp", filename)
+
+    def append(self, timestamp_ns: int, columns: dict):
+        """Appends one row, rotating to a new segment when full or when the columns change"""
+        with self.lock:
+            segment = self.segment
+            if segment is None or segment.full() or list(columns) != segment.columns:
+                segment = self.rotate(list(columns))
+            segment.append(timestamp_ns, list(columns.values()))
+            self.appended += 1
+
+            now = time.monotonic()
+            if now - self.last_sync >= self.sync_interval:
+                segment.sync()
+                self.last_sync = now
+
+    def rotate(self, columns: list) -> SpillSegment:
+        if self.segment is not None:
+            self.segment.close()
+        segments = self.list_segments()
+        sequence = max(segments[-1] if segments else 0, self.cursor[0] - 1) + 1
+        self.segment = SpillSegment(self.segment_filename(sequence), columns, self.segment_bytes)
+        return self.segment
+
+    def read(self, max_records: int):
+        """Reads the oldest rows that were not replayed yet
+
+        Returns:
+            batch (tuple): (columns, records, position) or None if there is
+                nothing to replay. `records` is a structured array with
+                `timestamp` and `values` fields, `position` is passed to
+                `commit()` once the rows are stored in QuestDB.
+        """
+        sequence, record = self.cursor
+        while True:
+            # list first: a later segment only exists once this one is final
+            segments = self.list_segments()
+            if sequence not in segments:
+                later = [s for s in segments if s > sequence]
+                if not later:
+                    return None
+                sequence, record = later[0], 0
+                continue
+
+            filename = self.segment_filename(sequence)
+            columns, dtype, count = read_header(filename)
+            if record < count:
+                num_records = min(count - record, max_records)
+                records = np.fromfile(filename, dtype=dtype, count=num_records,
+                                      offset=HEADER_SIZE + record * dtype.itemsize)
+                return columns, records, (sequence, record + num_records)
+
+            if segments[-1] == sequence:
+                return None
+            # fully replayed and no longer written
+            self.remove_segment(sequence)
+            sequence, record = sequence + 1, 0
+            self.cursor = (sequence, record)
+            self.save_cursor()
+
+    def commit(self, position: tuple):
+        """Marks the rows returned by `read()` as replayed"""
+        self.cursor = position
+        self.save_cursor()
+
+    def remove_segment(self, sequence: int):
+        with self.lock:
+            if self.segment is not None and self.segment.filename == self.segment_filename(sequence):
+                return
+            os.remove(self.segment_filename(sequence))
+
+    def backlog(self) -> int:
+        """Returns the number of rows that were not replayed yet"""
+        rows = 0
+        for sequence in self.list_segments():
+            if sequence < self.cursor[0]:
+                continue
+            try:
+                count = read_header(self.segment_filename(sequence))[2]
+            except FileNotFoundError:
+                continue
+            rows += count - (self.cursor[1] if sequence == self.cursor[0] else 0)
+        return rows
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+
+
+class SpillStore:
+    """Spill logs of all tables in one directory"""
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, sync_interval: float = 1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.logs = {}
+        # pick up the backlog left by a previous run
+        for table_name in sorted(os.listdir(directory)):
+            if os.path.isdir(os.path.join(directory, table_name)):
+                self.get_log(table_name)
+
+    def get_log(self, table_name: str) -> SpillLog:
+        with self.lock:
+            if table_name not in self.logs:
+                self.logs[table_name] = SpillLog(self.directory, table_name, self.segment_bytes, self.sync_interval)
+            return self.logs[table_name]
+
+    def append(self, table_name: str, timestamp_ns: int, columns: dict):
+        self.get_log(table_name).append(timestamp_ns, columns)
+
+    def read(self, max_records: int):
+        """Returns (table name, columns, records, position) of the oldest backlog or None"""
+        for log in list(self.logs.values()):
+            batch = log.read(max_records)
+            if batch is not None:
+                return (log.table_name,) + batch
+        return None
+
+    def commit(self, table_name: str, position: tuple):
+        self.logs[table_name].commit(position)
+
+    def appended(self) -> int:
+        """Returns the number of rows spilled since startup"""
+        return sum(log.appended for log in list(self.logs.values()))
+
+    def backlog(self) -> int:
+        """Returns the number of rows that were not replayed yet"""
+        return sum(log.backlog() for log in list(self.logs.values()))
+
+    def close(self):
+        for log in list(self.logs.values()):
+            log.close()
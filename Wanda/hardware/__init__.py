@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Hardware backends of the Wanda Pis
+
+Code that talks to the hardware imports `GPIO` and `spidev` from here instead
+of `RPi.GPIO` and `spidev`:
+
+    from hardware import GPIO
+
+The backend is chosen with the `WANDA_BACKEND` environment variable:
+
+    pi      RPi.GPIO and spidev (default)
+    sim     simulated ADS1256 Pi hats and relay bank (`hardware.sim`), for
+            running and load testing the acquisition and control code off-Pi
+
+Modules are imported on first use, so the controls code does not need spidev.
+"""
+
+import importlib
+import os
+
+BACKEND_ENV = "WANDA_BACKEND"
+BACKENDS = {
+    'pi': {'GPIO': "RPi.GPIO", 'spidev': "spidev"},
+    'sim': {'GPIO': "hardware.sim.GPIO", 'spidev': "hardware.sim.spidev"},
+}
+
+BACKEND = os.environ.get(BACKEND_ENV, "pi").strip().lower()
+if BACKEND not in BACKENDS:
+    raise ImportError(f"Unknown hardware backend {BACKEND_ENV}={BACKEND}, expected one of {list(BACKENDS)}")
+
+
+def __getattr__(name):
+    if name not in BACKENDS[BACKEND]:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(BACKENDS[BACKEND][name])
+    globals()[name] = module
+    return module
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Drop-in for `RPi.GPIO` on the simulated board
+
+Implements the part of the RPi.GPIO API used by Wanda (BCM numbering only).
+Pin levels, DRDY and relay readback come from `board.get_board()`.
+"""
+
+from .board import get_board
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+HIGH = 1
+LOW = 0
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+RPI_INFO = {'TYPE': 'Simulated', 'P1_REVISION': 3}
+
+_mode = None
+
+
+def setmode(mode):
+    global _mode
+    if mode != BCM:
+        raise ValueError("The simulated GPIO only supports BCM pin numbering")
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def _check_mode():
+    if _mode is None:
+        raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
+    _check_mode()
+    channels = channel if isinstance(channel, (list, tuple)) else [channel]
+    for pin in channels:
+        get_board().setup(pin, direction, initial)
+
+
+def output(channel, value):
+    channels = channel if isinstance(channel, (list, tuple)) else [channel]
+    values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+    board = get_board()
+    for pin, level in zip(channels, values):
+        board.output(pin, level)
+
+
+def input(channel):
+    return get_board().input(channel)
+
+
+def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
+    """Returns `channel` on the edge or None after `timeout` ms"""
+    _check_mode()
+    return get_board().wait_for_edge(channel, edge in (RISING, BOTH), edge in (FALLING, BOTH), timeout)
+
+
+def cleanup(channel=None):
+    global _mode
+    if channel is None:
+        get_board().cleanup()
+        _mode = None
+    else:
+        get_board().cleanup(channel if isinstance(channel, (list, tuple)) else [channel])
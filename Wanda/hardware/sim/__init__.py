@@ -0,0 +1,3 @@
+"""Simulated Raspberry Pi hardware (ADS1256 Pi hats and relay bank)"""
+
+from .board import Board, get_board
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Register-level model of the ADS1256
+
+Models what the ADS1256 library sees over SPI and on the DRDY pin:
+
+- the 11 registers with their reset values (STATUS reads chip ID 3)
+- the command set (WAKEUP, RDATA, RDATAC, SDATAC, RREG, WREG, SYNC, STANDBY,
+  RESET and the calibration commands)
+- the serial interface: bytes clocked in are parsed as commands, the bytes of
+  an RDATA/RREG response are clocked out by the following transfers, raising
+  CS resets the interface
+- conversion timing: after a restart (WAKEUP, RESET, a write to ADCON/DRATE)
+  the first conversion completes one settling time later and the next ones
+  every 1/data rate. DRDY is low from a completed conversion until it is read.
+
+Conversions sample the input waveforms of the selected MUX pair at their
+completion time, apply the PGA gain and are clipped to the 24-bit range.
+Serial interface delays (t6, t11) are not enforced.
+"""
+
+import threading
+import time
+from collections import deque
+
+# registers
+REG_STATUS = 0
+REG_MUX = 1
+REG_ADCON = 2
+REG_DRATE = 3
+REG_IO = 4
+NUM_REGISTERS = 11
+RESET_REGISTERS = [0x31, 0x01, 0x20, 0xF0, 0xE0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40]
+# chip ID in the upper STATUS nibble, DRDY in bit 0
+STATUS_ID = 0x30
+
+# commands
+CMD_WAKEUP = 0x00
+CMD_RDATA = 0x01
+CMD_RDATAC = 0x03
+CMD_SDATAC = 0x0F
+CMD_RREG = 0x10
+CMD_WREG = 0x50
+CMD_SELFCAL = 0xF0
+CMD_SYSGCAL = 0xF4
+CMD_SYNC = 0xFC
+CMD_STANDBY = 0xFD
+CMD_RESET = 0xFE
+CMD_WAKEUP_ALT = 0xFF
+
+# (data rate in SPS, settling time in ms) for each DRATE register value (datasheet table 13)
+DATA_RATES = {0xF0: (30000, 0.21),
+              0xE0: (15000, 0.25),
+              0xD0: (7500, 0.31),
+              0xC0: (3750, 0.44),
+              0xB0: (2000, 0.68),
+              0xA1: (1000, 1.18),
+              0x92: (500, 2.18),
+              0x82: (100, 10.18),
+              0x72: (60, 16.84),
+              0x63: (50, 20.18),
+              0x53: (30, 33.51),
+              0x43: (25, 40.18),
+              0x33: (15, 66.84),
+              0x20: (10, 100.18),
+              0x23: (10, 100.18),
+              0x13: (5, 200.18),
+              0x03: (2.5, 400.18),
+              }
+
+VREF = 2.5
+FULL_SCALE_CODE = 0x7FFFFF
+AINCOM = 8
+
+
+class SimADS1256:
+    """One simulated ADS1256 on the simulated board"""
+
+    def __init__(self, name: str, cs_pin: int, drdy_pin: int, rst_pin: int, inputs: list,
+                 spi_bus: int = 0, epoch_ns: int = None):
+        """
+        Args:
+            name (str): name used in errors
+            cs_pin, drdy_pin, rst_pin (int): BCM pins of the chip
+            inputs (list): 9 waveforms (t -> V) for AIN0-AIN7 and AINCOM
+            spi_bus (int): SPI bus the chip is wired to
+            epoch_ns (int): `time.monotonic_ns()` at t = 0 of the waveforms
+        """
+        self.name = name
+        self.cs_pin = cs_pin
+        self.drdy_pin = drdy_pin
+        self.rst_pin = rst_pin
+        self.spi_bus = spi_bus
+        self.inputs = inputs
+        self.epoch_ns = time.monotonic_ns() if epoch_ns is None else epoch_ns
+        self.lock = threading.RLock()
+
+        self.conversions = 0    # conversions sampled from the waveforms
+        self.reset()
+
+    # state
+
+    def reset(self):
+        """Power-up values, stops RDATAC mode and restarts conversions"""
+        with self.lock:
+            self.registers = list(RESET_REGISTERS)
+            self.continuous = False
+            self.output = deque()
+            self.pending = None     # partially received RREG/WREG: [command, bytes...]
+            self.data = 0
+            self.restart()
+
+    def restart(self, now_ns: int = None):
+        """Restarts the digital filter, the data register keeps the last result"""
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        sps, settling_ms = DATA_RATES.get(self.registers[REG_DRATE], DATA_RATES[0xF0])
+        self.period_ns = int(1e9 / sps)
+        self.first_ns = now_ns + int(settling_ms * 1e6)
+        self.running = True
+        self.latched = -1   # index of the conversion in the data register
+        self.read = -1      # index of the last conversion read
+
+    def completed(self, now_ns: int) -> int:
+        """Index of the last conversion completed at `now_ns` (-1 if none)"""
+        if not self.running or now_ns < self.first_ns:
+            return -1
+        return (now_ns - self.first_ns) // self.period_ns
+
+    def update(self, now_ns: int = None):
+        """Latches the newest completed conversion into the data register"""
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        index = self.completed(now_ns)
+        if index > self.latched:
+            self.latched = index
+            self.data = self.convert(self.first_ns + index * self.period_ns)
+
+    def convert(self, time_ns: int) -> int:
+        """Samples the selected inputs at `time_ns` and returns the 24-bit code"""
+        mux = self.registers[REG_MUX]
+        t = (time_ns - self.epoch_ns) / 1e9
+        positive, negative = mux >> 4, mux & 0x0F
+        voltage = self.input_voltage(positive, t) - self.input_voltage(negative, t)
+        gain = 1 << (self.registers[REG_ADCON] & 0x07)
+        code = round(voltage * gain / (2 * VREF) * FULL_SCALE_CODE)
+        self.conversions += 1
+        return max(-FULL_SCALE_CODE - 1, min(FULL_SCALE_CODE, code))
+
+    def input_voltage(self, channel: int, t: float) -> float:
+        if channel > AINCOM:
+            # reserved MUX codes read AINCOM
+            channel = AINCOM
+        return self.inputs[channel](t)
+
+    # pins
+
+    def drdy_low(self) -> bool:
+        with self.lock:
+            self.update()
+            return self.latched > self.read
+
+    def next_drdy_ns(self):
+        """`time.monotonic_ns()` of the next falling DRDY edge, None if conversions are stopped"""
+        with self.lock:
+            if not self.running:
+                return None
+            now_ns = time.monotonic_ns()
+            return self.first_ns + (self.completed(now_ns) + 1) * self.period_ns
+
+    def deselect(self):
+        """CS went high, resets the serial interface"""
+        with self.lock:
+            self.output.clear()
+            self.pending = None
+
+    # serial interface
+
+    def transfer(self, data) -> list:
+        """Clocks `data` in while the chip is selected and returns the bytes clocked out"""
+        with self.lock:
+            self.update()
+            out = []
+            for byte in data:
+                if self.continuous:
+                    out.append(self.clock_continuous(byte))
+                elif self.output:
+                    # response of the previous command, DIN is ignored
+                    out.append(self.output.popleft())
+                else:
+                    out.append(0)
+                    self.command(byte)
+            return out
+
+    def clock_continuous(self, byte: int) -> int:
+        """RDATAC mode: every transfer shifts out the data register, only SDATAC and RESET are decoded"""
+        if byte == CMD_SDATAC:
+            self.continuous = False
+            self.output.clear()
+            return 0
+        if byte == CMD_RESET:
+            self.reset()
+            return 0
+        if not self.output:
+            self.queue_data()
+        return self.output.popleft()
+
+    def queue_data(self):
+        """Queues the data register (MSB first) and clears DRDY"""
+        code = self.data & 0xFFFFFF
+        self.output.extend(((code >> 16) & 0xFF, (code >> 8) & 0xFF, code & 0xFF))
+        self.read = self.latched
+
+    def command(self, byte: int):
+        if self.pending is not None:
+            self.pending.append(byte)
+            self.register_command()
+            return
+
+        if byte in (CMD_WAKEUP, CMD_WAKEUP_ALT):
+            if not self.running:
+                self.restart()
+        elif byte == CMD_RDATA:
+            self.queue_data()
+        elif byte == CMD_RDATAC:
+            self.queue_data()
+            self.continuous = True
+        elif byte == CMD_SDATAC:
+            pass
+        elif byte & 0xF0 in (CMD_RREG, CMD_WREG):
+            self.pending = [byte]
+        elif CMD_SELFCAL <= byte <= CMD_SYSGCAL:
+            # calibration takes about one settling time, then conversions resume
+            self.restart()
+        elif byte in (CMD_SYNC, CMD_STANDBY):
+            self.running = False
+        elif byte == CMD_RESET:
+            self.reset()
+
+    def register_command(self):
+        """Handles RREG/WREG once their bytes are in"""
+        command = self.pending[0]
+        if len(self.pending) < 2:
+            return
+        first = command & 0x0F
+        count = (self.pending[1] & 0x0F) + 1
+
+        if command & 0xF0 == CMD_RREG:
+            self.pending = None
+            for register in range(first, min(first + count, NUM_REGISTERS)):
+                self.output.append(self.read_register(register))
+            return
+
+        values = self.pending[2:]
+        if len(values) < count:
+            return
+        self.pending = None
+        restart = False
+        for register, value in zip(range(first, first + count), values):
+            if register >= NUM_REGISTERS:
+                break
+            if register == REG_STATUS:
+                # ID and DRDY are read only
+                value = (self.registers[REG_STATUS] & 0xF1) | (value & 0x0E)
+            restart = restart or register in (REG_STATUS, REG_ADCON, REG_DRATE)
+            self.registers[register] = value
+        if restart:
+            self.restart()
+
+    def read_register(self, register: int) -> int:
+        if register == REG_STATUS:
+            drdy = 0 if self.latched > self.read else 1
+            return STATUS_ID | (self.registers[REG_STATUS] & 0x0E) | drdy
+        return self.registers[register]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""The simulated Raspberry Pi: GPIO pin levels, ADS1256 chips and a relay bank
+
+One `Board` per process is shared by the simulated `GPIO` and `spidev`
+modules. Chips are wired by their CS, DRDY and RST pins: writing a chip's CS
+pin selects it on its SPI bus, reading its DRDY pin asks the chip model, a low
+RST pin resets it. Relay pins latch the level written to them and read it back
+like the Pi does for output pins, except for relays configured as stuck.
+
+The board is built from the YAML file named by `WANDA_SIM_CONFIG`, or from
+the defaults below (the wiring of the two Pi hats in DataIngestion/config.yaml
+and the relay pins of Controls/). See `hardware/README.md` for the format.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import yaml
+
+from .ads1256 import AINCOM, SimADS1256
+from .waveforms import make_waveform
+
+CONFIG_ENV = "WANDA_SIM_CONFIG"
+RELAY_LOG_LENGTH = 10000
+
+# load cells: differential pairs AIN0-AIN1 ... AIN6-AIN7 of a few mV at GAIN_64
+LOAD_CELL_INPUTS = {channel: {'waveform': 'rocket_burn', 'amplitude': 0.01 * (1 + channel / 8),
+                              'noise': 0.00002}
+                    for channel in (0, 2, 4, 6)}
+# pressure transducers: 0.5-4.5 V single ended
+PRESSURE_INPUTS = {channel: {'waveform': 'rocket_burn', 'offset': 0.5, 'amplitude': 4.0 - channel * 0.3,
+                             'noise': 0.001}
+                   for channel in range(8)}
+
+DEFAULT_CONFIG = {
+    'chips': [
+        {'name': 'ADC1', 'cs_pin': 8, 'drdy_pin': 22, 'rst_pin': 24, 'spi_bus': 0, 'inputs': LOAD_CELL_INPUTS},
+        {'name': 'ADC2', 'cs_pin': 7, 'drdy_pin': 23, 'rst_pin': 25, 'spi_bus': 0, 'inputs': PRESSURE_INPUTS},
+    ],
+    'relays': {'pins': [5, 6, 13, 16, 19, 20, 21, 26], 'stuck': {}},
+}
+
+HIGH = 1
+LOW = 0
+
+
+class Board:
+    """Pin levels and the devices wired to them"""
+
+    def __init__(self, config: dict = None):
+        config = DEFAULT_CONFIG if config is None else config
+        self.epoch_ns = time.monotonic_ns()
+        self.levels = {}    # pin -> level written or set by a device
+        self.modes = {}     # pin -> GPIO.IN / GPIO.OUT
+        self.changed = threading.Condition()
+
+        self.chips = []
+        for i, chip_config in enumerate(config.get('chips', DEFAULT_CONFIG['chips'])):
+            inputs = [make_waveform(chip_config.get('inputs', {}).get(channel)) for channel in range(AINCOM + 1)]
+            self.chips.append(SimADS1256(chip_config.get('name', f"ADC{i + 1}"), chip_config['cs_pin'],
+                                         chip_config['drdy_pin'], chip_config['rst_pin'], inputs,
+                                         chip_config.get('spi_bus', 0), self.epoch_ns))
+        self.chips_by_cs = {chip.cs_pin: chip for chip in self.chips}
+        self.chips_by_drdy = {chip.drdy_pin: chip for chip in self.chips}
+        self.chips_by_rst = {chip.rst_pin: chip for chip in self.chips}
+
+        relays = config.get('relays', DEFAULT_CONFIG['relays'])
+        self.relay_pins = list(relays.get('pins', []))
+        # pin -> level the relay reads back regardless of what is written
+        self.stuck = {int(pin): int(level) for pin, level in (relays.get('stuck') or {}).items()}
+        self.relay_log = deque(maxlen=RELAY_LOG_LENGTH)  # (time.monotonic_ns(), pin, level) of relay writes
+        self.relay_writes = 0
+
+        self.selected = {}      # SPI bus -> chips with CS low
+
+    # pins
+
+    def setup(self, pin: int, mode: int, initial: int = None):
+        with self.changed:
+            self.modes[pin] = mode
+            if initial is not None:
+                self.levels[pin] = initial
+            else:
+                self.levels.setdefault(pin, HIGH if pin in self.chips_by_cs else LOW)
+
+    def output(self, pin: int, level: int):
+        level = HIGH if level else LOW
+        with self.changed:
+            previous = self.levels.get(pin)
+            self.levels[pin] = level
+            if pin in self.relay_pins:
+                self.relay_writes += 1
+                self.relay_log.append((time.monotonic_ns(), pin, level))
+            self.changed.notify_all()
+
+        chip = self.chips_by_cs.get(pin)
+        if chip is not None:
+            selected = self.selected.setdefault(chip.spi_bus, set())
+            if level == LOW:
+                selected.add(chip)
+            else:
+                selected.discard(chip)
+                chip.deselect()
+        chip = self.chips_by_rst.get(pin)
+        if chip is not None and level == LOW and previous != LOW:
+            chip.reset()
+
+    def input(self, pin: int) -> int:
+        chip = self.chips_by_drdy.get(pin)
+        if chip is not None:
+            return LOW if chip.drdy_low() else HIGH
+        if pin in self.stuck:
+            return self.stuck[pin]
+        return self.levels.get(pin, LOW)
+
+    def wait_for_edge(self, pin: int, rising: bool, falling: bool, timeout_ms: int = None):
+        """Blocks until the pin changes in the given direction
+
+        Returns:
+            int: `pin`, or None if the timeout expired first
+        """
+        deadline_ns = None if timeout_ms is None else time.monotonic_ns() + int(timeout_ms * 1e6)
+        chip = self.chips_by_drdy.get(pin)
+        if chip is not None:
+            if not falling:
+                # DRDY rises when data is read, not something a thread waits for here
+                raise ValueError("Only falling edges of a simulated DRDY pin can be waited for")
+            edge_ns = chip.next_drdy_ns()
+            if edge_ns is None or (deadline_ns is not None and edge_ns > deadline_ns):
+                if deadline_ns is not None:
+                    time.sleep(max(0, deadline_ns - time.monotonic_ns()) / 1e9)
+                    return None
+                raise RuntimeError(f"{chip.name} is not converting, DRDY will never fall")
+            time.sleep(max(0, edge_ns - time.monotonic_ns()) / 1e9)
+            return pin
+
+        with self.changed:
+            level = self.input(pin)
+            while True:
+                remaining = None if deadline_ns is None else (deadline_ns - time.monotonic_ns()) / 1e9
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+                new_level = self.input(pin)
+                if new_level != level and ((new_level == HIGH and rising) or (new_level == LOW and falling)):
+                    return pin
+                level = new_level
+
+    def cleanup(self, pins=None):
+        with self.changed:
+            for pin in list(self.modes) if pins is None else pins:
+                self.modes.pop(pin, None)
+
+    # SPI
+
+    def transfer(self, bus: int, data) -> list:
+        """Clocks `data` through the chip selected on `bus` (zeros if none is)"""
+        selected = self.selected.get(bus)
+        if not selected:
+            return [0] * len(data)
+        if len(selected) > 1:
+            names = ", ".join(sorted(chip.name for chip in selected))
+            raise RuntimeError(f"SPI bus {bus} contention, {names} selected at the same time")
+        return next(iter(selected)).transfer(data)
+
+    # relays
+
+    def relay_states(self) -> list:
+        """Levels read back from the relay pins in relay order"""
+        return [self.input(pin) for pin in self.relay_pins]
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def load_config(path: str) -> dict:
+    with open(path, "r") as config_file:
+        return yaml.safe_load(config_file) or {}
+
+
+def get_board() -> Board:
+    """Returns the board of this process, built on first use"""
+    global _board
+    with _board_lock:
+        if _board is None:
+            path = os.environ.get(CONFIG_ENV)
+            _board = Board(load_config(path) if path else None)
+        return _board
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Drop-in for `spidev` on the simulated board
+
+Transfers go to the chip whose CS pin is low on the bus (CS is driven from
+GPIO by the ADS1256 transport, like on the Pi hat).
+"""
+
+from .board import get_board
+
+
+class SpiDev:
+
+    def __init__(self, bus=None, device=None):
+        self.bus = None
+        self.device = None
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bits_per_word = 8
+        self.no_cs = True
+        if bus is not None:
+            self.open(bus, device)
+
+    def open(self, bus, device):
+        self.bus = bus
+        self.device = device
+
+    def close(self):
+        self.bus = None
+
+    def _transfer(self, data) -> list:
+        if self.bus is None:
+            raise OSError(9, "Bad file descriptor")
+        return get_board().transfer(self.bus, data)
+
+    def xfer(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._transfer(data)
+
+    def xfer2(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._transfer(data)
+
+    def xfer3(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._transfer(data)
+
+    def writebytes(self, data):
+        self._transfer(data)
+
+    def writebytes2(self, data):
+        self._transfer(data)
+
+    def readbytes(self, length):
+        return self._transfer(bytes(length))
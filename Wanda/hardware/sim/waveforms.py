@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Styling: PEP 8
+
+"""Programmable input waveforms of the simulated ADCs
+
+A waveform maps the time since the simulated board started (seconds) to an
+input voltage. Waveforms are built from the `inputs` entries of the simulator
+config, e.g.
+
+    {waveform: rocket_burn, offset: 0.5, amplitude: 4.0, noise: 0.001}
+
+Every waveform takes an optional `noise` (standard deviation in volts of the
+gaussian noise added to each conversion).
+"""
+
+import math
+import random
+
+# burn phases of `rocket_burn_profile()` in seconds (same as Cosmo/ingest_telemetry.py)
+IGNITION_TIME = 2.0
+BURN_TIME = 20.0
+SHUTDOWN_TIME = 1.5
+
+
+def rocket_burn_profile(t: float, ignition_time: float = IGNITION_TIME, burn_time: float = BURN_TIME,
+                        shutdown_time: float = SHUTDOWN_TIME) -> float:
+    """Burn intensity between 0 and 1 at `t` seconds after ignition
+
+    Ported from `Cosmo/ingest_telemetry.py`: S-curve ignition, steady burn with
+    combustion oscillations and propellant decay, exponential shutdown.
+    """
+    if t < 0:
+        return 0.0
+    if t < ignition_time:
+        progress = t / ignition_time
+        return 0.5 * (1 + math.tanh(8 * (progress - 0.5)))
+    if t < ignition_time + burn_time:
+        burn_progress = (t - ignition_time) / burn_time
+        oscillation = 0.02 * math.sin(10 * t) + 0.01 * math.sin(23 * t)
+        decay = 1.0 - 0.05 * burn_progress
+        return (1.0 + oscillation) * decay
+    if t < ignition_time + burn_time + shutdown_time:
+        shutdown_progress = (t - ignition_time - burn_time) / shutdown_time
+        return math.exp(-5 * shutdown_progress)
+    return 0.0
+
+
+def constant(value: float = 0.0):
+    return lambda t: value
+
+
+def sine(amplitude: float = 1.0, frequency: float = 1.0, offset: float = 0.0, phase: float = 0.0):
+    omega = 2 * math.pi * frequency
+    return lambda t: offset + amplitude * math.sin(omega * t + phase)
+
+
+def ramp(start: float = 0.0, slope: float = 1.0, period: float = None):
+    """Rises by `slope` V/s from `start`, restarting every `period` seconds"""
+    if period:
+        return lambda t: start + slope * (t % period)
+    return lambda t: start + slope * t
+
+
+def rocket_burn(amplitude: float = 1.0, offset: float = 0.0, start: float = 5.0, period: float = 40.0,
+                ignition_time: float = IGNITION_TIME, burn_time: float = BURN_TIME,
+                shutdown_time: float = SHUTDOWN_TIME):
+    """`rocket_burn_profile()` scaled to volts, igniting `start` seconds in and every `period` seconds
+
+    `period: 0` burns only once.
+    """
+    def waveform(t):
+        t -= start
+        if period and t > 0:
+            t %= period
+        return offset + amplitude * rocket_burn_profile(t, ignition_time, burn_time, shutdown_time)
+    return waveform
+
+
+WAVEFORMS = {
+    'constant': constant,
+    'sine': sine,
+    'ramp': ramp,
+    'rocket_burn': rocket_burn,
+}
+
+
+def make_waveform(spec):
+    """Builds a waveform from a config entry
+
+    Args:
+        spec (dict | float): `{waveform: <name>, noise: <V>, **parameters}`,
+            or a number for a constant voltage
+
+    Returns:
+        callable: t (s) -> voltage (V)
+    """
+    if spec is None:
+        return constant(0.0)
+    if isinstance(spec, (int, float)):
+        return constant(float(spec))
+    parameters = dict(spec)
+    name = parameters.pop('waveform', 'constant')
+    noise = float(parameters.pop('noise', 0.0))
+    if name not in WAVEFORMS:
+        raise ValueError(f"Unknown waveform <{name}>, expected one of {list(WAVEFORMS)}")
+    try:
+        waveform = WAVEFORMS[name](**parameters)
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for waveform <{name}>: {e}") from None
+    if noise <= 0:
+        return waveform
+    gauss = random.Random().gauss
+    return lambda t: waveform(t) + gauss(0.0, noise)
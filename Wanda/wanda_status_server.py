@@ -5,12 +5,16 @@ import json
 import os
 import socket
 import subprocess
+import urllib.request
 
 hostname = socket.gethostname().upper()
 app = Flask(__name__)
 
 BASE_DIR = '/home/lti/Wanda'
 SERVICES = ['controller_socket', 'worker_socket', 'dataingestion', 'questdb', 'grafana', 'wanda_status_server']
+# metrics endpoints of dataingestion (acquisition, and the QuestDB and Grafana writers in --rt mode)
+METRICS_URLS = ['http://127.0.0.1:9101/metrics', 'http://127.0.0.1:9102/metrics', 'http://127.0.0.1:9103/metrics']
+METRICS_TIMEOUT = 1
 
 CSS = '''
 <style>
@@ -385,6 +389,29 @@ def services_status():
             res.append({'name': s, 'active': 'error', 'enabled': str(e)})
     return jsonify(res)
 
+@app.route('/metrics')
+def metrics():
+    # one scrape target per Pi, endpoints that are not running are skipped
+    families = {}  # metric name -> HELP and TYPE lines, samples
+    for url in METRICS_URLS:
+        try:
+            with urllib.request.urlopen(url, timeout=METRICS_TIMEOUT) as r:
+                text = r.read().decode()
+        except Exception:
+            continue
+        # the writers both export the ring metrics, their samples are merged under one HELP/TYPE
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                family = families.setdefault(line.split()[2], {'HELP': None, 'TYPE': None, 'samples': []})
+                family[line.split()[1]] = line
+            elif line and family is not None:
+                family['samples'].append(line)
+    lines = []
+    for family in families.values():
+        lines += [family['HELP'], family['TYPE']] + family['samples']
+    return Response(''.join(line + '\n' for line in lines if line), mimetype='text/plain; version=0.0.4')
+
 @app.route('/control/<service>/<action>', methods=['POST'])
 def service_control(service, action):
     if service not in SERVICES: return abort(400)